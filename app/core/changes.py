@@ -0,0 +1,45 @@
+# app/core/changes.py
+"""
+变更订阅：界面刷新、缓存等组件不必重新读取整张表，只需处理变更日志 (data_manager.transaction_changes)
+中自己上次看到之后的那部分。
+
+    feed = ChangeFeed()
+    unsubscribe = feed.subscribe(lambda changes: ...)
+    feed.poll()   # 定期调用 (如 Tk 的 after())，有新变更时分发给所有订阅者
+
+变更日志覆盖所有写入路径 (逐行触发器，以及批量写入/整批撤销中的一次性写入)，
+所以无论修改来自哪个线程或哪个进程，poll() 都能看到。
+"""
+from . import data_manager
+
+class ChangeFeed:
+    """记住已分发到的序号；poll() 把之后的变更按顺序、分批交给订阅者"""
+    def __init__(self, start_seq: int = None):
+        """:param start_seq: 从该序号之后开始分发，默认从当前最新的序号开始 (只关心今后的变更)"""
+        self.last_seq = data_manager.get_latest_change_seq() if start_seq is None else start_seq
+        self._subscribers = []
+
+    def subscribe(self, callback):
+        """
+        订阅变更。callback(changes) 在调用 poll() 的线程中执行，changes 是 data_manager.get_changes_since
+        返回的字典列表 (按 seq 升序，每次最多 CHANGE_BATCH_SIZE 条)。
+        :return: 取消订阅的函数
+        """
+        self._subscribers.append(callback)
+        return lambda: self._subscribers.remove(callback) if callback in self._subscribers else None
+
+    def poll(self) -> int:
+        """分发上次以来的全部变更，返回分发的条数；没有订阅者时只推进序号"""
+        dispatched = 0
+        while True:
+            changes = data_manager.get_changes_since(self.last_seq)
+            if not changes:
+                return dispatched
+            self.last_seq = changes[-1]['seq']
+            dispatched += len(changes)
+            for callback in list(self._subscribers):
+                callback(changes)
+
+def latest_changes_by_id(changes: list) -> dict:
+    """把一串变更合并为 {transaction_id: 最后一次 change_type}，便于按记录应用"""
+    return {change['transaction_id']: change['change_type'] for change in changes}
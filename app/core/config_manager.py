@@ -6,6 +6,8 @@ CONFIG_DIR = "config"
 CONFIG_FILE = os.path.join(CONFIG_DIR, "settings.json")
 DEFAULT_SCALE = 18 # 定义一个默认的缩放基准
 DEFAULT_TTK_ADJUSTMENT = 1.0
+DEFAULT_STREAMING_IMPORT_MB = 10 # 超过该大小 (MB) 的 Excel 文件使用流式导入
+DEFAULT_QUERY_CACHE_MB = 256 # 查询结果缓存的内存上限 (MB)，0 表示不缓存
 
 def _load_config() -> dict:
     """【私有】加载完整的配置文件（JSON格式）"""
@@ -61,3 +63,27 @@ def load_ttk_scale_adjustment() -> float:
     """读取 ttk 微调系数，如果不存在则默认为 1.0"""
     config = _load_config()
     return config.get('ttk_scale_adjustment', DEFAULT_TTK_ADJUSTMENT)
+
+# --- 导入相关 ---
+def save_streaming_import_threshold_mb(size_mb: float):
+    """保存自动切换为流式导入的文件大小阈值 (MB)"""
+    config = _load_config()
+    config['streaming_import_threshold_mb'] = size_mb
+    _save_config(config)
+
+def load_streaming_import_threshold_mb() -> float:
+    """读取流式导入阈值：Excel 文件大于该值 (MB) 时逐块读取，不再一次载入整个工作表"""
+    config = _load_config()
+    return config.get('streaming_import_threshold_mb', DEFAULT_STREAMING_IMPORT_MB)
+
+# --- 查询缓存相关 ---
+def save_query_cache_mb(size_mb: float):
+    """保存查询结果缓存的内存上限 (MB)"""
+    config = _load_config()
+    config['query_cache_mb'] = size_mb
+    _save_config(config)
+
+def load_query_cache_mb() -> float:
+    """读取查询结果缓存的内存上限 (MB)，0 表示不缓存"""
+    config = _load_config()
+    return config.get('query_cache_mb', DEFAULT_QUERY_CACHE_MB)
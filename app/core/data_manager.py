@@ -1,21 +1,137 @@
 # app/core/data_manager.py
 import sqlite3
+import hashlib
+import itertools
 import os
-from datetime import datetime
+import threading
+from contextlib import contextmanager
+from datetime import datetime, date, timedelta
 
 DATABASE_DIR = "database"
 DATABASE_NAME = os.path.join(DATABASE_DIR, "inventory.db")
 
-def get_db_connection():
-    """获取数据库连接"""
+# --- 连接参数 ---
+BUSY_TIMEOUT_MS = 5000              # 遇到写锁时最多等待的毫秒数
+CACHE_SIZE_KB = 64 * 1024           # 每个连接的页缓存大小 (64MB)
+MMAP_SIZE = 256 * 1024 * 1024       # 内存映射读取的上限 (256MB)
+
+# --- 内容哈希 ---
+# 每条导入的交易按以下字段计算 16 字节的 BLAKE2b 哈希，有效记录的哈希唯一 (迁移 v7、v10)，重复导入同一份数据时据此跳过。
+CONTENT_HASH_FIELDS = ("insertion_date", "product_name", "model_number", "unit", "quantity", "unit_price", "buyer", "seller", "notes")
+
+def compute_content_hash(insertion_date, product_name, model_number, unit, quantity, unit_price, buyer, seller, notes):
+    """计算一条交易的内容哈希；文本去除首尾空白，NULL 与空字符串等同，数量和单价按数值比较"""
+    text = "\x1f".join((
+        str(insertion_date), str(product_name or "").strip(), str(model_number or "").strip(), str(unit or "").strip(),
+        str(int(quantity)), repr(float(unit_price)),
+        str(buyer or "").strip(), str(seller or "").strip(), str(notes or "").strip(),
+    ))
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+
+def row_content_hash(row: dict):
+    """按 add_transactions_bulk 的字典格式计算内容哈希"""
+    return compute_content_hash(*(row.get(field) for field in CONTENT_HASH_FIELDS))
+
+_local = threading.local()          # 每个线程持有自己的长连接
+_connections = []                   # 所有已打开的连接，供退出时统一关闭
+_connections_lock = threading.Lock()
+_generation = 0                     # close_all_connections 之后递增，使旧连接失效
+_write_counter = 0                  # 本进程提交数据修改的次数，由 _commit_write 递增
+_version_conn = None                # 只用于读取 PRAGMA data_version 的共享连接 (见 get_write_version)
+_version_generation = None
+_version_lock = threading.Lock()
+
+def _open_connection():
+    """【私有】打开一个新连接，并设置 WAL 模式及性能相关的 PRAGMA"""
     if not os.path.exists(DATABASE_DIR):
         os.makedirs(DATABASE_DIR)
-    conn = sqlite3.connect(DATABASE_NAME)
+    # check_same_thread=False 仅用于退出时由主线程统一关闭，平时每个连接只在创建它的线程中使用
+    conn = sqlite3.connect(DATABASE_NAME, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
     conn.row_factory = sqlite3.Row # 允许通过列名访问数据
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL") # WAL 模式下只在检查点时 fsync，断电不会损坏数据库
+    conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+    conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    # 迁移 v7 的回填和重复记录报告在 SQL 中调用，保证与写入时用 Python 计算的哈希完全一致
+    conn.create_function("transaction_content_hash", len(CONTENT_HASH_FIELDS), compute_content_hash, deterministic=True)
+    return conn
+
+def get_db_connection():
+    """
+    获取当前线程的数据库连接。
+    每个线程第一次调用时创建连接，之后一直复用，调用方不要关闭它。
+    """
+    conn = getattr(_local, "conn", None)
+    if conn is None or getattr(_local, "generation", None) != _generation:
+        conn = _open_connection()
+        with _connections_lock:
+            _connections.append(conn)
+            _local.generation = _generation
+        _local.conn = conn
     return conn
 
+def close_all_connections():
+    """关闭所有线程的数据库连接 (程序退出时调用)"""
+    global _generation
+    with _connections_lock:
+        for conn in _connections:
+            try:
+                conn.execute("PRAGMA optimize")
+                conn.close()
+            except sqlite3.Error as e:
+                print(f"关闭数据库连接时出错: {e}")
+        _connections.clear()
+        _generation += 1
+
+def close_thread_connection():
+    """
+    关闭当前线程的数据库连接 (后台工作线程退出前调用)。
+    连接只在自己的线程中使用，所以在线程内关闭是安全的；主线程在工作线程仍在运行时不能调用 close_all_connections。
+    """
+    conn = getattr(_local, "conn", None)
+    _local.conn = None
+    if conn is None:
+        return
+    with _connections_lock:
+        if conn not in _connections: # 已被 close_all_connections 关闭
+            return
+        _connections.remove(conn)
+    try:
+        conn.execute("PRAGMA optimize")
+        conn.close()
+    except sqlite3.Error as e:
+        print(f"关闭数据库连接时出错: {e}")
+
+def _commit_write(conn):
+    """【私有】提交修改数据的事务，并递增写入计数 (供 get_write_version 使用)"""
+    global _write_counter
+    conn.commit()
+    with _version_lock:
+        _write_counter += 1
+
+def get_write_version():
+    """
+    数据库的写入版本，供缓存判断数据库是否变化；与调用的线程无关，数据没有变化时各线程得到相同的值。
+    :return: (PRAGMA data_version, 写入计数)。data_version 在一个专用的共享连接上读取，其他连接 (包括其他进程) 提交后变化；
+             写入计数只由本模块修改数据的函数在提交后递增。临时表 (如 temp.id_set) 的写入不影响两者
+    """
+    global _version_conn, _version_generation
+    with _version_lock:
+        if _version_conn is None or _version_generation != _generation:
+            _version_conn = _open_connection()
+            _version_generation = _generation
+            with _connections_lock:
+                _connections.append(_version_conn) # 由 close_all_connections 一并关闭
+        data_version = _version_conn.execute("PRAGMA data_version").fetchone()[0]
+        return data_version, _write_counter
+
 def initialize_database():
-    """初始化数据库，创建表（如果不存在）"""
+    """
+    初始化数据库，创建表（如果不存在）并执行尚未应用的迁移。
+    由程序入口 (main.py) 在启动时调用；导入本模块本身不会打开或修改数据库，多文件导入的解析子进程因此不受影响。
+    """
     conn = get_db_connection()
     cursor = conn.cursor()
     cursor.execute("""
@@ -36,11 +152,381 @@ def initialize_database():
     )
     """)
     conn.commit()
-    conn.close()
+    _apply_migrations(conn)
+
+# --- 数据库结构迁移 ---
+# 数据库当前的结构版本记录在 PRAGMA user_version 中。
+# 每个迁移只执行一次；需要修改表结构时，在 MIGRATIONS 末尾追加新的版本即可。
+
+# 批量写入时跳过的逐行触发器 (迁移 v11 起)：bulk_mode 表中有行时 WHEN 条件不成立。
+# 触发器只能引用同一数据库中的表，所以标志放在主库的 bulk_mode 表，而不是 temp 表。
+_BULK_GUARDED_TRIGGERS = ("trg_stock_levels_insert", "trg_stock_levels_update", "trg_transactions_fts_insert",
+                          "trg_transaction_changes_insert", "trg_transaction_changes_update")
+_NOT_BULK_MODE = "NOT EXISTS (SELECT 1 FROM bulk_mode)"
+
+def _migration_add_indexes(conn):
+    """v1: 为汇总、按日期排序以及购买方/销售方查询添加索引"""
+    # 覆盖 get_product_summary 的 GROUP BY 和 SUM(quantity)，无需回表
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_product_stock
+    ON transactions (product_name, model_number, unit, is_undone, quantity)
+    """)
+    # 覆盖 WHERE is_undone = 0 ... ORDER BY insertion_date DESC, transaction_time DESC
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_active_date
+    ON transactions (is_undone, insertion_date, transaction_time)
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_buyer ON transactions (buyer)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_transactions_seller ON transactions (seller)")
+
+def _migration_add_stock_levels(conn):
+    """v2: 新增由触发器维护的库存表 stock_levels，并用现有交易记录填充"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS stock_levels (
+        product_name TEXT NOT NULL,
+        model_number TEXT NOT NULL,
+        unit TEXT NOT NULL DEFAULT '',          -- 交易中的 NULL 单位统一存为空字符串
+        current_stock INTEGER NOT NULL DEFAULT 0,
+        active_count INTEGER NOT NULL DEFAULT 0, -- 有效(未撤销)交易笔数，为 0 时不出现在汇总中
+        PRIMARY KEY (product_name, model_number, unit)
+    ) WITHOUT ROWID
+    """)
+    # 新增有效交易：累加库存
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stock_levels_insert
+    AFTER INSERT ON transactions
+    WHEN NEW.is_undone = 0
+    BEGIN
+        INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+        VALUES (NEW.product_name, NEW.model_number, IFNULL(NEW.unit, ''), NEW.quantity, 1)
+        ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+            current_stock = current_stock + excluded.current_stock,
+            active_count = active_count + 1;
+    END
+    """)
+    # 撤销/恢复 (或修改了影响库存的字段)：先减去旧值，再加上新值
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stock_levels_update
+    AFTER UPDATE OF is_undone, quantity, product_name, model_number, unit ON transactions
+    WHEN OLD.is_undone IS NOT NEW.is_undone OR OLD.quantity IS NOT NEW.quantity
+      OR OLD.product_name IS NOT NEW.product_name OR OLD.model_number IS NOT NEW.model_number
+      OR OLD.unit IS NOT NEW.unit
+    BEGIN
+        UPDATE stock_levels
+        SET current_stock = current_stock - OLD.quantity,
+            active_count = active_count - 1
+        WHERE OLD.is_undone = 0
+          AND product_name = OLD.product_name AND model_number = OLD.model_number
+          AND unit = IFNULL(OLD.unit, '');
+        INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+        SELECT NEW.product_name, NEW.model_number, IFNULL(NEW.unit, ''), NEW.quantity, 1
+        WHERE NEW.is_undone = 0
+        ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+            current_stock = current_stock + excluded.current_stock,
+            active_count = active_count + 1;
+    END
+    """)
+    # 永久删除有效交易：减去库存
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_stock_levels_delete
+    AFTER DELETE ON transactions
+    WHEN OLD.is_undone = 0
+    BEGIN
+        UPDATE stock_levels
+        SET current_stock = current_stock - OLD.quantity,
+            active_count = active_count - 1
+        WHERE product_name = OLD.product_name AND model_number = OLD.model_number
+          AND unit = IFNULL(OLD.unit, '');
+    END
+    """)
+    _rebuild_stock_levels(conn)
+
+def _migration_add_fulltext_index(conn):
+    """v3: 为文本列建立 FTS5 trigram 全文索引 (外部内容表，由触发器同步)"""
+    try:
+        conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS transactions_fts USING fts5(
+            product_name, model_number, buyer, seller, notes,
+            content='transactions', content_rowid='id', tokenize='trigram'
+        )
+        """)
+    except sqlite3.OperationalError as e:
+        # 旧版 SQLite (< 3.34) 或未编译 FTS5：跳过，高级筛选继续使用 LIKE
+        print(f"当前 SQLite 不支持 FTS5 trigram 全文索引，高级筛选将使用 LIKE: {e}")
+        return
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_insert
+    AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (rowid, product_name, model_number, buyer, seller, notes)
+        VALUES (NEW.id, NEW.product_name, NEW.model_number, NEW.buyer, NEW.seller, NEW.notes);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_delete
+    AFTER DELETE ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, product_name, model_number, buyer, seller, notes)
+        VALUES ('delete', OLD.id, OLD.product_name, OLD.model_number, OLD.buyer, OLD.seller, OLD.notes);
+    END
+    """)
+    # 撤销/恢复只修改 is_undone，不会触发索引更新
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transactions_fts_update
+    AFTER UPDATE OF product_name, model_number, buyer, seller, notes ON transactions
+    BEGIN
+        INSERT INTO transactions_fts (transactions_fts, rowid, product_name, model_number, buyer, seller, notes)
+        VALUES ('delete', OLD.id, OLD.product_name, OLD.model_number, OLD.buyer, OLD.seller, OLD.notes);
+        INSERT INTO transactions_fts (rowid, product_name, model_number, buyer, seller, notes)
+        VALUES (NEW.id, NEW.product_name, NEW.model_number, NEW.buyer, NEW.seller, NEW.notes);
+    END
+    """)
+    conn.execute("INSERT INTO transactions_fts (transactions_fts) VALUES ('rebuild')")
+
+def _migration_add_listing_index(conn):
+    """v4: 为包含已撤销记录的列表分页添加 (insertion_date, transaction_time) 索引 (隐含 id)"""
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_date_time
+    ON transactions (insertion_date, transaction_time)
+    """)
+
+def _migration_add_import_batches(conn):
+    """v5: 记录每次导入的批次，交易记录通过 import_batch_id 关联所属批次"""
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS import_batches (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        file_name TEXT NOT NULL,
+        file_hash TEXT NOT NULL,        -- 导入文件内容的 SHA-256
+        row_count INTEGER NOT NULL DEFAULT 0,
+        imported_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+        is_undone BOOLEAN DEFAULT 0     -- 整批是否已撤销
+    )
+    """)
+    conn.execute("ALTER TABLE transactions ADD COLUMN import_batch_id INTEGER REFERENCES import_batches (id)")
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_import_batch
+    ON transactions (import_batch_id, is_undone)
+    """)
+
+def _migration_drop_undo_heavy_indexes(conn):
+    """
+    v6: 删除 v1 的 idx_transactions_product_stock。库存汇总已改由 stock_levels 提供，不再有查询使用它，
+    而它的中间列是 is_undone，整批撤销/恢复时每行都要在索引中移动。
+    (本迁移曾同时删除 idx_transactions_active_date，已由 v12 重建。)
+    """
+    conn.execute("DROP INDEX IF EXISTS idx_transactions_product_stock")
+
+def _migration_add_content_hash(conn):
+    """
+    v7: 新增内容哈希 content_hash，有效记录上唯一，用于导入时跳过已存在的记录。
+    已有数据中重复的有效记录只有 id 最小的一条保留哈希，其余留空 (可用 find_duplicate_transactions 查出)。
+    """
+    conn.execute("ALTER TABLE transactions ADD COLUMN content_hash BLOB")
+    conn.execute(f"UPDATE transactions SET content_hash = transaction_content_hash({', '.join(CONTENT_HASH_FIELDS)})")
+    conn.execute("""
+    UPDATE transactions SET content_hash = NULL
+    WHERE is_undone = 0 AND id NOT IN (
+        SELECT MIN(id) FROM transactions WHERE is_undone = 0 GROUP BY content_hash
+    )
+    """)
+    # 已撤销的记录不参与唯一性检查：撤销一次导入后可以重新导入同一文件
+    conn.execute("""
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_transactions_content_hash
+    ON transactions (content_hash) WHERE is_undone = 0
+    """)
+
+def _migration_add_change_log(conn):
+    """
+    v8: 变更日志 transaction_changes (撤销/恢复/永久删除，由触发器写入，序号单调递增)
+    和增量导出的水位表 export_watermarks。
+    """
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS transaction_changes (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,  -- 变更序号，只增不减 (不复用)
+        transaction_id INTEGER NOT NULL,
+        change_type TEXT NOT NULL,              -- 'undo' | 'redo' | 'delete' (v9 起还有 'insert')
+        changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_changes_update
+    AFTER UPDATE OF is_undone ON transactions
+    WHEN OLD.is_undone IS NOT NEW.is_undone
+    BEGIN
+        INSERT INTO transaction_changes (transaction_id, change_type)
+        VALUES (NEW.id, CASE WHEN NEW.is_undone THEN 'undo' ELSE 'redo' END);
+    END
+    """)
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_changes_delete
+    AFTER DELETE ON transactions
+    BEGIN
+        INSERT INTO transaction_changes (transaction_id, change_type) VALUES (OLD.id, 'delete');
+    END
+    """)
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS export_watermarks (
+        name TEXT PRIMARY KEY,                  -- 增量导出的使用方，如 'default'
+        max_transaction_id INTEGER NOT NULL,    -- 上次导出时的最大交易 id
+        change_seq INTEGER NOT NULL,            -- 上次导出时的最大变更序号
+        exported_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    )
+    """)
+
+def _migration_log_inserts(conn):
+    """v9: 新增记录也写入变更日志，日志从此覆盖全部写操作 (已有记录不补写)"""
+    conn.execute("""
+    CREATE TRIGGER IF NOT EXISTS trg_transaction_changes_insert
+    AFTER INSERT ON transactions
+    BEGIN
+        INSERT INTO transaction_changes (transaction_id, change_type) VALUES (NEW.id, 'insert');
+    END
+    """)
+
+def _migration_hash_imported_rows_only(conn):
+    """
+    v10: 只保留导入记录的 content_hash。唯一性检查 (v7) 用于让重复导入同一文件时跳过已有的行；
+    手工录入的记录内容相同时也可能确实是两笔交易，改为只在录入时提示 (见 has_active_duplicate)。
+    """
+    conn.execute("UPDATE transactions SET content_hash = NULL WHERE import_batch_id IS NULL AND content_hash IS NOT NULL")
+
+def _migration_guard_triggers_for_bulk_writes(conn):
+    """
+    v11: 逐行的库存、全文索引和变更日志触发器加上 bulk_mode 守卫 (见 _bulk_mode)。
+    批量写入和整批撤销/恢复不再在事务中删除、重建触发器 (DDL 会使其他连接的预编译语句全部失效)。
+    """
+    conn.execute("CREATE TABLE IF NOT EXISTS bulk_mode (active INTEGER PRIMARY KEY)")
+    for name in _BULK_GUARDED_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    conn.execute(f"""
+    CREATE TRIGGER trg_stock_levels_insert
+    AFTER INSERT ON transactions
+    WHEN NEW.is_undone = 0 AND {_NOT_BULK_MODE}
+    BEGIN
+        INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+        VALUES (NEW.product_name, NEW.model_number, IFNULL(NEW.unit, ''), NEW.quantity, 1)
+        ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+            current_stock = current_stock + excluded.current_stock,
+            active_count = active_count + 1;
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_stock_levels_update
+    AFTER UPDATE OF is_undone, quantity, product_name, model_number, unit ON transactions
+    WHEN (OLD.is_undone IS NOT NEW.is_undone OR OLD.quantity IS NOT NEW.quantity
+      OR OLD.product_name IS NOT NEW.product_name OR OLD.model_number IS NOT NEW.model_number
+      OR OLD.unit IS NOT NEW.unit) AND {_NOT_BULK_MODE}
+    BEGIN
+        UPDATE stock_levels
+        SET current_stock = current_stock - OLD.quantity,
+            active_count = active_count - 1
+        WHERE OLD.is_undone = 0
+          AND product_name = OLD.product_name AND model_number = OLD.model_number
+          AND unit = IFNULL(OLD.unit, '');
+        INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+        SELECT NEW.product_name, NEW.model_number, IFNULL(NEW.unit, ''), NEW.quantity, 1
+        WHERE NEW.is_undone = 0
+        ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+            current_stock = current_stock + excluded.current_stock,
+            active_count = active_count + 1;
+    END
+    """)
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'").fetchone():
+        conn.execute(f"""
+        CREATE TRIGGER trg_transactions_fts_insert
+        AFTER INSERT ON transactions
+        WHEN {_NOT_BULK_MODE}
+        BEGIN
+            INSERT INTO transactions_fts (rowid, product_name, model_number, buyer, seller, notes)
+            VALUES (NEW.id, NEW.product_name, NEW.model_number, NEW.buyer, NEW.seller, NEW.notes);
+        END
+        """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_transaction_changes_insert
+    AFTER INSERT ON transactions
+    WHEN {_NOT_BULK_MODE}
+    BEGIN
+        INSERT INTO transaction_changes (transaction_id, change_type) VALUES (NEW.id, 'insert');
+    END
+    """)
+    conn.execute(f"""
+    CREATE TRIGGER trg_transaction_changes_update
+    AFTER UPDATE OF is_undone ON transactions
+    WHEN OLD.is_undone IS NOT NEW.is_undone AND {_NOT_BULK_MODE}
+    BEGIN
+        INSERT INTO transaction_changes (transaction_id, change_type)
+        VALUES (NEW.id, CASE WHEN NEW.is_undone THEN 'undo' ELSE 'redo' END);
+    END
+    """)
+
+def _migration_restore_active_date_index(conn):
+    """
+    v12: 重建 idx_transactions_active_date (is_undone, insertion_date, transaction_time)，
+    有效记录的分页 (iter_transaction_pages) 和按日期区间查询 (_get_active_transactions_between) 依赖它。
+    旧版本的 v6 删除了这个索引，已升级过的数据库在这里补回。
+    """
+    conn.execute("""
+    CREATE INDEX IF NOT EXISTS idx_transactions_active_date
+    ON transactions (is_undone, insertion_date, transaction_time)
+    """)
+
+MIGRATIONS = [
+    (1, "添加交易表索引", _migration_add_indexes),
+    (2, "添加库存表 stock_levels", _migration_add_stock_levels),
+    (3, "添加全文索引 transactions_fts", _migration_add_fulltext_index),
+    (4, "添加分页排序索引", _migration_add_listing_index),
+    (5, "添加导入批次", _migration_add_import_batches),
+    (6, "删除包含 is_undone 的冗余索引", _migration_drop_undo_heavy_indexes),
+    (7, "添加内容哈希 content_hash", _migration_add_content_hash),
+    (8, "添加变更日志和增量导出水位", _migration_add_change_log),
+    (9, "变更日志记录新增", _migration_log_inserts),
+    (10, "只为导入的记录保留内容哈希", _migration_hash_imported_rows_only),
+    (11, "逐行触发器在批量写入时跳过", _migration_guard_triggers_for_bulk_writes),
+    (12, "重建有效记录的日期索引", _migration_restore_active_date_index),
+]
+
+_fts_available = None # 全文索引是否存在，首次查询时检测
+
+def is_fulltext_search_available(conn=None):
+    """全文索引 transactions_fts 是否可用 (迁移 v3 在不支持 FTS5 的环境中会跳过建表)"""
+    global _fts_available
+    if _fts_available is None:
+        conn = conn or get_db_connection()
+        row = conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transactions_fts'").fetchone()
+        _fts_available = row is not None
+    return _fts_available
+
+def get_schema_version(conn=None):
+    """读取数据库当前的结构版本 (PRAGMA user_version)"""
+    conn = conn or get_db_connection()
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+def _apply_migrations(conn):
+    """【私有】按顺序执行所有尚未应用的迁移，每个迁移在独立的事务中完成"""
+    current_version = get_schema_version(conn)
+    applied = False
+    for version, description, migrate in MIGRATIONS:
+        if version <= current_version:
+            continue
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            migrate(conn)
+            conn.execute(f"PRAGMA user_version = {int(version)}")
+            conn.commit()
+            applied = True
+        except sqlite3.Error as e:
+            conn.rollback()
+            print(f"数据库迁移 v{version} ({description}) 失败: {e}")
+            raise
+    if applied:
+        # 更新查询优化器使用的统计信息，让新索引立即生效
+        conn.execute("ANALYZE")
+        conn.commit()
 
 def add_transaction(product_name, model_number, unit, quantity, unit_price, insertion_date_str, notes="", buyer="", seller=""):
     """
     添加一条交易记录 (已更新，包含购买方和销售方)
+    手工录入的记录不计算 content_hash (只有导入的记录参与唯一性检查)，内容相同的记录可以并存。
     :param quantity: 正数表示入库，负数表示出库
     :param insertion_date_str: 'YYYY-MM-DD' 格式的字符串
     """
@@ -52,13 +538,298 @@ def add_transaction(product_name, model_number, unit, quantity, unit_price, inse
         INSERT INTO transactions (insertion_date, product_name, model_number, unit, quantity, unit_price, total_amount, notes, buyer, seller)
         VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
         """, (insertion_date_str, product_name, model_number, unit, quantity, unit_price, total_amount, notes, buyer, seller))
-        conn.commit()
+        _commit_write(conn)
         return cursor.lastrowid
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"数据库错误: {e}")
         return None
+
+BULK_CHUNK_SIZE = 5000 # 批量写入时每次 executemany 的行数
+_BULK_INSERT_SQL = """
+INSERT INTO transactions (insertion_date, product_name, model_number, unit, quantity, unit_price, total_amount, notes, buyer, seller, content_hash, import_batch_id)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+def _validate_bulk_row(row_number, row, with_hash=True):
+    """
+    【私有】校验并规范化批量写入的一行，返回 INSERT 参数元组 (不含 import_batch_id)；数据无效时抛出 ValueError。
+    :param row_number: 错误信息中使用的行号
+    :param with_hash: 是否计算 content_hash，只有导入的记录需要，否则为 NULL
+    """
+    product_name = str(row.get("product_name") or "").strip()
+    model_number = str(row.get("model_number") or "").strip()
+    if not product_name or not model_number:
+        raise ValueError(f"第 {row_number} 行: 项目名称和规格型号不能为空")
+    quantity = row.get("quantity")
+    if isinstance(quantity, bool) or not isinstance(quantity, int) or quantity == 0:
+        raise ValueError(f"第 {row_number} 行: 数量必须是非零整数 ({quantity!r})")
+    try:
+        unit_price = float(row.get("unit_price"))
+    except (TypeError, ValueError):
+        raise ValueError(f"第 {row_number} 行: 单价必须是数字 ({row.get('unit_price')!r})")
+    if unit_price < 0:
+        raise ValueError(f"第 {row_number} 行: 单价不能为负数")
+    insertion_date = row.get("insertion_date")
+    try:
+        if len(insertion_date) != 10: # fromisoformat 比 strptime 快得多，但也接受 'YYYYMMDD' 等写法
+            raise ValueError
+        date.fromisoformat(insertion_date)
+    except (TypeError, ValueError):
+        raise ValueError(f"第 {row_number} 行: 操作日期应为 YYYY-MM-DD 格式 ({insertion_date!r})")
+    unit, notes, buyer, seller = (str(row.get(key) or "").strip() for key in ("unit", "notes", "buyer", "seller"))
+    content_hash = (compute_content_hash(insertion_date, product_name, model_number, unit, quantity, unit_price, buyer, seller, notes)
+                    if with_hash else None)
+    return (insertion_date, product_name, model_number, unit, quantity, unit_price,
+            abs(quantity) * unit_price, notes, buyer, seller, content_hash)
+
+def _current_transaction_seq(conn):
+    """【私有】读取 transactions 表 AUTOINCREMENT 的当前值"""
+    row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transactions'").fetchone()
+    return row[0] if row else 0
+
+@contextmanager
+def _bulk_mode(conn):
+    """
+    【私有】在当前写事务中让 _BULK_GUARDED_TRIGGERS 跳过 (bulk_mode 表中有一行)，由调用方一次性完成它们的工作。
+    这一行在提交前删除，其他连接永远看不到；事务中途失败时也随回滚一起消失。
+    """
+    conn.execute("INSERT INTO bulk_mode (active) VALUES (1)")
+    try:
+        yield
     finally:
-        conn.close()
+        conn.execute("DELETE FROM bulk_mode")
+
+def _sync_bulk_inserted_rows(conn, first_id, last_id):
+    """【私有】批量写入后，按 id 区间一次性更新库存表、全文索引和变更日志"""
+    conn.execute("""
+    INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+    SELECT product_name, model_number, IFNULL(unit, ''), SUM(quantity), COUNT(*)
+    FROM transactions
+    WHERE id BETWEEN ? AND ? AND is_undone = 0
+    GROUP BY product_name, model_number, IFNULL(unit, '')
+    ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+        current_stock = current_stock + excluded.current_stock,
+        active_count = active_count + excluded.active_count
+    """, (first_id, last_id))
+    if is_fulltext_search_available(conn):
+        conn.execute("""
+        INSERT INTO transactions_fts (rowid, product_name, model_number, buyer, seller, notes)
+        SELECT id, product_name, model_number, buyer, seller, notes
+        FROM transactions
+        WHERE id BETWEEN ? AND ?
+        """, (first_id, last_id))
+    conn.execute("""
+    INSERT INTO transaction_changes (transaction_id, change_type)
+    SELECT id, 'insert' FROM transactions WHERE id BETWEEN ? AND ? ORDER BY id
+    """, (first_id, last_id))
+
+def add_transactions_bulk(rows, chunk_size=BULK_CHUNK_SIZE, import_batch_id=None, row_numbers=None):
+    """
+    在一个事务中批量添加交易记录。
+    :param rows: 可迭代的字典，键与 add_transaction 的参数对应 (日期键为 insertion_date)，quantity 正数入库、负数出库
+    :param chunk_size: 每次 executemany 的行数；无论分多少块，都只提交一次
+    :param import_batch_id: 所属导入批次 (见 create_import_batch)，手工录入时为 None。
+                            只有导入的记录计算 content_hash，参与唯一性检查
+    :param row_numbers: 与 rows 对应的行号，用于错误信息 (调用方剔除了部分行时仍能指出原来的行)；默认为 1, 2, ...
+    :return: 新记录的 (first_id, last_id)，id 连续；没有任何行时返回 None
+    :raises ValueError: 某行数据无效 (此时不会写入任何记录)
+    数据库错误 (包括导入的记录与已导入的有效记录内容重复) 时回滚并返回 None。
+    """
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        start_seq = _current_transaction_seq(conn)
+        index = 0
+        numbers = iter(row_numbers) if row_numbers is not None else itertools.count(1)
+        with _bulk_mode(conn): # 逐行插入触发器的工作由 _sync_bulk_inserted_rows 按 id 区间一次性完成
+            chunk = []
+            with_hash = import_batch_id is not None
+            for row in rows:
+                chunk.append(_validate_bulk_row(next(numbers), row, with_hash) + (import_batch_id,))
+                index += 1
+                if len(chunk) >= chunk_size:
+                    conn.executemany(_BULK_INSERT_SQL, chunk)
+                    chunk = []
+            if chunk:
+                conn.executemany(_BULK_INSERT_SQL, chunk)
+        if index == 0:
+            conn.rollback()
+            return None
+        end_seq = _current_transaction_seq(conn)
+        _sync_bulk_inserted_rows(conn, start_seq + 1, end_seq)
+        _commit_write(conn)
+        return start_seq + 1, end_seq
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return None
+    except Exception:
+        conn.rollback() # 数据校验失败等：放弃整批写入
+        raise
+
+# --- 导入批次 ---
+
+def create_import_batch(file_name, file_hash):
+    """登记一次导入，返回批次ID (失败时返回 None)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.execute("INSERT INTO import_batches (file_name, file_hash) VALUES (?, ?)", (file_name, file_hash))
+        _commit_write(conn)
+        return cursor.lastrowid
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return None
+
+def finalize_import_batch(batch_id):
+    """
+    导入结束后统计批次的实际行数。没有任何记录写入的批次会被删除。
+    :return: 该批次写入的记录数
+    """
+    conn = get_db_connection()
+    try:
+        row_count = conn.execute("SELECT COUNT(*) FROM transactions WHERE import_batch_id = ?", (batch_id,)).fetchone()[0]
+        if row_count:
+            conn.execute("UPDATE import_batches SET row_count = ? WHERE id = ?", (row_count, batch_id))
+        else:
+            conn.execute("DELETE FROM import_batches WHERE id = ?", (batch_id,))
+        _commit_write(conn)
+        return row_count
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return 0
+
+def delete_import_batch(batch_id):
+    """永久删除一个导入批次及其全部记录 (用于丢弃被取消的导入)，成功返回 True"""
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("DELETE FROM transactions WHERE import_batch_id = ?", (batch_id,))
+        conn.execute("DELETE FROM import_batches WHERE id = ?", (batch_id,))
+        _commit_write(conn)
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return False
+
+def get_import_batches():
+    """获取全部导入历史，最近的在前"""
+    conn = get_db_connection()
+    return conn.execute("SELECT * FROM import_batches ORDER BY id DESC").fetchall()
+
+def get_import_batch(batch_id):
+    """通过ID获取单个导入批次"""
+    conn = get_db_connection()
+    return conn.execute("SELECT * FROM import_batches WHERE id = ?", (batch_id,)).fetchone()
+
+def set_import_batch_undone_status(batch_id, is_undone):
+    """
+    撤销/恢复整个导入批次：一条走 (import_batch_id, is_undone) 索引的 UPDATE。
+    逐行的库存和变更日志触发器在 bulk_mode 下跳过，改为按商品汇总后一次性调整库存表，并一次性写入变更日志。
+    :return: 状态发生变化的记录数，数据库错误时返回 None
+    """
+    target = 1 if is_undone else 0
+    current = 1 - target
+    sign = -1 if is_undone else 1 # 撤销时从库存中减去，恢复时加回
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.execute("""
+        INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+        SELECT product_name, model_number, IFNULL(unit, ''), ? * SUM(quantity), ? * COUNT(*)
+        FROM transactions
+        WHERE import_batch_id = ? AND is_undone = ?
+        GROUP BY product_name, model_number, IFNULL(unit, '')
+        ON CONFLICT (product_name, model_number, unit) DO UPDATE SET
+            current_stock = current_stock + excluded.current_stock,
+            active_count = active_count + excluded.active_count
+        """, (sign, sign, batch_id, current))
+        conn.execute("""
+        INSERT INTO transaction_changes (transaction_id, change_type)
+        SELECT id, ? FROM transactions WHERE import_batch_id = ? AND is_undone = ? ORDER BY id
+        """, ('undo' if is_undone else 'redo', batch_id, current))
+        with _bulk_mode(conn):
+            cursor = conn.execute(
+                "UPDATE transactions SET is_undone = ? WHERE import_batch_id = ? AND is_undone = ?",
+                (target, batch_id, current)
+            )
+        changed = cursor.rowcount
+        conn.execute("UPDATE import_batches SET is_undone = ? WHERE id = ?", (target, batch_id))
+        _commit_write(conn)
+        return changed
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return None
+
+def count_import_batch_conflicts(batch_id):
+    """恢复一个已撤销的批次前检查：批次中与现有有效记录内容相同的记录数 (大于 0 时无法恢复)"""
+    conn = get_db_connection()
+    return conn.execute("""
+    SELECT COUNT(*) FROM transactions AS t
+    WHERE t.import_batch_id = ? AND t.is_undone = 1
+      AND EXISTS (SELECT 1 FROM transactions AS a WHERE a.content_hash = t.content_hash AND a.is_undone = 0)
+    """, (batch_id,)).fetchone()[0]
+
+# --- 重复记录 ---
+
+def find_existing_content_hashes(content_hashes):
+    """返回 content_hashes 中已被有效的导入记录占用的哈希集合 (分块 IN 查询，走唯一索引)"""
+    conn = get_db_connection()
+    content_hashes = list(content_hashes)
+    existing = set()
+    for start in range(0, len(content_hashes), ID_CHUNK_SIZE):
+        chunk = content_hashes[start:start + ID_CHUNK_SIZE]
+        placeholders = ', '.join(['?'] * len(chunk))
+        existing.update(row[0] for row in conn.execute(
+            f"SELECT content_hash FROM transactions WHERE is_undone = 0 AND content_hash IN ({placeholders})", chunk))
+    return existing
+
+def has_active_duplicate(insertion_date, product_name, model_number, unit, quantity, unit_price, buyer, seller, notes):
+    """
+    是否已有内容完全相同的有效记录 (包括没有 content_hash 的手工录入记录，quantity 带符号)。
+    按操作日期走 idx_transactions_date_time 索引，只对当天的记录现场计算哈希。
+    """
+    content_hash = compute_content_hash(insertion_date, product_name, model_number, unit, quantity, unit_price, buyer, seller, notes)
+    row = get_db_connection().execute(f"""
+    SELECT 1 FROM transactions
+    WHERE insertion_date = ? AND is_undone = 0 AND transaction_content_hash({', '.join(CONTENT_HASH_FIELDS)}) = ?
+    LIMIT 1
+    """, (insertion_date, content_hash)).fetchone()
+    return row is not None
+
+def get_active_content_hashes():
+    """一次读出所有有效的导入记录的内容哈希 (只扫描唯一索引)，供导入大量文件时在内存中查重"""
+    conn = get_db_connection()
+    return {row[0] for row in conn.execute(
+        "SELECT content_hash FROM transactions WHERE is_undone = 0 AND content_hash IS NOT NULL")}
+
+def find_duplicate_transactions():
+    """
+    一次扫描找出内容完全相同的有效记录。哈希现场计算而不读 content_hash 列，
+    因为手工录入的记录 (迁移 v10 起) 没有该列，迁移 v7 之前已存在的重复记录中也只有一条保留了该列。
+    :return: 每组一个字典：该组第一条记录 (id 最小) 的字段，加上 ids (升序的全部 id) 和 count
+    """
+    conn = get_db_connection()
+    # 聚合查询中 MIN(id) 以外的裸列取自 id 最小的那一行 (SQLite 的特性)
+    rows = conn.execute(f"""
+    SELECT MIN(id) AS id, insertion_date, product_name, model_number, unit, quantity, unit_price,
+           buyer, seller, notes, COUNT(*) AS count, GROUP_CONCAT(id) AS ids
+    FROM transactions
+    WHERE is_undone = 0
+    GROUP BY transaction_content_hash({', '.join(CONTENT_HASH_FIELDS)})
+    HAVING COUNT(*) > 1
+    ORDER BY MIN(id)
+    """).fetchall()
+    groups = []
+    for row in rows:
+        group = dict(row)
+        group["ids"] = sorted(int(i) for i in row["ids"].split(","))
+        groups.append(group)
+    return groups
 
 def get_all_transactions(include_undone=False, sort_desc=True):
     """
@@ -86,7 +857,6 @@ def get_all_transactions(include_undone=False, sort_desc=True):
         
     cursor.execute(query)
     transactions = cursor.fetchall()
-    conn.close()
     return transactions
 
 def get_transaction_by_id(transaction_id):
@@ -95,7 +865,6 @@ def get_transaction_by_id(transaction_id):
     cursor = conn.cursor()
     cursor.execute("SELECT * FROM transactions WHERE id = ?", (transaction_id,))
     transaction = cursor.fetchone()
-    conn.close()
     return transaction
 
 def update_transaction_undone_status(transaction_id, is_undone):
@@ -104,13 +873,12 @@ def update_transaction_undone_status(transaction_id, is_undone):
     cursor = conn.cursor()
     try:
         cursor.execute("UPDATE transactions SET is_undone = ? WHERE id = ?", (1 if is_undone else 0, transaction_id))
-        conn.commit()
+        _commit_write(conn)
         return True
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"数据库错误: {e}")
         return False
-    finally:
-        conn.close()
 
 def delete_transaction_permanently(transaction_id):
     """永久删除一条交易记录 (请谨慎使用)"""
@@ -118,24 +886,211 @@ def delete_transaction_permanently(transaction_id):
     cursor = conn.cursor()
     try:
         cursor.execute("DELETE FROM transactions WHERE id = ?", (transaction_id,))
-        conn.commit()
+        _commit_write(conn)
         return True
     except sqlite3.Error as e:
+        conn.rollback()
         print(f"数据库错误: {e}")
         return False
+
+# --- ID 集合查询 ---
+# 少量 ID 直接写成 id IN (?, ?, ...)；数量较多时先把 ID 按顺序写入连接私有的临时表，
+# 再用 IN (SELECT ...) 或 JOIN 查询，语句长度与 ID 数量无关。
+# 单条语句的变量个数上限 SQLITE_MAX_VARIABLE_NUMBER 取决于编译选项：3.32 之前默认 999，之后默认 32766，
+# 有的发行版调到 250000，所以不能假定大的 IN 列表一定能执行；即使在上限以内，几十万个占位符的语句
+# 也要整条解析，并在每次执行时把 IN 列表建成临时 B 树，查询计划的代价随 ID 数量增长。
+
+ID_CHUNK_SIZE = 500 # 单条语句中 IN (...) 的最大占位符数，低于旧版 SQLite 的 999 上限
+ID_TEMP_TABLE_THRESHOLD = 2000 # ID 数量超过该值时改用临时表
+
+@contextmanager
+def _temp_id_table(conn, ids):
+    """
+    【私有】把 ids 按顺序写入临时表 temp.id_set (pos, id)，退出时清空。
+    临时表只属于当前连接，不会锁住主数据库；若调用前没有打开的事务，退出时结束写临时表开启的隐式事务。
+    """
+    outer_transaction = conn.in_transaction
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS id_set (pos INTEGER PRIMARY KEY, id INTEGER NOT NULL)")
+    conn.execute("DELETE FROM temp.id_set")
+    try:
+        conn.executemany("INSERT INTO temp.id_set (pos, id) VALUES (?, ?)", enumerate(ids))
+        yield
     finally:
-        conn.close()
-        
+        conn.execute("DELETE FROM temp.id_set")
+        if not outer_transaction:
+            conn.commit()
+
+@contextmanager
+def _id_set(conn, ids):
+    """
+    【私有】为一组 ID 生成 IN 条件，产出 [(in_clause, params), ...]，调用方对每一项执行一次语句。
+    少量 ID 时按 ID_CHUNK_SIZE 分块使用占位符 (在任何版本的变量个数上限以内)，否则只产出一项，指向临时表，
+    这样大批量的撤销/删除仍是一条语句。
+    """
+    if len(ids) <= ID_TEMP_TABLE_THRESHOLD:
+        batches = []
+        for start in range(0, len(ids), ID_CHUNK_SIZE):
+            chunk = ids[start:start + ID_CHUNK_SIZE]
+            batches.append(("(" + ", ".join(["?"] * len(chunk)) + ")", chunk))
+        yield batches
+        return
+    with _temp_id_table(conn, ids):
+        yield [("(SELECT id FROM temp.id_set)", [])]
+
+def _fetch_rows_in_order(conn, ids):
+    """【私有】按给定 id 的顺序取回整行记录 (ids 不能重复，已不存在的 id 被跳过)"""
+    if len(ids) > ID_TEMP_TABLE_THRESHOLD:
+        with _temp_id_table(conn, ids):
+            # 按 pos 顺序扫描临时表、逐个主键查找，结果天然有序，不需要额外排序
+            return conn.execute(
+                "SELECT t.* FROM temp.id_set AS s JOIN transactions AS t ON t.id = s.id ORDER BY s.pos"
+            ).fetchall()
+    rows_by_id = {}
+    with _id_set(conn, ids) as id_batches:
+        for in_clause, params in id_batches:
+            for row in conn.execute(f"SELECT * FROM transactions WHERE id IN {in_clause}", params):
+                rows_by_id[row['id']] = row
+    return [rows_by_id[i] for i in ids if i in rows_by_id]
+
+def _normalize_ids(transaction_ids):
+    """【私有】把 ID 列表 (Treeview 的 iid 是字符串) 转成去重后的整数列表，保持原顺序"""
+    return list(dict.fromkeys(int(tid) for tid in transaction_ids))
+
+def _fetch_undone_states(conn, id_batches):
+    """【私有】查询一组 ID 当前的 is_undone 状态，返回 {id: is_undone}"""
+    states = {}
+    for in_clause, params in id_batches:
+        for row in conn.execute(f"SELECT id, is_undone FROM transactions WHERE id IN {in_clause}", params):
+            states[row['id']] = bool(row['is_undone'])
+    return states
+
+def _find_redo_conflicts(conn, ids):
+    """
+    【私有】恢复一组记录前找出会违反内容哈希唯一索引 (迁移 v7) 的 ID：已有内容相同的有效记录，
+    或与本组中排在前面的另一条已撤销记录内容相同 (按顺序逐条恢复时，前一条恢复后它就无法恢复)。
+    """
+    hashes = {}
+    with _id_set(conn, ids) as id_batches:
+        for in_clause, params in id_batches:
+            for row in conn.execute(
+                f"SELECT id, content_hash FROM transactions "
+                f"WHERE is_undone = 1 AND content_hash IS NOT NULL AND id IN {in_clause}", params):
+                hashes[row['id']] = row['content_hash']
+    if not hashes:
+        return set()
+    active = find_existing_content_hashes(set(hashes.values()))
+    conflicts, restored = set(), set()
+    for tid in ids:
+        content_hash = hashes.get(tid)
+        if content_hash is None:
+            continue
+        if content_hash in active or content_hash in restored:
+            conflicts.add(tid)
+        else:
+            restored.add(content_hash)
+    return conflicts
+
+def set_transactions_undone_status(transaction_ids, is_undone):
+    """
+    批量更新撤销状态，所有修改在同一个事务中完成。
+    恢复时，与有效记录内容重复的记录保持撤销状态，结果为 'duplicate'，不影响同批的其他记录。
+    :return: {id: 'updated' | 'unchanged' | 'not_found' | 'duplicate'}，数据库错误时返回 None
+    """
+    ids = _normalize_ids(transaction_ids)
+    target = 1 if is_undone else 0
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        with _id_set(conn, ids) as id_batches:
+            states = _fetch_undone_states(conn, id_batches)
+        conflicts = set() if is_undone else _find_redo_conflicts(conn, ids)
+        update_ids = [tid for tid in ids if tid not in conflicts] if conflicts else ids
+        with _id_set(conn, update_ids) as id_batches:
+            for in_clause, params in id_batches:
+                conn.execute(
+                    f"UPDATE transactions SET is_undone = ? WHERE is_undone <> ? AND id IN {in_clause}",
+                    [target, target] + params
+                )
+        _commit_write(conn)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return None
+    updated = {tid for tid, undone in states.items() if undone != bool(target)}
+    return {
+        tid: 'not_found' if tid not in states else 'duplicate' if tid in conflicts
+        else 'updated' if tid in updated else 'unchanged'
+        for tid in ids
+    }
+
+def delete_transactions_permanently(transaction_ids):
+    """
+    批量永久删除交易记录 (请谨慎使用)，所有删除在同一个事务中完成。
+    :return: {id: 'deleted' | 'not_found'}，数据库错误时返回 None
+    """
+    ids = _normalize_ids(transaction_ids)
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        with _id_set(conn, ids) as id_batches:
+            existing = _fetch_undone_states(conn, id_batches)
+            for in_clause, params in id_batches:
+                conn.execute(f"DELETE FROM transactions WHERE id IN {in_clause}", params)
+        _commit_write(conn)
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return None
+    return {tid: 'deleted' if tid in existing else 'not_found' for tid in ids}
+
+def _date_range(year=None, month=None, day=None):
+    """
+    【私有】把年/月/日换算成半开区间 [start, end) 的 'YYYY-MM-DD' 字符串。
+    只有在指定了年份、且没有"跳过月份只指定日"时才能表示为单一区间，否则返回 None。
+    """
+    if not year or (day and not month):
+        return None
+    year = int(year)
+    if not month:
+        return date(year, 1, 1).isoformat(), date(year + 1, 1, 1).isoformat()
+    month = int(month)
+    if not day:
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return start.isoformat(), end.isoformat()
+    start = date(year, month, int(day))
+    return start.isoformat(), (start + timedelta(days=1)).isoformat()
+
+def _get_active_transactions_between(start_date, end_date_exclusive):
+    """【私有】查询 start_date <= insertion_date < end_date_exclusive 的未撤销记录"""
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    # 直接比较列值，可以使用 (is_undone, insertion_date, transaction_time) 索引做范围查找
+    cursor.execute("""
+    SELECT * FROM transactions
+    WHERE is_undone = 0 AND insertion_date >= ? AND insertion_date < ?
+    ORDER BY insertion_date DESC, transaction_time DESC
+    """, (start_date, end_date_exclusive))
+    return cursor.fetchall()
+
 def get_transactions_by_date(year=None, month=None, day=None):
     """按年、月、日查询交易记录 (未撤销的)"""
+    try:
+        date_range = _date_range(year, month, day)
+    except ValueError:
+        return [] # 不存在的日期 (如 13 月)，不会有任何记录
+    if date_range:
+        return _get_active_transactions_between(*date_range)
+
+    # 未指定年份时 (例如查询所有年份的 6 月)，无法转换成单一区间，只能逐行计算
     conn = get_db_connection()
     cursor = conn.cursor()
     conditions = ["is_undone = 0"]
     params = []
 
     if year:
-        conditions.append("strftime('%Y', insertion_date) = ?")
-        params.append(str(year))
+        conditions.append("insertion_date >= ? AND insertion_date < ?")
+        params.extend([f"{int(year):04d}-01-01", f"{int(year) + 1:04d}-01-01"])
     if month:
         conditions.append("strftime('%m', insertion_date) = ?")
         params.append(str(month).zfill(2)) # 保证两位月份
@@ -147,34 +1102,64 @@ def get_transactions_by_date(year=None, month=None, day=None):
     
     cursor.execute(query, params)
     transactions = cursor.fetchall()
-    conn.close()
     return transactions
 
-def get_transactions_with_advanced_filter(filter_criteria: dict):
+def get_transactions_by_iso_week(year, week):
+    """查询 ISO 周 (周一至周日) 内的交易记录 (未撤销的)"""
+    start = date.fromisocalendar(int(year), int(week), 1)
+    return _get_active_transactions_between(start.isoformat(), (start + timedelta(days=7)).isoformat())
+
+def get_transactions_by_quarter(year, quarter):
+    """查询某年第 1-4 季度的交易记录 (未撤销的)"""
+    quarter = int(quarter)
+    if not 1 <= quarter <= 4:
+        raise ValueError(f"季度必须在 1-4 之间: {quarter}")
+    start = date(int(year), 3 * quarter - 2, 1)
+    end = date(int(year) + 1, 1, 1) if quarter == 4 else date(int(year), 3 * quarter + 1, 1)
+    return _get_active_transactions_between(start.isoformat(), end.isoformat())
+
+def get_transactions_in_range(start_date, end_date):
     """
-    【新增】根据一个复杂的条件字典来动态构建查询
+    查询日期区间内的交易记录 (未撤销的)。
+    :param start_date: 'YYYY-MM-DD' 格式的开始日期 (包含)
+    :param end_date: 'YYYY-MM-DD' 格式的结束日期 (包含)
+    """
+    start = datetime.strptime(start_date, '%Y-%m-%d').date()
+    end = datetime.strptime(end_date, '%Y-%m-%d').date() + timedelta(days=1)
+    return _get_active_transactions_between(start.isoformat(), end.isoformat())
+
+# 高级筛选中做子串匹配的文本列 (notes 只在全文索引中，暂无对应的筛选项)
+TEXT_FILTER_COLUMNS = ("product_name", "model_number", "buyer", "seller", "notes")
+FTS_MIN_TERM_LENGTH = 3 # trigram 分词器只能匹配至少 3 个字符的子串
+
+def _fts_match_term(column, term):
+    """【私有】生成 FTS5 列过滤表达式，整个词按短语处理 (双引号转义)"""
+    return f'{column} : "{term.replace(chr(34), chr(34) * 2)}"'
+
+def _build_advanced_filter_clause(conn, filter_criteria: dict):
+    """
+    【私有】把筛选条件字典转换成 WHERE 子句和参数列表。
+    文本子串条件优先通过 FTS5 全文索引匹配；索引不可用或关键词不足 3 个字符时退回 LIKE。
+    返回 (where_clause, params, uses_fulltext)。
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    
     query_parts = ["1=1"]  # 使用 1=1 作为基础，方便后面 AND 连接
     params = []
+    match_terms = []
+    use_fts = is_fulltext_search_available(conn)
 
-    if filter_criteria.get("product_name"):
-        query_parts.append("product_name LIKE ?")
-        params.append(f"%{filter_criteria['product_name']}%")
-    
-    if filter_criteria.get("model_number"):
-        query_parts.append("model_number LIKE ?")
-        params.append(f"%{filter_criteria['model_number']}%")
-
-    if filter_criteria.get("buyer"):
-        query_parts.append("buyer LIKE ?")
-        params.append(f"%{filter_criteria['buyer']}%")
+    for column in TEXT_FILTER_COLUMNS:
+        term = filter_criteria.get(column)
+        if not term:
+            continue
+        if use_fts and len(term) >= FTS_MIN_TERM_LENGTH:
+            match_terms.append(_fts_match_term(column, term))
+        else:
+            query_parts.append(f"{column} LIKE ?")
+            params.append(f"%{term}%")
 
-    if filter_criteria.get("seller"):
-        query_parts.append("seller LIKE ?")
-        params.append(f"%{filter_criteria['seller']}%")
+    if match_terms:
+        query_parts.append("id IN (SELECT rowid FROM transactions_fts WHERE transactions_fts MATCH ?)")
+        params.append(" AND ".join(match_terms))
         
     # 交易类型筛选
     trans_type = filter_criteria.get("transaction_type")
@@ -193,53 +1178,362 @@ def get_transactions_with_advanced_filter(filter_criteria: dict):
     if end_date:
         query_parts.append("insertion_date <= ?")
         params.append(end_date)
-        
-    query = "SELECT * FROM transactions WHERE " + " AND ".join(query_parts) + " ORDER BY insertion_date DESC, transaction_time DESC"
+
+    return " AND ".join(query_parts), params, bool(match_terms)
+
+def get_transactions_with_advanced_filter(filter_criteria: dict):
+    """
+    【新增】根据一个复杂的条件字典来动态构建查询
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    where_clause, params, _ = _build_advanced_filter_clause(conn, filter_criteria)
+    query = "SELECT * FROM transactions WHERE " + where_clause + " ORDER BY insertion_date DESC, transaction_time DESC"
     
     cursor.execute(query, params)
     transactions = [dict(row) for row in cursor.fetchall()]
-    conn.close()
     return transactions
 
+DEFAULT_PAGE_SIZE = 500
+
+def iter_transaction_pages(filter_criteria=None, include_undone=True, page_size=DEFAULT_PAGE_SIZE):
+    """
+    按 insertion_date、transaction_time、id 降序分页读取交易记录，每次产出一页 (sqlite3.Row 列表)。
+    采用键集分页：下一页从上一页最后一行的排序键之后开始查询，
+    翻到多深都只是一次索引查找，而且两页之间不占用游标，不阻塞写入。
+
+    :param filter_criteria: 与 get_transactions_with_advanced_filter 相同的筛选条件字典，可为空
+    :param include_undone: 是否包含已撤销的记录
+    :param page_size: 每页的行数
+    """
+    conn = get_db_connection()
+    where_clause, params, uses_fulltext = _build_advanced_filter_clause(conn, filter_criteria or {})
+    if not include_undone:
+        where_clause += " AND is_undone = 0"
+    order_by = " ORDER BY insertion_date DESC, transaction_time DESC, id DESC"
+
+    if uses_fulltext:
+        # 全文匹配的结果集无法沿日期索引顺序读取，每页都重新匹配并排序的代价太高；
+        # 这里只做一次匹配+排序 (只取 id)，再按主键逐页取整行
+        ordered_ids = [row[0] for row in conn.execute("SELECT id FROM transactions WHERE " + where_clause + order_by, params)]
+        for start in range(0, len(ordered_ids), page_size):
+            page = _fetch_rows_in_order(conn, ordered_ids[start:start + page_size])
+            if page:
+                yield page
+        return
+
+    first_page_query = "SELECT * FROM transactions WHERE " + where_clause + order_by + " LIMIT ?"
+    next_page_query = ("SELECT * FROM transactions WHERE " + where_clause
+                       + " AND (insertion_date, transaction_time, id) < (?, ?, ?)" + order_by + " LIMIT ?")
+
+    rows = conn.execute(first_page_query, params + [page_size]).fetchall()
+    while rows:
+        yield rows
+        if len(rows) < page_size:
+            return
+        last = rows[-1]
+        rows = conn.execute(
+            next_page_query,
+            params + [last['insertion_date'], last['transaction_time'], last['id'], page_size]
+        ).fetchall()
+
 def get_transactions_by_ids(transaction_ids: list):
-    """根据ID列表获取指定的交易记录"""
-    if not transaction_ids:
+    """
+    根据ID列表获取指定的交易记录，按传入的顺序返回 (重复的 ID 只返回一次，不存在的 ID 被跳过)。
+    ID 数量没有上限：超过 ID_TEMP_TABLE_THRESHOLD 时改走临时表连接，不依赖编译时的 SQLite 变量个数上限。
+    """
+    ids = _normalize_ids(transaction_ids)
+    if not ids:
         return []
-    
     conn = get_db_connection()
-    cursor = conn.cursor()
-    
-    # 创建SQL查询中的占位符，例如 (?, ?, ?)
-    placeholders = ', '.join(['?'] * len(transaction_ids))
-    query = f"SELECT * FROM transactions WHERE id IN ({placeholders})"
-    
-    cursor.execute(query, transaction_ids)
-    transactions = cursor.fetchall()
+    return [dict(row) for row in _fetch_rows_in_order(conn, ids)]
 
-    # 同样，转换为字典列表以保证兼容性
-    transactions_as_dicts = [dict(row) for row in transactions]
-    
-    conn.close()
-    
-    return transactions_as_dicts
+def get_matching_transactions_by_ids(transaction_ids: list, filter_criteria=None):
+    """
+    返回指定 ID 中符合筛选条件 (与 get_transactions_with_advanced_filter 相同，可为空) 的记录，顺序不定。
+    用于视图的增量刷新：只判断变更过的记录是否仍属于当前视图，不重新执行整个查询。
+    """
+    ids = _normalize_ids(transaction_ids)
+    if not ids:
+        return []
+    conn = get_db_connection()
+    where_clause, params, _ = _build_advanced_filter_clause(conn, filter_criteria or {})
+    rows = []
+    with _id_set(conn, ids) as id_batches:
+        for in_clause, id_params in id_batches:
+            query = f"SELECT * FROM transactions WHERE id IN {in_clause} AND " + where_clause
+            rows.extend(dict(row) for row in conn.execute(query, list(id_params) + params))
+    return rows
+
+def get_totals_by_ids(transaction_ids: list):
+    """
+    汇总一组交易记录中未撤销部分的金额与笔数 (在 SQL 中聚合，不取回整行)。
+    :return: {"total_amount": float, "count": int}
+    """
+    ids = _normalize_ids(transaction_ids)
+    total_amount, count = 0.0, 0
+    if not ids:
+        return {"total_amount": total_amount, "count": count}
+    conn = get_db_connection()
+    with _id_set(conn, ids) as id_batches:
+        for in_clause, params in id_batches:
+            row = conn.execute(
+                f"SELECT TOTAL(total_amount), COUNT(*) FROM transactions WHERE is_undone = 0 AND id IN {in_clause}",
+                params
+            ).fetchone()
+            total_amount += row[0]
+            count += row[1]
+    return {"total_amount": total_amount, "count": count}
+
+# --- 导出 ---
+# 导出文件的列：(表头, SQL 表达式)。类型、状态和数量的绝对值直接在 SQL 中计算，逐行取出即可写入文件
+EXPORT_COLUMNS = [
+    ("ID", "t.id"),
+    ("操作日期", "t.insertion_date"),
+    ("项目名称", "t.product_name"),
+    ("规格型号", "t.model_number"),
+    ("购买方", "t.buyer"),
+    ("销售方", "t.seller"),
+    ("单位", "t.unit"),
+    ("类型", "CASE WHEN t.quantity > 0 THEN '入库' ELSE '出库' END"),
+    ("数量", "ABS(t.quantity)"),
+    ("单价", "t.unit_price"),
+    ("总金额", "t.total_amount"),
+    ("状态", "CASE WHEN t.is_undone THEN '已撤销' ELSE '有效' END"),
+    ("备注", "t.notes"),
+    ("记录时间", "t.transaction_time"),
+]
+EXPORT_FETCH_SIZE = 2000 # 每次从游标取出的行数
+
+def iter_export_rows(transaction_ids=None):
+    """
+    逐行产出导出用的元组 (列顺序与 EXPORT_COLUMNS 一致)，内存中只保留一批行。
+    :param transaction_ids: 为 None 时导出全部记录 (按 ID 降序)，否则按给定顺序导出这些记录
+    """
+    conn = get_db_connection()
+    select_list = ", ".join(expr for _, expr in EXPORT_COLUMNS)
+    if transaction_ids is None:
+        cursor = conn.execute(f"SELECT {select_list} FROM transactions AS t ORDER BY t.id DESC")
+        yield from _drain_cursor(cursor)
+        return
+    ids = _normalize_ids(transaction_ids)
+    if not ids:
+        return
+    with _temp_id_table(conn, ids):
+        cursor = conn.execute(
+            f"SELECT {select_list} FROM temp.id_set AS s JOIN transactions AS t ON t.id = s.id ORDER BY s.pos"
+        )
+        yield from _drain_cursor(cursor)
+
+# --- 变更日志 ---
+
+CHANGE_BATCH_SIZE = 5000 # get_changes_since 默认每次最多返回的条数
+
+def get_latest_change_seq():
+    """变更日志中最新的序号，日志为空时为 0"""
+    conn = get_db_connection()
+    return conn.execute("SELECT IFNULL(MAX(seq), 0) FROM transaction_changes").fetchone()[0]
+
+def get_changes_since(seq, limit=CHANGE_BATCH_SIZE):
+    """
+    按序号顺序返回 seq 之后的变更 (主键范围扫描)。
+    :return: 字典列表，键为 seq, transaction_id, change_type ('insert'/'undo'/'redo'/'delete'), changed_at
+    """
+    conn = get_db_connection()
+    rows = conn.execute(
+        "SELECT seq, transaction_id, change_type, changed_at FROM transaction_changes WHERE seq > ? ORDER BY seq LIMIT ?",
+        (seq, limit)
+    ).fetchall()
+    return [dict(row) for row in rows]
+
+# --- 增量导出 ---
+# 水位 = (最大交易 id, 最大变更序号)。id 大于上次水位的记录作为“新增”导出 (带当前状态)，
+# 其余记录只有在变更日志中出现时才导出 (日志中的 'insert' 只会属于前一种)，每条只导出一次，变更类型取其最新状态。
+# 使用方应按 ID 幂等地应用这些行 (新增/撤销/恢复 = 按 ID 覆盖，删除 = 按 ID 删除，ID 不存在时忽略)。
+
+DEFAULT_EXPORT_WATERMARK = "default"
+CHANGE_TYPE_COLUMN = "变更类型"
+
+def get_change_watermark(conn=None):
+    """当前的 (最大交易 id, 最大变更序号)"""
+    conn = conn or get_db_connection()
+    max_seq = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM transaction_changes").fetchone()[0]
+    return _current_transaction_seq(conn), max_seq
+
+def get_export_watermark(name=DEFAULT_EXPORT_WATERMARK):
+    """上次增量导出保存的水位 (max_transaction_id, change_seq)；从未导出过时为 (0, 0)"""
+    conn = get_db_connection()
+    row = conn.execute(
+        "SELECT max_transaction_id, change_seq FROM export_watermarks WHERE name = ?", (name,)
+    ).fetchone()
+    return (row[0], row[1]) if row else (0, 0)
+
+def save_export_watermark(name, max_transaction_id, change_seq):
+    """记录一次增量导出完成时的水位，成功返回 True"""
+    conn = get_db_connection()
+    try:
+        conn.execute("""
+        INSERT INTO export_watermarks (name, max_transaction_id, change_seq) VALUES (?, ?, ?)
+        ON CONFLICT (name) DO UPDATE SET
+            max_transaction_id = excluded.max_transaction_id,
+            change_seq = excluded.change_seq,
+            exported_at = CURRENT_TIMESTAMP
+        """, (name, max_transaction_id, change_seq))
+        conn.commit()
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return False
+
+@contextmanager
+def incremental_export_snapshot(since):
+    """
+    在一个读事务中取得本次导出的水位并读取变化，产出 (until, rows)：
+    until 为 get_change_watermark() 的结果，rows 为 iter_incremental_export_rows(since, until)。
+    水位和各行来自同一个快照，期间其他连接提交的写入不会一半计入本次、一半留给下次。
+    rows 需要在 with 块内读完；退出时结束读事务。
+    """
+    conn = get_db_connection()
+    conn.execute("BEGIN")
+    rows = None
+    try:
+        until = get_change_watermark(conn)
+        rows = iter_incremental_export_rows(since, until, conn)
+        yield until, rows
+    finally:
+        if rows is not None:
+            rows.close()
+        conn.commit() # 只读事务，提交即释放快照
+
+def iter_incremental_export_rows(since, until, conn=None):
+    """
+    逐行产出两个水位之间的变化，列为 EXPORT_COLUMNS 加上末尾的变更类型 ('新增'/'撤销'/'恢复'/'删除')。
+    已删除的记录只有 ID 和变更类型，其余列为空。
+    :param since: 上次导出的水位 (max_transaction_id, change_seq)
+    :param until: 本次导出的水位；应与读取在同一个读事务中取得，见 incremental_export_snapshot
+    """
+    conn = conn or get_db_connection()
+    since_id, since_seq = since
+    until_id, until_seq = until
+    select_list = ", ".join(expr for _, expr in EXPORT_COLUMNS)
+    cursor = conn.execute(
+        f"SELECT {select_list}, '新增' FROM transactions AS t WHERE t.id > ? AND t.id <= ? ORDER BY t.id",
+        (since_id, until_id)
+    )
+    yield from _drain_cursor(cursor)
+    # 已删除的记录在 LEFT JOIN 中整行为 NULL，除 ID 外的列都输出为空
+    changed_list = ", ".join(
+        "c.transaction_id" if header == "ID" else f"CASE WHEN t.id IS NULL THEN NULL ELSE {expr} END"
+        for header, expr in EXPORT_COLUMNS
+    )
+    cursor = conn.execute(f"""
+    SELECT {changed_list}, CASE WHEN t.id IS NULL THEN '删除' WHEN t.is_undone THEN '撤销' ELSE '恢复' END
+    FROM (
+        SELECT transaction_id, MAX(seq) AS seq FROM transaction_changes
+        WHERE seq > ? AND seq <= ? AND transaction_id <= ?
+        GROUP BY transaction_id
+    ) AS c
+    LEFT JOIN transactions AS t ON t.id = c.transaction_id
+    ORDER BY c.seq
+    """, (since_seq, until_seq, since_id))
+    yield from _drain_cursor(cursor)
+
+def _drain_cursor(cursor):
+    """【私有】按 EXPORT_FETCH_SIZE 分批读取游标，逐行产出普通元组"""
+    try:
+        while True:
+            rows = cursor.fetchmany(EXPORT_FETCH_SIZE)
+            if not rows:
+                return
+            for row in rows:
+                yield tuple(row)
+    finally:
+        cursor.close()
 
 def get_product_summary():
-    """获取单个种类商品的总体情况 (当前库存)"""
+    """获取单个种类商品的总体情况 (当前库存)，直接读取由触发器维护的 stock_levels 表"""
     conn = get_db_connection()
     cursor = conn.cursor()
     
-    # 这里不使用 HAVING，因为我们希望显示所有商品，即使当前库存为0
-    # group by 语句可能要进行修改，因为product_name 和 unit 可能会有多个名称
+    # 库存为 0 的商品同样显示；只有全部交易都被撤销或删除的商品才不显示
     cursor.execute("""
-    SELECT product_name, model_number, unit, SUM(quantity) as current_stock
-    FROM transactions
-    WHERE is_undone = 0
-    GROUP BY product_name, model_number, unit
-    ORDER BY product_name, model_number
+    SELECT product_name, model_number, unit, current_stock
+    FROM stock_levels
+    WHERE active_count > 0
+    ORDER BY product_name, model_number, unit
     """)
     summary = cursor.fetchall()
-    conn.close()
     return summary
 
-# 在模块加载时确保数据库和表已创建
-initialize_database()
\ No newline at end of file
+def get_stock_level(product_name, model_number, unit=None):
+    """
+    获取单个商品的当前库存 (主键查找)。
+    未指定 unit 时，返回该商品按单位排序后的第一条库存记录；商品不存在时返回 0。
+    """
+    conn = get_db_connection()
+    query = "SELECT current_stock FROM stock_levels WHERE product_name = ? AND model_number = ? AND active_count > 0"
+    params = [product_name, model_number]
+    if unit is not None:
+        query += " AND unit = ?"
+        params.append(unit)
+    query += " ORDER BY unit LIMIT 1"
+    row = conn.execute(query, params).fetchone()
+    return row['current_stock'] if row else 0
+
+def _rebuild_stock_levels(conn):
+    """【私有】根据交易记录重新计算 stock_levels (不提交事务)"""
+    conn.execute("DELETE FROM stock_levels")
+    conn.execute("""
+    INSERT INTO stock_levels (product_name, model_number, unit, current_stock, active_count)
+    SELECT product_name, model_number, IFNULL(unit, ''), SUM(quantity), COUNT(*)
+    FROM transactions
+    WHERE is_undone = 0
+    GROUP BY product_name, model_number, IFNULL(unit, '')
+    """)
+
+def rebuild_stock_levels():
+    """从全部交易记录重建 stock_levels 表"""
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        _rebuild_stock_levels(conn)
+        _commit_write(conn)
+        return True
+    except sqlite3.Error as e:
+        conn.rollback()
+        print(f"数据库错误: {e}")
+        return False
+
+def verify_stock_levels():
+    """
+    将 stock_levels 与交易记录的实时汇总进行比对。
+    返回不一致的商品列表 (空列表表示一致)，每项包含期望值与实际值。
+    """
+    conn = get_db_connection()
+    cursor = conn.cursor()
+    cursor.execute("""
+    WITH expected AS (
+        SELECT product_name, model_number, IFNULL(unit, '') AS unit,
+               SUM(quantity) AS current_stock, COUNT(*) AS active_count
+        FROM transactions
+        WHERE is_undone = 0
+        GROUP BY product_name, model_number, IFNULL(unit, '')
+    ),
+    actual AS (
+        SELECT * FROM stock_levels WHERE active_count > 0
+    )
+    SELECT e.product_name, e.model_number, e.unit,
+           e.current_stock AS expected_stock, a.current_stock AS actual_stock
+    FROM expected e
+    LEFT JOIN actual a
+      ON a.product_name = e.product_name AND a.model_number = e.model_number AND a.unit = e.unit
+    WHERE a.current_stock IS NOT e.current_stock OR a.active_count IS NOT e.active_count
+    UNION ALL
+    SELECT a.product_name, a.model_number, a.unit, NULL, a.current_stock
+    FROM actual a
+    LEFT JOIN expected e
+      ON e.product_name = a.product_name AND e.model_number = a.model_number AND e.unit = a.unit
+    WHERE e.product_name IS NULL
+    """)
+    return [dict(row) for row in cursor.fetchall()]
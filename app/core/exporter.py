@@ -0,0 +1,132 @@
+# app/core/exporter.py
+"""
+导出交易记录：从数据库游标逐行读取，直接写入目标文件。
+类型/状态标签在 SQL 中计算 (见 data_manager.EXPORT_COLUMNS)，不再构建 DataFrame，内存占用与记录数无关。
+
+支持 Excel (openpyxl write_only)、CSV (UTF-8 BOM，Excel 可直接打开) 和 Parquet (需要 pyarrow)，
+三种格式的列和表头完全相同，都可以再由 importer 导入。
+export_incremental 只导出自上次增量导出以来的变化 (基于 data_manager 的变更日志和水位)。
+"""
+import csv
+import itertools
+import os
+import openpyxl
+from . import data_manager
+from .import_parsing import require_pyarrow # 导入和导出共用的 pyarrow 按需导入
+
+SHEET_TITLE = "Sheet1" # 与以前 DataFrame.to_excel 生成的工作表名保持一致
+PARQUET_BATCH_ROWS = 50000 # Parquet 每个行组的行数
+PARQUET_COMPRESSION = "zstd"
+PROGRESS_EVERY_ROWS = 5000 # 每写入这么多行调用一次进度回调
+
+def export_headers() -> list:
+    """导出文件的表头"""
+    return [header for header, _ in data_manager.EXPORT_COLUMNS]
+
+def _counted(rows, progress_callback):
+    """【私有】逐行转发 rows，每 PROGRESS_EVERY_ROWS 行以 (已写入行数,) 调用一次进度回调"""
+    count = 0
+    for row in rows:
+        yield row
+        count += 1
+        if progress_callback and count % PROGRESS_EVERY_ROWS == 0:
+            progress_callback(count)
+
+def _write_excel(file_path: str, headers: list, rows, progress_callback=None) -> int:
+    """【私有】把 rows 写入 Excel 文件，返回写入的行数；rows 为空时不创建文件，返回 0"""
+    first = next(rows, None)
+    if first is None:
+        return 0
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(SHEET_TITLE)
+    sheet.append(headers)
+    count = 0
+    for row in _counted(itertools.chain([first], rows), progress_callback):
+        sheet.append(row)
+        count += 1
+    workbook.save(file_path)
+    return count
+
+def _write_csv(file_path: str, headers: list, rows, progress_callback=None) -> int:
+    """【私有】把 rows 写入 CSV 文件 (utf-8-sig)，返回写入的行数；rows 为空时不创建文件，返回 0"""
+    first = next(rows, None)
+    if first is None:
+        return 0
+    count = 0
+    with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(headers)
+        for row in _counted(itertools.chain([first], rows), progress_callback):
+            writer.writerow(row)
+            count += 1
+    return count
+
+def _parquet_schema(pa, headers: list):
+    """【私有】各列对应的 Arrow 类型，文本列为 string"""
+    types = {"ID": pa.int64(), "数量": pa.int64(), "单价": pa.float64(), "总金额": pa.float64()}
+    return pa.schema([(header, types.get(header, pa.string())) for header in headers])
+
+def _write_parquet(file_path: str, headers: list, rows, progress_callback=None) -> int:
+    """【私有】把 rows 写入 Parquet 文件 (按列压缩)，每 PARQUET_BATCH_ROWS 行写一个行组，返回写入的行数"""
+    pa, pq = require_pyarrow()
+    first = next(rows, None)
+    if first is None:
+        return 0
+    schema = _parquet_schema(pa, headers)
+    count = 0
+    with pq.ParquetWriter(file_path, schema, compression=PARQUET_COMPRESSION) as writer:
+        rows = _counted(itertools.chain([first], rows), progress_callback)
+        while True:
+            batch = list(itertools.islice(rows, PARQUET_BATCH_ROWS))
+            if not batch:
+                break
+            columns = list(zip(*batch)) # 行转列
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(values, type=field.type) for values, field in zip(columns, schema)], schema=schema))
+            count += len(batch)
+    return count
+
+def export_excel(file_path: str, transaction_ids=None, progress_callback=None) -> int:
+    """
+    导出到 Excel 文件，返回写入的记录数；没有记录时不创建文件，返回 0。
+    :param transaction_ids: 为 None 时导出全部记录，否则只导出这些记录 (保持给定顺序)
+    :param progress_callback: 可选，定期以 (已写入行数,) 调用；回调抛出的异常会中止导出
+    """
+    return _write_excel(file_path, export_headers(), data_manager.iter_export_rows(transaction_ids), progress_callback)
+
+def export_csv(file_path: str, transaction_ids=None, progress_callback=None) -> int:
+    """导出到 CSV 文件 (utf-8-sig)，返回写入的记录数；没有记录时不创建文件，返回 0"""
+    return _write_csv(file_path, export_headers(), data_manager.iter_export_rows(transaction_ids), progress_callback)
+
+def export_parquet(file_path: str, transaction_ids=None, progress_callback=None) -> int:
+    """导出到 Parquet 文件 (需要 pyarrow)，返回写入的记录数"""
+    return _write_parquet(file_path, export_headers(), data_manager.iter_export_rows(transaction_ids), progress_callback)
+
+# 扩展名 -> 导出函数
+EXPORT_FORMATS = {".xlsx": export_excel, ".csv": export_csv, ".parquet": export_parquet}
+_WRITERS = {".xlsx": _write_excel, ".csv": _write_csv, ".parquet": _write_parquet}
+
+def _extension(file_path: str) -> str:
+    """【私有】返回小写扩展名；不支持的扩展名抛出 ValueError"""
+    extension = os.path.splitext(file_path)[1].lower()
+    if extension not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式 '{extension}'，请使用 .xlsx、.csv 或 .parquet。")
+    return extension
+
+def export_to_file(file_path: str, transaction_ids=None, progress_callback=None) -> int:
+    """根据扩展名选择导出格式；不支持的扩展名抛出 ValueError"""
+    return EXPORT_FORMATS[_extension(file_path)](file_path, transaction_ids, progress_callback)
+
+def export_incremental(file_path: str, name: str = data_manager.DEFAULT_EXPORT_WATERMARK, progress_callback=None) -> int:
+    """
+    增量导出：只导出自名为 name 的上次增量导出以来新增、撤销、恢复或删除的记录，末尾多一列变更类型。
+    第一次导出时全部记录都作为“新增”导出。文件写完后才保存新的水位，所以导出失败或取消后可以直接重试。
+    格式按扩展名选择；返回写入的行数，没有变化时不创建文件，返回 0。
+    """
+    writer = _WRITERS[_extension(file_path)]
+    since = data_manager.get_export_watermark(name)
+    with data_manager.incremental_export_snapshot(since) as (until, rows):
+        count = writer(file_path, export_headers() + [data_manager.CHANGE_TYPE_COLUMN], rows, progress_callback)
+    if not data_manager.save_export_watermark(name, *until):
+        raise RuntimeError("文件已写入，但无法保存导出水位，下次增量导出会包含重复的行。")
+    return count
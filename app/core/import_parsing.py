@@ -0,0 +1,221 @@
+# app/core/import_parsing.py
+"""
+导入文件的读取与校验：按块读取 Excel / CSV / Parquet，整列转换并校验，产出可直接写入的记录。
+本模块不访问数据库，也不导入 data_manager 或 app 中的其他模块，多文件导入时在 spawn 方式启动的子进程中执行 parse_file；
+子进程除主模块 (main.py 的顶层不导入任何 app 模块) 外只需导入本模块和 pandas/openpyxl，不会打开或初始化数据库。
+写入、查重和导入批次由 importer 负责。
+"""
+import csv
+import hashlib
+import os
+import numpy as np
+import openpyxl
+import pandas as pd
+
+REQUIRED_COLUMNS = ['项目名称', '规格型号', '类型', '数量', '单价', '操作日期']
+OPTIONAL_COLUMNS = {'单位': 'unit', '备注': 'notes', '购买方': 'buyer', '销售方': 'seller'}
+TRANSACTION_TYPES = ("入库", "出库")
+FIRST_DATA_ROW = 2 # Excel 中第一行数据的行号 (第 1 行是表头)
+STREAM_CHUNK_ROWS = 5000 # 流式导入时每块的行数，每块单独校验并在一个事务中写入
+DUPLICATE_REASON = "与已有记录重复，已跳过"
+
+class ImportReport:
+    """一次导入的结果：写入/拒绝的行数，以及每一个无效行的行号和原因"""
+    def __init__(self, file_name: str):
+        self.file_name = file_name
+        self.batch_id = None
+        self.file_hash = None # 已在别处 (如解析子进程) 算好的 SHA-256，None 时登记批次前再计算
+        self.error = None # 整个文件无法导入时的原因 (多文件导入中使用)
+        self.inserted = 0
+        self.errors = [] # [(Excel 行号, 原因)]
+        self.duplicates = [] # 因内容重复而跳过的行号
+
+    @property
+    def rejected(self) -> int:
+        return len(self.errors)
+
+    def summary(self, max_errors: int = 5) -> str:
+        """生成给用户看的摘要，只列出前 max_errors 条错误"""
+        skipped = f"，跳过 {len(self.duplicates)} 条重复记录" if self.duplicates else ""
+        if not self.errors and not self.inserted:
+            if self.duplicates:
+                return f"文件中的 {len(self.duplicates)} 条记录均已存在，没有导入新记录。"
+            return "文件中没有可导入的记录。"
+        if not self.errors:
+            return f"成功导入 {self.inserted} 条记录 (批次号 {self.batch_id}){skipped}。"
+        details = "\n".join(f"行 {row}: {reason}" for row, reason in self.errors[:max_errors])
+        if self.rejected > max_errors:
+            details += f"\n... 其余 {self.rejected - max_errors} 条错误可保存为错误报告查看。"
+        return f"导入完成。成功: {self.inserted}, 失败: {self.rejected}{skipped}。\n\n错误详情:\n" + details
+
+    def report_rows(self) -> list:
+        """错误行和被跳过的重复行，按行号排序，用于错误报告"""
+        return sorted(self.errors + [(row, DUPLICATE_REASON) for row in self.duplicates], key=lambda item: item[0])
+
+    def save_errors(self, file_path: str):
+        """把全部错误行和被跳过的重复行写入 CSV (utf-8-sig，Excel 可直接打开)"""
+        with open(file_path, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['行号', '原因'])
+            writer.writerows(self.report_rows())
+
+def require_pyarrow():
+    """按需导入 pyarrow；未安装时抛出带安装提示的 RuntimeError"""
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError:
+        raise RuntimeError("Parquet 格式需要 pyarrow，请先执行 pip install pyarrow") from None
+    return pyarrow, pyarrow.parquet
+
+def file_sha256(file_path: str) -> str:
+    """分块计算文件内容的 SHA-256，用于在导入历史中识别同一文件"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def check_columns(columns):
+    """缺少必需列时抛出 ValueError"""
+    for col in REQUIRED_COLUMNS:
+        if col not in columns:
+            raise ValueError(f"文件中缺少必需的列 '{col}'。")
+
+def _text_column(df, column):
+    """【私有】把一列转成去除首尾空白的字符串，空单元格为 ''"""
+    if column not in df.columns:
+        return pd.Series('', index=df.index)
+    return df[column].fillna('').astype(str).str.strip()
+
+def validate_frame(df: pd.DataFrame, row_numbers=None):
+    """
+    整列转换并校验一个 DataFrame (列名为 Excel 表头)。
+    :param row_numbers: 每行在 Excel 中的行号，用于错误报告；默认从 FIRST_DATA_ROW 起连续编号
+    :return: (records, errors, record_rows)。records 是可直接交给 add_transactions_bulk 的字典列表
+             (quantity 已按类型带符号)；errors 是 [(行号, 原因)]，按行号排序；record_rows 是每条记录的行号
+    """
+    product_name = _text_column(df, '项目名称')
+    model_number = _text_column(df, '规格型号')
+    trans_type = _text_column(df, '类型')
+    # 无法解析的值 (以及 inf) 转为 NaN，由下面的掩码报告
+    quantity = pd.to_numeric(df['数量'], errors='coerce').replace([np.inf, -np.inf], np.nan)
+    unit_price = pd.to_numeric(df['单价'], errors='coerce').replace([np.inf, -np.inf], np.nan)
+    insertion_date = pd.to_datetime(df['操作日期'], errors='coerce', format='mixed')
+
+    # 每个条件一个布尔掩码；一行可能同时违反多条，全部列出
+    checks = [
+        ((product_name == '') | (model_number == '') | (trans_type == ''), lambda i: "项目名称, 规格型号, 类型不能为空。"),
+        ((trans_type != '') & ~trans_type.isin(TRANSACTION_TYPES), lambda i: f"类型 '{trans_type.iat[i]}' 无效，应为'入库'或'出库'。"),
+        (quantity.isna(), lambda i: f"'数量'格式无效 ({df['数量'].iat[i]})"),
+        (quantity.notna() & (quantity <= 0), lambda i: "数量必须为正数。"),
+        (quantity.notna() & (quantity > 0) & (quantity != quantity.round()), lambda i: f"数量必须为整数 ({quantity.iat[i]})"),
+        (unit_price.isna(), lambda i: f"'单价'格式无效 ({df['单价'].iat[i]})"),
+        (unit_price < 0, lambda i: "单价不能为负数。"),
+        (insertion_date.isna(), lambda i: f"'操作日期'格式无效 ({df['操作日期'].iat[i]})"),
+    ]
+    invalid = np.zeros(len(df), dtype=bool)
+    reasons = {}
+    for mask, describe in checks:
+        mask = mask.to_numpy()
+        invalid |= mask
+        for i in np.flatnonzero(mask):
+            reasons.setdefault(i, []).append(describe(i))
+    if row_numbers is None:
+        row_numbers = range(FIRST_DATA_ROW, FIRST_DATA_ROW + len(df))
+    errors = [(row_numbers[i], " ".join(reasons[i])) for i in sorted(reasons)]
+
+    valid = ~invalid
+    valid_quantity = quantity[valid].astype('int64')
+    signed_quantity = valid_quantity.where(trans_type[valid] == "入库", -valid_quantity)
+    columns = {
+        "product_name": product_name[valid],
+        "model_number": model_number[valid],
+        "quantity": signed_quantity,
+        "unit_price": unit_price[valid],
+        "insertion_date": insertion_date[valid].dt.strftime('%Y-%m-%d'),
+    }
+    for source, key in OPTIONAL_COLUMNS.items():
+        columns[key] = _text_column(df, source)[valid]
+    keys = list(columns)
+    # tolist() 得到 Python 原生的 int/float/str，add_transactions_bulk 按原生类型校验
+    records = [dict(zip(keys, values)) for values in zip(*(columns[key].tolist() for key in keys))]
+    record_rows = [row_numbers[i] for i in np.flatnonzero(valid)]
+    return records, errors, record_rows
+
+def _iter_sheet_chunks(file_path: str, chunk_rows: int):
+    """
+    【私有】以只读模式逐行读取第一个工作表，每 chunk_rows 行产出一次 (DataFrame, Excel 行号列表)。
+    完全空白的行被跳过；缺少必需列时抛出 ValueError。
+    """
+    workbook = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook.active.iter_rows(values_only=True)
+        header = [str(cell).strip() if cell is not None else "" for cell in next(rows, ())]
+        check_columns(header)
+        width = len(header)
+        chunk, row_numbers = [], []
+        for row_number, row in enumerate(rows, start=FIRST_DATA_ROW):
+            if all(cell is None or cell == "" for cell in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row)) # 只读模式下各行长度不一定相同
+            chunk.append(row)
+            row_numbers.append(row_number)
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame(chunk, columns=header, dtype=object), row_numbers
+                chunk, row_numbers = [], []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=header, dtype=object), row_numbers
+    finally:
+        workbook.close() # 只读模式会保持文件句柄，必须显式关闭
+
+def _iter_csv_chunks(file_path: str, chunk_rows: int):
+    """【私有】分块读取 CSV (utf-8-sig)，产出 (DataFrame, 行号列表)；缺少必需列时抛出 ValueError"""
+    check_columns(pd.read_csv(file_path, nrows=0, encoding='utf-8-sig').columns)
+    next_row = FIRST_DATA_ROW
+    with pd.read_csv(file_path, dtype=object, encoding='utf-8-sig', skip_blank_lines=False, chunksize=chunk_rows) as reader:
+        for df in reader:
+            row_numbers = range(next_row, next_row + len(df))
+            next_row += len(df)
+            blank = df.isna().all(axis=1).to_numpy() # 与 Excel 一致，跳过完全空白的行
+            if blank.any():
+                df = df[~blank]
+                row_numbers = [n for n, is_blank in zip(row_numbers, blank) if not is_blank]
+            if len(df):
+                yield df.reset_index(drop=True), row_numbers
+
+def _iter_parquet_chunks(file_path: str, chunk_rows: int):
+    """【私有】按行组分批读取 Parquet，产出 (DataFrame, 行号列表)；缺少必需列时抛出 ValueError"""
+    _, pq = require_pyarrow()
+    parquet_file = pq.ParquetFile(file_path)
+    check_columns(parquet_file.schema_arrow.names)
+    next_row = FIRST_DATA_ROW # Parquet 没有表头行，行号沿用与导出的 Excel/CSV 相同的编号
+    for batch in parquet_file.iter_batches(batch_size=chunk_rows):
+        df = batch.to_pandas().astype(object)
+        yield df, range(next_row, next_row + len(df))
+        next_row += len(df)
+
+
+def _chunk_reader(file_path: str):
+    """【私有】按扩展名选择逐块读取函数"""
+    extension = os.path.splitext(file_path)[1].lower()
+    return {".csv": _iter_csv_chunks, ".parquet": _iter_parquet_chunks}.get(extension, _iter_sheet_chunks)
+
+def parse_file(file_path: str):
+    """
+    读取并校验整个文件，但不写数据库，也不查重 (可在子进程中执行)。
+    :return: (report, records, record_rows)；文件本身无法读取或缺少必需列时 report.error 记录原因，records 为空
+    """
+    report = ImportReport(os.path.basename(file_path))
+    records, record_rows = [], []
+    try:
+        report.file_hash = file_sha256(file_path)
+        for df, row_numbers in _chunk_reader(file_path)(file_path, STREAM_CHUNK_ROWS):
+            chunk_records, errors, chunk_rows = validate_frame(df, row_numbers)
+            records.extend(chunk_records)
+            record_rows.extend(chunk_rows)
+            report.errors.extend(errors)
+    except Exception as e: # 损坏的文件、缺少列、缺少 pyarrow 等，都只记在这个文件的报告里
+        report.error = str(e)
+        return report, [], []
+    return report, records, record_rows
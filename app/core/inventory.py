@@ -1,11 +1,22 @@
 # app/core/inventory.py
-from . import data_manager
-import pandas as pd
-from datetime import datetime
+from . import config_manager, data_manager, exporter, importer
+from .changes import ChangeFeed, latest_changes_by_id
+from .query_cache import QueryCache, freeze_key
+import os
+
+NO_NEW_CHANGES_MESSAGE = "自上次增量导出以来没有新的变更。"
+VIEW_PAGE_SIZE = 2000 # iter_record_pages 每页的行数
+VIEW_CHANGE_LIMIT = 20000 # 增量刷新最多处理的变更条数，更多时 (如大批量导入) 重新加载整个列表更快
+REDO_DUPLICATE_MESSAGE = "已存在内容相同的有效记录 (可能已重新录入或导入)，无法恢复"
+DUPLICATE_ENTRY_WARNING = "注意：已存在内容完全相同的有效记录 (日期、商品、数量、单价、购买方、销售方和备注都相同)，请确认不是重复录入；如确为另一笔交易，建议在备注中注明以区分。"
 
 class InventoryManager:
     def __init__(self):
-        pass # data_manager is used directly via its functions
+        self.last_import_report = None # 最近一次导入的 importer.ImportReport
+        self.last_import_reports = [] # 最近一次多文件导入中每个文件的 ImportReport
+        self._change_feed = None # 第一次订阅时创建
+        # 汇总、全部记录和高级筛选的结果缓存，数据库有任何写入后自动失效
+        self.query_cache = QueryCache(int(config_manager.load_query_cache_mb() * 1024 * 1024))
 
     def record_inbound(self, product_name, model_number, unit, quantity, unit_price, insertion_date_str, notes="", buyer="", seller=""):
         """
@@ -14,9 +25,10 @@ class InventoryManager:
         """
         if quantity <= 0:
             return False, "入库数量必须大于0"
+        duplicate = data_manager.has_active_duplicate(insertion_date_str, product_name, model_number, unit, quantity, unit_price, buyer, seller, notes)
         # 入库时，我们记录的是销售方(seller)
         result_id = data_manager.add_transaction(product_name, model_number, unit, quantity, unit_price, insertion_date_str, notes, buyer, seller)
-        return (True, "入库成功") if result_id else (False, "数据库操作失败")
+        return (True, self._with_duplicate_warning("入库成功", duplicate)) if result_id else (False, "数据库操作失败")
     
     def record_outbound(self, product_name, model_number, unit, quantity, unit_price, insertion_date_str, notes="", buyer="", seller=""):
         """
@@ -26,10 +38,75 @@ class InventoryManager:
         if quantity <= 0:
             return False, "出库数量必须大于0"
         
+        duplicate = data_manager.has_active_duplicate(insertion_date_str, product_name, model_number, unit, -quantity, unit_price, buyer, seller, notes)
         # 出库时，我们记录的是购买方(buyer)
         result_id = data_manager.add_transaction(product_name, model_number, unit, -quantity, unit_price, insertion_date_str, notes, buyer, seller)
-        return (True, "出库成功") if result_id else (False, "数据库操作失败")
+        return (True, self._with_duplicate_warning("出库成功", duplicate)) if result_id else (False, "数据库操作失败")
     
+    @staticmethod
+    def _with_duplicate_warning(message, duplicate):
+        """【私有】手工录入与已有记录完全相同时照常写入，只在成功提示后附上提醒"""
+        return f"{message}\n\n{DUPLICATE_ENTRY_WARNING}" if duplicate else message
+
+    def record_batch(self, records, chunk_size=data_manager.BULK_CHUNK_SIZE, import_batch_id=None):
+        """
+        批量记录出入库，全部记录在同一个事务中写入，任何一条失败则整批回滚。
+        :param records: 字典列表，字段与 record_inbound 相同 (日期键为 insertion_date)，
+                        另加 transaction_type ('入库' 或 '出库')；quantity 均为正数
+        :param import_batch_id: 记录所属的导入批次，手工录入时为 None。只有导入的记录检查内容重复：
+                                与已导入的有效记录或本批中更早的记录相同的记录被跳过 (与文件导入相同)，
+                                结果记在 self.last_import_report 中 (duplicates 为被跳过的记录序号，从 1 开始)
+        :return: (success, message, id_range)，成功时 id_range 为新记录的 (first_id, last_id)；
+                 导入的记录全部重复而被跳过时 success 为 True，id_range 为 None
+        """
+        signed_records = []
+        for index, record in enumerate(records):
+            trans_type = record.get("transaction_type")
+            quantity = record.get("quantity")
+            if trans_type not in ("入库", "出库"):
+                return False, f"第 {index + 1} 条: 类型 '{trans_type}' 无效，应为'入库'或'出库'。", None
+            if not isinstance(quantity, int) or quantity <= 0:
+                return False, f"第 {index + 1} 条: {trans_type}数量必须大于0", None
+            signed = dict(record)
+            signed["quantity"] = quantity if trans_type == "入库" else -quantity
+            signed_records.append(signed)
+        if not signed_records:
+            return False, "没有需要写入的记录", None
+        if import_batch_id is None:
+            return self._write_batch(signed_records, chunk_size, None)
+
+        report = importer.ImportReport(f"导入批次 {import_batch_id}")
+        report.batch_id = import_batch_id
+        self.last_import_report = report
+        row_numbers = list(range(1, len(signed_records) + 1))
+        try:
+            kept, _, report.duplicates = importer.DuplicateFilter().split(signed_records, row_numbers)
+        except (TypeError, ValueError): # 无法计算哈希的记录交给 add_transactions_bulk 给出具体是哪一条
+            kept = signed_records
+        if not kept:
+            return True, f"{len(report.duplicates)} 条记录均已存在，没有写入新记录。", None
+        skipped = set(report.duplicates)
+        kept_numbers = [number for number in row_numbers if number not in skipped]
+        success, message, id_range = self._write_batch(kept, chunk_size, import_batch_id, kept_numbers)
+        if success:
+            report.inserted = len(kept)
+            if report.duplicates:
+                numbers = "、".join(map(str, report.duplicates[:10])) + (" 等" if len(report.duplicates) > 10 else "")
+                message += f"，跳过 {len(report.duplicates)} 条重复记录 (第 {numbers} 条)"
+        return success, message, id_range
+
+    def _write_batch(self, signed_records, chunk_size, import_batch_id, row_numbers=None):
+        """【私有】在一个事务中写入已带符号的记录，返回 (success, message, id_range)"""
+        try:
+            id_range = data_manager.add_transactions_bulk(
+                signed_records, chunk_size=chunk_size, import_batch_id=import_batch_id, row_numbers=row_numbers
+            )
+        except ValueError as e:
+            return False, f"批量写入失败: {e}", None
+        if id_range is None:
+            return False, "数据库操作失败", None
+        return True, f"成功写入 {len(signed_records)} 条记录", id_range
+
     def undo_transaction(self, transaction_id):
         """撤销一笔交易"""
         transaction = data_manager.get_transaction_by_id(transaction_id)
@@ -51,6 +128,8 @@ class InventoryManager:
             return False, "交易不存在"
         if not transaction['is_undone']: # 如果不是已撤销状态
             return False, "交易未被撤销，无需恢复"
+        if transaction['content_hash'] and data_manager.find_existing_content_hashes([transaction['content_hash']]):
+            return False, REDO_DUPLICATE_MESSAGE
         
         success = data_manager.update_transaction_undone_status(transaction_id, False) # 设置为未撤销
         if success:
@@ -67,164 +146,298 @@ class InventoryManager:
         else:
             return False, "删除失败"
 
+    def _set_undone_status_batch(self, transaction_ids, is_undone, messages):
+        """【私有】批量撤销/恢复的公共流程，messages 把数据层的结果代码映射为 (success, message)"""
+        outcomes = data_manager.set_transactions_undone_status(transaction_ids, is_undone)
+        if outcomes is None:
+            failure = messages['error']
+            return {int(tid): failure for tid in transaction_ids}
+        return {tid: messages[outcome] for tid, outcome in outcomes.items()}
+
+    def undo_transactions(self, transaction_ids):
+        """
+        批量撤销交易 (单个事务)。
+        :return: {id: (success, message)}，与 undo_transaction 的返回值含义相同
+        """
+        return self._set_undone_status_batch(transaction_ids, True, {
+            'updated': (True, "交易撤销成功"),
+            'unchanged': (False, "交易已撤销，无需重复操作"),
+            'not_found': (False, "交易不存在"),
+            'error': (False, "交易撤销失败"),
+        })
+
+    def redo_transactions(self, transaction_ids):
+        """
+        批量恢复已撤销的交易 (单个事务)。
+        :return: {id: (success, message)}，与 redo_transaction 的返回值含义相同
+        """
+        return self._set_undone_status_batch(transaction_ids, False, {
+            'updated': (True, "交易恢复成功"),
+            'unchanged': (False, "交易未被撤销，无需恢复"),
+            'not_found': (False, "交易不存在"),
+            'duplicate': (False, REDO_DUPLICATE_MESSAGE),
+            'error': (False, "交易恢复失败"),
+        })
+
+    def delete_transactions(self, transaction_ids):
+        """
+        批量永久删除记录 (单个事务)。
+        :return: {id: (success, message)}
+        """
+        outcomes = data_manager.delete_transactions_permanently(transaction_ids)
+        if outcomes is None:
+            return {int(tid): (False, "删除失败") for tid in transaction_ids}
+        return {
+            tid: (True, "记录已永久删除") if outcome == 'deleted' else (False, "交易不存在")
+            for tid, outcome in outcomes.items()
+        }
+
     def get_all_records(self, include_undone=False):
-        """获取所有交易记录 (UI显示用)"""
-        return data_manager.get_all_transactions(include_undone=include_undone)
+        """获取所有交易记录 (UI显示用)。结果可能来自缓存，调用方不要修改返回的列表"""
+        return self.query_cache.get_or_load(
+            ("all_records", include_undone),
+            lambda: data_manager.get_all_transactions(include_undone=include_undone)
+        )
    
     def get_records_with_advanced_filter(self, filter_criteria: dict):
-        """调用数据层执行高级筛选"""
-        return data_manager.get_transactions_with_advanced_filter(filter_criteria)
+        """调用数据层执行高级筛选，结果按筛选条件缓存 (调用方不要修改返回的记录)"""
+        return self.query_cache.get_or_load(
+            ("advanced_filter", freeze_key(filter_criteria)),
+            lambda: data_manager.get_transactions_with_advanced_filter(filter_criteria)
+        )
+
+    def get_all_records_paged(self, include_undone=False, page_size=data_manager.DEFAULT_PAGE_SIZE):
+        """
+        分页获取所有交易记录 (按操作日期、记录时间降序)。
+        返回一个生成器，每次产出一页记录，调用方拿到第一页即可开始显示。
+        """
+        return data_manager.iter_transaction_pages(include_undone=include_undone, page_size=page_size)
+
+    def get_records_with_advanced_filter_paged(self, filter_criteria: dict, page_size=data_manager.DEFAULT_PAGE_SIZE):
+        """高级筛选的分页版本，返回逐页产出记录的生成器"""
+        return data_manager.iter_transaction_pages(filter_criteria, include_undone=True, page_size=page_size)
+
+    def iter_record_pages(self, filter_criteria=None, page_size=VIEW_PAGE_SIZE):
+        """
+        逐页产出交易记录 (包括已撤销的，按操作日期、记录时间降序)，用于界面边加载边显示；
+        filter_criteria 与 get_records_with_advanced_filter 相同，为空时返回全部记录。
+        完整读完的结果按筛选条件缓存，缓存命中时整个结果作为一页产出 (调用方不要修改)。
+        """
+        filter_criteria = filter_criteria or {}
+        return self.query_cache.iter_pages(
+            ("record_pages", freeze_key(filter_criteria)),
+            lambda: data_manager.iter_transaction_pages(filter_criteria, include_undone=True, page_size=page_size)
+        )
 
     def get_product_summary_view(self):
-        """获取商品汇总视图"""
-        return data_manager.get_product_summary()
+        """获取商品汇总视图 (可能来自缓存)"""
+        return self.query_cache.get_or_load(("product_summary",), data_manager.get_product_summary)
+
+    def get_cache_stats(self) -> dict:
+        """查询缓存的命中/未命中次数、占用内存等，用于诊断"""
+        return self.query_cache.stats()
 
     def get_current_stock_for_product(self, product_name, model_number):
         """获取特定商品当前库存"""
-        summary = data_manager.get_product_summary()
-        for item in summary:
-            if item['product_name'] == product_name and item['model_number'] == model_number:
-                return item['current_stock']
-        return 0
+        return data_manager.get_stock_level(product_name, model_number)
+
+    def rebuild_stock_levels(self) -> tuple[bool, str]:
+        """根据全部交易记录重建库存表"""
+        if data_manager.rebuild_stock_levels():
+            return True, "库存表已重建"
+        return False, "库存表重建失败"
+
+    def verify_stock_levels(self) -> tuple[bool, str]:
+        """校验库存表与交易记录是否一致"""
+        mismatches = data_manager.verify_stock_levels()
+        if not mismatches:
+            return True, "库存表与交易记录一致"
+        details = [
+            f"{m['product_name']} / {m['model_number']} / {m['unit']}: 应为 {m['expected_stock']}, 实为 {m['actual_stock']}"
+            for m in mismatches
+        ]
+        return False, f"发现 {len(mismatches)} 处不一致:\n" + "\n".join(details)
         
     def calculate_selected_totals(self, selected_transaction_ids):
-        """计算选定交易的总金额 (税额暂不处理)"""
-        total_value = 0
-        valid_transactions = 0
-        for tid in selected_transaction_ids:
-            transaction = data_manager.get_transaction_by_id(tid)
-            if transaction and not transaction['is_undone']: # 只计算有效且未撤销的
-                total_value += transaction['total_amount']
-                valid_transactions +=1
-        return {"total_amount": total_value, "count": valid_transactions}
+        """计算选定交易的总金额 (税额暂不处理)，只计算有效且未撤销的记录"""
+        return data_manager.get_totals_by_ids(selected_transaction_ids)
     
     def get_transaction_details(self, transaction_id):
         """获取单个交易记录的详细信息"""
         return data_manager.get_transaction_by_id(transaction_id)
     
-    def _format_and_save_to_excel(self, records: list, file_path: str) -> tuple[bool, str]:
-        """
-        【私有辅助方法】将给定的记录列表格式化并保存到Excel。
-        """
-        if not records:
-            return False, "没有可导出的记录。"
+    def _export(self, export_function, file_path: str, transaction_ids=None, progress_callback=None,
+                empty_message="没有可导出的记录。") -> tuple[bool, str]:
+        """【私有辅助方法】调用 exporter 中的导出函数，并把结果转换成 (success, message)"""
         try:
-            records_as_dicts = [dict(row) for row in records]
-            df = pd.DataFrame(records_as_dicts)
-
-            df.fillna('', inplace=True)
-
-            # --- 数据格式化 ---
-            df['类型'] = df['quantity'].apply(lambda x: "入库" if x > 0 else "出库")
-            df['状态'] = df['is_undone'].apply(lambda x: "已撤销" if x else "有效")
-            df['quantity'] = df['quantity'].abs()
-
-            # --- 重命名并排序 ---
-            df_to_export = df.rename(columns={
-                'id': 'ID',
-                'insertion_date': '操作日期',
-                'product_name': '项目名称',
-                'model_number': '规格型号',
-                'unit': '单位',
-                'quantity': '数量',
-                'unit_price': '单价',
-                'total_amount': '总金额',
-                'notes': '备注',
-                'transaction_time': '记录时间',
-                'buyer': '购买方',
-                'seller': '销售方'
-            })
-            export_columns = [
-                'ID', '操作日期', '项目名称', '规格型号', '购买方', '销售方', '单位', '类型',
-                '数量', '单价', '总金额', '状态', '备注', '记录时间'
-            ]
-            
-            export_columns_exist = [col for col in export_columns if col in df_to_export.columns]
-            df_to_export = df_to_export[export_columns_exist]
-            
-            df_to_export.to_excel(file_path, index=False, engine='openpyxl')
-            return True, f"成功导出 {len(df)} 条记录到 {file_path}"
-
-        except KeyError as e:
-            return False, f"导出失败：处理数据时找不到预期的列名 {e}。"
+            count = export_function(file_path, transaction_ids, progress_callback)
+        except importer.OperationCancelled:
+            if os.path.exists(file_path):
+                os.remove(file_path) # 不保留写到一半的文件
+            return False, "导出已取消。"
+        except (ValueError, RuntimeError) as e: # 不支持的格式 / 缺少 pyarrow
+            return False, f"导出失败：{e}"
+        except OSError as e:
+            return False, f"导出失败，无法写入文件: {e}"
         except Exception as e:
             return False, f"导出失败，发生未知错误: {e}"
+        if count == 0:
+            return False, empty_message
+        return True, f"成功导出 {count} 条记录到 {file_path}"
 
     def export_to_excel(self, file_path: str) -> tuple[bool, str]:
         """【导出全部】将所有交易记录导出到 Excel 文件。"""
-        records = data_manager.get_all_transactions(include_undone=True)
-        return self._format_and_save_to_excel(records, file_path)
+        return self._export(exporter.export_excel, file_path)
 
     def export_selected_records(self, transaction_ids: list, file_path: str) -> tuple[bool, str]:
         """【导出选中】将指定的交易记录导出到 Excel 文件。"""
-        records = data_manager.get_transactions_by_ids(transaction_ids)
-        return self._format_and_save_to_excel(records, file_path)
-    
-        
-    def import_from_excel(self, file_path: str) -> tuple[bool, str]:
-        """从 Excel 文件导入交易记录。"""
+        return self._export(exporter.export_excel, file_path, transaction_ids)
+
+    def export_records(self, file_path: str, transaction_ids: list = None, progress_callback=None) -> tuple[bool, str]:
+        """
+        按扩展名导出为 Excel (.xlsx)、CSV (.csv) 或 Parquet (.parquet)；transaction_ids 为 None 时导出全部。
+        :param progress_callback: 可选，定期以 (已写入行数,) 调用；抛出 importer.OperationCancelled 可取消导出
+        """
+        return self._export(exporter.export_to_file, file_path, transaction_ids, progress_callback)
+
+    def export_incremental(self, file_path: str, name: str = data_manager.DEFAULT_EXPORT_WATERMARK,
+                           progress_callback=None) -> tuple[bool, str]:
+        """
+        增量导出自上次增量导出 (按 name 区分使用方) 以来的新增、撤销、恢复和删除，格式按扩展名选择。
+        只有文件写完后才会推进水位，失败或取消后重新导出即可。
+        """
+        return self._export(
+            lambda path, _, progress: exporter.export_incremental(path, name, progress),
+            file_path, None, progress_callback, empty_message=NO_NEW_CHANGES_MESSAGE
+        )
+
+    def import_from_excel(self, file_path: str, progress_callback=None) -> tuple[bool, str]:
+        """
+        从 Excel 文件导入交易记录。有效行作为一个导入批次整体写入 (可通过 undo_import 撤销)，
+        无效行全部记录在 self.last_import_report.errors 中。
+        文件大于配置的阈值时改用流式导入，逐块读取和写入。
+        :param progress_callback: 可选，以 (已解析行数, 已写入行数, 已拒绝行数) 报告进度；
+                                  抛出 importer.OperationCancelled 可取消导入 (已写入的记录会被删除)
+        """
+        threshold_bytes = config_manager.load_streaming_import_threshold_mb() * 1024 * 1024
+        streaming = (file_path.lower().endswith(('.xlsx', '.xlsm')) and os.path.isfile(file_path)
+                     and os.path.getsize(file_path) > threshold_bytes)
+        import_function = importer.import_excel_streaming if streaming else importer.import_excel
+        return self._run_import(import_function, file_path, progress_callback)
+
+    def import_from_file(self, file_path: str, progress_callback=None) -> tuple[bool, str]:
+        """按扩展名导入 CSV (.csv)、Parquet (.parquet) 或 Excel 文件，返回值与 import_from_excel 相同"""
+        extension = os.path.splitext(file_path)[1].lower()
+        if extension in importer.IMPORT_FORMATS:
+            return self._run_import(importer.IMPORT_FORMATS[extension], file_path, progress_callback)
+        return self.import_from_excel(file_path, progress_callback)
+
+    def import_files(self, file_paths: list, progress_callback=None) -> tuple[bool, str]:
+        """
+        批量导入多个文件 (如一个文件夹中各分店的月度报表)：并行解析，按顺序逐个文件写入，
+        每个文件是一个独立的事务和导入批次。各文件的报告保存在 self.last_import_reports 中。
+        :param progress_callback: 可选，以 (已完成文件数, 文件总数, 已写入记录数) 报告进度
+        """
+        self.last_import_reports = []
+        if not file_paths:
+            return False, "没有找到可导入的文件 (支持 .xlsx、.csv、.parquet)。"
         try:
-            df = pd.read_excel(file_path).fillna('')
-
-            required_columns = ['项目名称', '规格型号', '类型', '数量', '单价', '操作日期']
-            for col in required_columns:
-                if col not in df.columns:
-                    return False, f"导入失败：Excel文件中缺少必需的列 '{col}'。"
-
-            success_count = 0
-            fail_count = 0
-            error_messages = []
-
-            for index, row in df.iterrows():
-                try:
-                    product_name = str(row['项目名称']).strip()
-                    model_number = str(row['规格型号']).strip()
-                    trans_type = str(row['类型']).strip()
-                    quantity = int(row['数量'])
-                    unit_price = float(row['单价'])
-                    
-                    try:
-                        insertion_date = pd.to_datetime(row['操作日期']).strftime('%Y-%m-%d')
-                    except (ValueError, TypeError):
-                        fail_count += 1
-                        error_messages.append(f"行 {index+2}: '操作日期'格式无效 ({row['操作日期']})")
-                        continue
-                        
-                    unit = str(row.get('单位', '')).strip()
-                    notes = str(row.get('备注', '')).strip()
-                    buyer = str(row.get('购买方', '')).strip()
-                    seller = str(row.get('销售方', '')).strip()
-
-                    if not all([product_name, model_number, trans_type]):
-                        fail_count += 1
-                        error_messages.append(f"行 {index+2}: 项目名称, 规格型号, 类型不能为空。")
-                        continue
-                    
-                    if quantity <= 0:
-                        fail_count += 1
-                        error_messages.append(f"行 {index+2}: 数量必须为正数。")
-                        continue
-
-                    if trans_type == "入库":
-                        self.record_inbound(product_name, model_number, unit, quantity, unit_price, insertion_date, notes, buyer=buyer, seller=seller)
-                    elif trans_type == "出库":
-                        self.record_outbound(product_name, model_number, unit, quantity, unit_price, insertion_date, notes, buyer=buyer, seller=seller)
-                    else:
-                        fail_count += 1
-                        error_messages.append(f"行 {index+2}: 类型 '{trans_type}' 无效，应为'入库'或'出库'。")
-                        continue
-                    
-                    success_count += 1
-                except (ValueError, TypeError) as e:
-                    fail_count += 1
-                    error_messages.append(f"行 {index+2}: 数据格式错误 - {e}")
-                    continue
-
-            if fail_count > 0:
-                summary = f"导入完成。成功: {success_count}, 失败: {fail_count}。\n\n错误详情:\n" + "\n".join(error_messages[:5])
-                return False, summary
-            else:
-                return True, f"成功导入 {success_count} 条记录。"
+            reports = importer.import_files(file_paths, progress_callback)
+        except importer.OperationCancelled:
+            return False, "导入已取消。已完成的文件保留在导入历史中，可以整批撤销。"
         except Exception as e:
             return False, f"导入失败: {e}"
-        
\ No newline at end of file
+        self.last_import_reports = reports
+        success = all(not r.error and not r.rejected for r in reports)
+        return success, importer.summarize_file_reports(reports)
+
+    def _run_import(self, import_function, file_path: str, progress_callback) -> tuple[bool, str]:
+        """【私有辅助方法】执行 importer 中的导入函数，保存报告并转换成 (success, message)"""
+        self.last_import_report = None
+        try:
+            report = import_function(file_path, progress_callback)
+        except importer.OperationCancelled:
+            return False, "导入已取消，未写入任何记录。"
+        except (ValueError, RuntimeError) as e:
+            return False, f"导入失败：{e}"
+        except Exception as e:
+            return False, f"导入失败: {e}"
+        self.last_import_report = report
+        return report.rejected == 0, report.summary()
+
+    def find_duplicate_transactions(self):
+        """扫描一遍全部有效记录，返回内容完全相同的记录组 (见 data_manager.find_duplicate_transactions)"""
+        return data_manager.find_duplicate_transactions()
+
+    def latest_change_seq(self) -> int:
+        """变更日志中最新的序号；组件可以先记下它，之后用 changes_since 只取增量"""
+        return data_manager.get_latest_change_seq()
+
+    def changes_since(self, seq: int, limit: int = data_manager.CHANGE_BATCH_SIZE) -> list:
+        """
+        返回序号 seq 之后的变更 (按 seq 升序，最多 limit 条)，每条为
+        {seq, transaction_id, change_type ('insert'/'undo'/'redo'/'delete'), changed_at}。
+        返回的条数等于 limit 时，用最后一条的 seq 继续读取。
+        """
+        return data_manager.get_changes_since(seq, limit)
+
+    def get_view_changes(self, since_seq: int, filter_criteria=None, limit: int = VIEW_CHANGE_LIMIT):
+        """
+        按变更日志计算一个记录列表 (全部记录或某个高级筛选的结果) 自 since_seq 以来需要做的修改，
+        用于写入后只更新受影响的行，而不是重新查询整个列表。
+        :return: (last_seq, changed_rows, removed_ids)：changed_rows 是新增或状态变化、且仍符合筛选条件的记录，
+                 removed_ids 是被删除或不再符合条件的 ID；变更超过 limit 条时返回 None，调用方应重新加载整个列表
+        """
+        changes = data_manager.get_changes_since(since_seq, limit + 1)
+        if len(changes) > limit:
+            return None
+        if not changes:
+            return since_seq, [], []
+        latest = latest_changes_by_id(changes)
+        candidate_ids = [tid for tid, change_type in latest.items() if change_type != 'delete']
+        changed_rows = data_manager.get_matching_transactions_by_ids(candidate_ids, filter_criteria)
+        matched_ids = {row['id'] for row in changed_rows}
+        removed_ids = [tid for tid in latest if tid not in matched_ids]
+        return changes[-1]['seq'], changed_rows, removed_ids
+
+    def subscribe_changes(self, callback):
+        """
+        订阅之后的所有变更，callback(changes) 在调用 poll_changes() 的线程中执行。
+        :return: 取消订阅的函数
+        """
+        if self._change_feed is None:
+            self._change_feed = ChangeFeed()
+        return self._change_feed.subscribe(callback)
+
+    def poll_changes(self) -> int:
+        """把新变更分发给订阅者 (见 subscribe_changes)，返回分发的条数"""
+        return self._change_feed.poll() if self._change_feed else 0
+
+    def get_import_history(self):
+        """获取导入历史 (最近的在前)"""
+        return data_manager.get_import_batches()
+
+    def _set_import_undone_status(self, batch_id, is_undone) -> tuple[bool, str]:
+        """【私有】undo_import / redo_import 的公共实现"""
+        action = "撤销" if is_undone else "恢复"
+        batch = data_manager.get_import_batch(batch_id)
+        if not batch:
+            return False, "导入批次不存在"
+        if bool(batch['is_undone']) == is_undone:
+            return False, f"该批次已{action}，无需重复操作"
+        if not is_undone:
+            conflicts = data_manager.count_import_batch_conflicts(batch_id)
+            if conflicts:
+                return False, f"该批次中有 {conflicts} 条记录与现有有效记录内容相同 (可能已重新导入)，无法恢复"
+        changed = data_manager.set_import_batch_undone_status(batch_id, is_undone)
+        if changed is None:
+            return False, "数据库操作失败"
+        return True, f"已{action}导入批次 {batch_id} ({batch['file_name']}) 中的 {changed} 条记录"
+
+    def undo_import(self, batch_id) -> tuple[bool, str]:
+        """撤销一次导入的全部记录"""
+        return self._set_import_undone_status(batch_id, True)
+
+    def redo_import(self, batch_id) -> tuple[bool, str]:
+        """恢复一次已撤销的导入"""
+        return self._set_import_undone_status(batch_id, False)
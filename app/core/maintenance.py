@@ -0,0 +1,92 @@
+# app/core/maintenance.py
+"""
+数据库维护命令，需在项目根目录下运行:
+
+    python -m app.core.maintenance verify-stock     # 校验库存表
+    python -m app.core.maintenance rebuild-stock    # 重建库存表
+    python -m app.core.maintenance find-duplicates [--csv 报告.csv]  # 列出内容完全相同的有效记录
+    python -m app.core.maintenance export-incremental 变更.csv [--name 名称]  # 增量导出 (可用于定时同步)
+"""
+import argparse
+import csv
+import sys
+from .inventory import InventoryManager, NO_NEW_CHANGES_MESSAGE
+from .data_manager import initialize_database, close_all_connections, DEFAULT_EXPORT_WATERMARK
+
+def _verify_stock(manager: InventoryManager, args) -> bool:
+    success, message = manager.verify_stock_levels()
+    print(message)
+    return success
+
+def _rebuild_stock(manager: InventoryManager, args) -> bool:
+    success, message = manager.rebuild_stock_levels()
+    print(message)
+    return success
+
+def _find_duplicates(manager: InventoryManager, args) -> bool:
+    """只报告，不修改数据；返回 False (退出码 1) 表示存在重复记录"""
+    groups = manager.find_duplicate_transactions()
+    if not groups:
+        print("没有发现重复的有效记录")
+        return True
+    extra = sum(group["count"] - 1 for group in groups)
+    print(f"发现 {len(groups)} 组内容完全相同的有效记录，共 {extra} 条多余记录:")
+    for group in groups[:args.limit]:
+        print(f"  {group['insertion_date']} {group['product_name']} {group['model_number']} "
+              f"数量 {group['quantity']} 单价 {group['unit_price']}: {group['count']} 条, ID {group['ids']}")
+    if len(groups) > args.limit:
+        print(f"  ... 其余 {len(groups) - args.limit} 组未列出")
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8-sig', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(['保留ID', '多余ID', '操作日期', '项目名称', '规格型号', '数量', '单价', '购买方', '销售方', '备注'])
+            for group in groups:
+                writer.writerow([
+                    group['ids'][0], " ".join(str(i) for i in group['ids'][1:]), group['insertion_date'],
+                    group['product_name'], group['model_number'], group['quantity'], group['unit_price'],
+                    group['buyer'], group['seller'], group['notes'],
+                ])
+        print(f"完整报告已保存到 {args.csv}")
+    return False
+
+def _duplicates_arguments(subparser):
+    subparser.add_argument("--csv", help="把全部重复记录组写入该 CSV 文件")
+    subparser.add_argument("--limit", type=int, default=20, help="在终端中最多列出的组数 (默认 20)")
+
+def _export_incremental(manager: InventoryManager, args) -> bool:
+    """没有新变更时不创建文件，也视为成功"""
+    success, message = manager.export_incremental(args.path, args.name)
+    print(message)
+    return success or message == NO_NEW_CHANGES_MESSAGE
+
+def _export_incremental_arguments(subparser):
+    subparser.add_argument("path", help="输出文件 (.xlsx、.csv 或 .parquet)")
+    subparser.add_argument("--name", default=DEFAULT_EXPORT_WATERMARK,
+                           help=f"水位名称，每个使用方各用一个 (默认 {DEFAULT_EXPORT_WATERMARK})")
+
+# 命令名 -> (处理函数, 帮助文本, 添加命令参数的函数或 None)
+COMMANDS = {
+    "verify-stock": (_verify_stock, "校验 stock_levels 是否与交易记录一致", None),
+    "rebuild-stock": (_rebuild_stock, "根据交易记录重建 stock_levels", None),
+    "find-duplicates": (_find_duplicates, "一次扫描找出内容完全相同的有效记录 (只报告，不修改数据)", _duplicates_arguments),
+    "export-incremental": (_export_incremental, "导出自上次增量导出以来的变更，并推进水位", _export_incremental_arguments),
+}
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m app.core.maintenance", description="库存数据库维护工具")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text, add_arguments) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if add_arguments:
+            add_arguments(subparser)
+    args = parser.parse_args(argv)
+
+    handler, _, _ = COMMANDS[args.command]
+    initialize_database() # 与 main.py 相同，先建表并执行尚未应用的迁移
+    try:
+        return 0 if handler(InventoryManager(), args) else 1
+    finally:
+        close_all_connections()
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+# app/core/query_cache.py
+"""
+查询结果缓存：同一查询在数据库没有变化时直接返回上次的结果，切换视图不再重复查询 SQLite。
+
+是否有变化由 data_manager.get_write_version() 判断：本进程修改数据的函数提交后递增写入计数，
+其他进程的提交由一个共享连接上的 PRAGMA data_version 反映。版本与调用的线程无关，
+两者都没变就说明数据库自上次检查以来没有被任何人修改；一旦变化，整个缓存失效。
+"""
+import sys
+import threading
+from collections import OrderedDict
+from . import data_manager
+
+SIZE_SAMPLE_ROWS = 200 # 估算结果占用内存时抽样的行数
+
+def freeze_key(value):
+    """把筛选条件字典 (可能嵌套列表/字典) 转换成可哈希、与键顺序无关的缓存键"""
+    if isinstance(value, dict):
+        return tuple(sorted((str(key), freeze_key(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze_key(item) for item in value)
+    return value
+
+def estimate_size(rows) -> int:
+    """按抽样估算结果列表占用的内存 (字节)，包括每行对象和其中的值"""
+    count = len(rows)
+    if count == 0:
+        return sys.getsizeof(rows)
+    step = max(1, count // SIZE_SAMPLE_ROWS)
+    sample = rows[::step]
+    sampled = 0
+    for row in sample:
+        values = row.values() if isinstance(row, dict) else row
+        sampled += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in values)
+    return sys.getsizeof(rows) + sampled * count // len(sample)
+
+class QueryCache:
+    """
+    按内存大小限制的 LRU 缓存。超过上限时淘汰最久未使用的结果；单个结果超过上限时不缓存。
+    缓存的结果会被多次返回，调用方不能修改它们。可以在多个线程中使用。
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (result, size)
+        self._bytes = 0
+        self._seen_version = None # 上次检查时的写入版本
+        self._epoch = 0 # 每次清空加 1；查询期间缓存被清空过的结果不再写入
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get_or_load(self, key, loader):
+        """命中时返回缓存的结果，否则调用 loader() 查询并缓存"""
+        entry, epoch = self._lookup(key)
+        if entry is not None:
+            return entry[0]
+        result = loader()
+        self._store(key, result, epoch)
+        return result
+
+    def iter_pages(self, key, pages_loader):
+        """
+        get_or_load 的分页版本：命中时把缓存的结果作为一页产出；否则逐页产出 pages_loader() 的结果，
+        全部读完后再把拼接的结果写入缓存 (调用方中途停止迭代时不缓存不完整的结果)。
+        """
+        entry, epoch = self._lookup(key)
+        if entry is not None:
+            yield entry[0]
+            return
+        result = []
+        for page in pages_loader():
+            result.extend(page)
+            yield page
+        self._store(key, result, epoch)
+
+    def _lookup(self, key):
+        """【私有】检查写入版本 (有变化时先清空)，返回 (命中的条目或 None, 当前 epoch)，并计入命中/未命中"""
+        version = data_manager.get_write_version()
+        with self._lock:
+            if self._seen_version != version:
+                self._clear()
+                self._seen_version = version
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+            return entry, self._epoch
+
+    def _store(self, key, result, epoch):
+        """【私有】写入结果；查询期间缓存被清空过 (发现了写入) 时不缓存，避免保存过时的结果"""
+        size = estimate_size(result)
+        with self._lock:
+            if self._epoch != epoch or size > self.max_bytes:
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (result, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def _clear(self):
+        """【私有】丢弃全部结果 (调用方持有锁)"""
+        self._epoch += 1
+        if self._entries:
+            self.invalidations += 1
+        self._entries.clear()
+        self._bytes = 0
+
+    def clear(self):
+        """手动清空缓存"""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict:
+        """命中/未命中等计数，用于诊断"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
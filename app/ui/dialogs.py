@@ -1,6 +1,7 @@
 # app/ui/dialogs.py
 import customtkinter as ctk
 import tkcalendar as tkc
+from tkinter import ttk
 from datetime import datetime
 from app.core import config_manager
 import tkinter.messagebox as tkmb # For simple pop-up messages
@@ -510,3 +511,67 @@ class AdvancedFilterDialog(ctk.CTkToplevel):
     def get_filters(self):
         self.wait_window(self)
         return self.result
+
+class ImportHistoryDialog(ctk.CTkToplevel):
+    """导入历史对话框：列出每次 Excel 导入的批次，可整批撤销或恢复"""
+    COLUMNS = (("id", "批次号", 60), ("file_name", "文件名", 220), ("row_count", "记录数", 80),
+               ("imported_at", "导入时间", 150), ("status", "状态", 70))
+
+    def __init__(self, parent, inventory_manager):
+        super().__init__(parent)
+        self.transient(parent)
+        self.title("导入历史")
+        self.inventory_manager = inventory_manager
+        self.changed = False # 是否撤销/恢复过批次，主窗口据此决定是否刷新
+        scale_factor = ctk.ScalingTracker.get_window_scaling(self) * 0.9
+        self.geometry(f"{int(640 * scale_factor)}x{int(400 * scale_factor)}")
+
+        main_frame = ctk.CTkFrame(self)
+        main_frame.pack(padx=15, pady=15, fill="both", expand=True)
+
+        self.tree = ttk.Treeview(main_frame, columns=[c[0] for c in self.COLUMNS], show="headings", selectmode="browse")
+        for key, heading, width in self.COLUMNS:
+            self.tree.heading(key, text=heading)
+            self.tree.column(key, width=width, anchor="center")
+        self.tree.pack(fill="both", expand=True)
+
+        button_frame = ctk.CTkFrame(main_frame)
+        button_frame.pack(pady=10, fill="x")
+        ctk.CTkButton(button_frame, text="撤销此次导入", command=self.undo_selected, fg_color="orange").pack(side="left", padx=10)
+        ctk.CTkButton(button_frame, text="恢复此次导入", command=self.redo_selected, fg_color="green").pack(side="left", padx=10)
+        ctk.CTkButton(button_frame, text="关闭", command=self.destroy, fg_color="gray").pack(side="right", padx=10)
+
+        self.load_batches()
+        self.grab_set()
+        self.lift()
+
+    def load_batches(self):
+        self.tree.delete(*self.tree.get_children())
+        for batch in self.inventory_manager.get_import_history():
+            status = "已撤销" if batch['is_undone'] else "有效"
+            self.tree.insert("", "end", iid=batch['id'], values=(
+                batch['id'], batch['file_name'], batch['row_count'], batch['imported_at'], status))
+
+    def _apply_to_selected(self, action):
+        selection = self.tree.selection()
+        if not selection:
+            tkmb.showinfo("提示", "请先选择一个导入批次。", parent=self)
+            return
+        success, message = action(int(selection[0]))
+        if success:
+            self.changed = True
+            tkmb.showinfo("成功", message, parent=self)
+            self.load_batches()
+        else:
+            tkmb.showerror("失败", message, parent=self)
+
+    def undo_selected(self):
+        self._apply_to_selected(self.inventory_manager.undo_import)
+
+    def redo_selected(self):
+        self._apply_to_selected(self.inventory_manager.redo_import)
+
+    def show(self):
+        """主窗口调用此方法，返回期间是否有批次状态发生变化"""
+        self.wait_window(self)
+        return self.changed
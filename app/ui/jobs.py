@@ -0,0 +1,237 @@
+# app/ui/jobs.py
+"""
+后台任务：耗时的导入/导出 (JobRunner) 和视图数据的查询 (ViewLoader) 在工作线程中执行，
+主线程用 after() 轮询消息队列更新界面，窗口不会卡死。
+Tk 控件只能在主线程中访问，所以工作线程从不直接调用界面，只往队列里放消息。
+"""
+import queue
+import threading
+from app.core import data_manager
+from app.core.importer import OperationCancelled
+
+class JobRunner:
+    """
+    同一时间只执行一个任务。所有任务共用一个常驻的工作线程，
+    因此 data_manager 只为它打开一个数据库连接 (连接按线程复用)。
+    """
+    POLL_INTERVAL_MS = 100
+
+    def __init__(self, root):
+        self.root = root # 用来调度 after() 的 Tk 控件
+        self._jobs = queue.Queue()
+        self._messages = queue.Queue()
+        self._cancel_event = threading.Event()
+        self._worker = None
+        self._on_progress = None
+        self._on_done = None
+        self.busy = False
+
+    def submit(self, job, on_progress=None, on_done=None) -> bool:
+        """
+        提交一个任务，已有任务在执行时返回 False。
+        :param job: 在工作线程中以 job(progress) 调用。progress(*args) 把进度转发给主线程的
+                    on_progress(*args)；任务被取消后再调用 progress 会抛出 OperationCancelled
+        :param on_done: 任务结束后在主线程中以 on_done(result, error) 调用，error 为任务抛出的异常或 None
+        """
+        if self.busy:
+            return False
+        self.busy = True
+        self._on_progress = on_progress
+        self._on_done = on_done
+        self._cancel_event.clear()
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, name="JobRunner", daemon=True)
+            self._worker.start()
+        self._jobs.put(job)
+        self.root.after(self.POLL_INTERVAL_MS, self._poll)
+        return True
+
+    def cancel(self):
+        """请求取消当前任务；任务在下一次报告进度时停止"""
+        if self.busy:
+            self._cancel_event.set()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel_event.is_set()
+
+    def shutdown(self, timeout: float = 5.0) -> bool:
+        """
+        取消当前任务并等待工作线程退出 (在关闭数据库连接之前调用)。
+        :return: 工作线程是否已退出。超时 (任务还未报告进度) 时返回 False，调用方不能关闭全部连接：
+                 该线程会在任务结束后自行关闭它的连接
+        """
+        self.cancel()
+        if self._worker is not None:
+            self._jobs.put(None)
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                return False
+            self._worker = None
+        return True
+
+    def _progress(self, *args):
+        """【私有】工作线程中的进度回调"""
+        if self._cancel_event.is_set():
+            raise OperationCancelled()
+        self._messages.put(("progress", args))
+
+    def _work(self):
+        """【私有】工作线程主循环，收到 None 时退出，退出前关闭本线程的数据库连接"""
+        try:
+            while True:
+                job = self._jobs.get()
+                if job is None:
+                    return
+                try:
+                    self._messages.put(("done", (job(self._progress), None)))
+                except Exception as e:
+                    self._messages.put(("done", (None, e)))
+        finally:
+            data_manager.close_thread_connection()
+
+    def _poll(self):
+        """【私有】在主线程中处理队列里的消息；同一轮里只显示最新的进度"""
+        latest_progress, done = None, None
+        try:
+            while True:
+                kind, payload = self._messages.get_nowait()
+                if kind == "progress":
+                    latest_progress = payload
+                else:
+                    done = payload
+        except queue.Empty:
+            pass
+        if latest_progress is not None and self._on_progress and done is None:
+            self._on_progress(*latest_progress)
+        if done is None:
+            self.root.after(self.POLL_INTERVAL_MS, self._poll)
+            return
+        self.busy = False
+        on_done, self._on_progress, self._on_done = self._on_done, None, None
+        if on_done:
+            on_done(*done)
+
+_END = object() # ViewLoader 中表示请求的全部页已产出
+
+class ViewLoader:
+    """
+    视图数据加载：查询在常驻的工作线程中执行 (有自己的数据库连接)，结果逐页通过队列交给主线程。
+    新的请求总是取代尚未完成的旧请求：旧请求在产出下一页前停止，已经排队的旧结果被丢弃，
+    因此快速切换视图或筛选条件时查询不会堆积，界面也只会显示最后一次请求的结果。
+    """
+    POLL_INTERVAL_MS = 30
+
+    def __init__(self, root):
+        self.root = root # 用来调度 after() 的 Tk 控件
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._messages = queue.Queue()
+        self._pending = None # 等待工作线程执行的 (generation, job)，只保留最新的一个
+        self._generation = 0 # 每次 load/cancel 加 1；工作线程据此判断当前请求是否已被取代
+        self._handlers = None # 当前请求的 (generation, on_page, on_done)
+        self._stopping = False
+        self._worker = None
+        self._polling = False
+
+    @property
+    def loading(self) -> bool:
+        return self._handlers is not None
+
+    def load(self, job, on_page, on_done=None):
+        """
+        提交一个加载请求，取代正在执行或排队的请求。
+        :param job: 在工作线程中调用，返回逐页产出结果的可迭代对象 (如生成器)
+        :param on_page: 每页在主线程中以 on_page(page) 调用
+        :param on_done: 全部页产出后在主线程中以 on_done(error) 调用，error 为 job 抛出的异常或 None；
+                        被取代或取消的请求不会再调用 on_page/on_done
+        """
+        with self._lock:
+            self._generation += 1
+            self._pending = (self._generation, job)
+            self._handlers = (self._generation, on_page, on_done)
+        if self._worker is None:
+            self._worker = threading.Thread(target=self._work, name="ViewLoader", daemon=True)
+            self._worker.start()
+        self._wakeup.set()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_INTERVAL_MS, self._poll)
+
+    def cancel(self):
+        """取消当前请求 (不再调用它的回调)"""
+        with self._lock:
+            self._generation += 1
+            self._pending = None
+            self._handlers = None
+
+    def shutdown(self, timeout: float = 5.0) -> bool:
+        """
+        取消当前请求并等待工作线程退出 (在关闭数据库连接之前调用)。
+        :return: 工作线程是否已退出。超时 (正在执行的一页查询还未返回) 时返回 False，调用方不能关闭全部连接：
+                 该线程会在这一页结束后自行关闭它的连接
+        """
+        self.cancel()
+        if self._worker is not None:
+            self._stopping = True
+            self._wakeup.set()
+            self._worker.join(timeout)
+            if self._worker.is_alive():
+                return False
+            self._worker = None
+        return True
+
+    def _work(self):
+        """【私有】工作线程主循环：取最新的请求逐页执行，被取代时关闭迭代器 (停止查询)；退出前关闭本线程的数据库连接"""
+        try:
+            while True:
+                self._wakeup.wait()
+                with self._lock:
+                    request, self._pending = self._pending, None
+                    self._wakeup.clear()
+                if self._stopping:
+                    return
+                if request is not None:
+                    self._run(*request)
+        finally:
+            data_manager.close_thread_connection()
+
+    def _run(self, generation, job):
+        """【私有】逐页执行一个请求；每取一页之前检查它是否已被取代，被取代后不再查询下一页"""
+        pages = None
+        try:
+            if generation != self._generation:
+                return
+            pages = iter(job())
+            while generation == self._generation:
+                page = next(pages, _END)
+                if page is _END:
+                    self._messages.put(("done", generation, None))
+                    break
+                self._messages.put(("page", generation, page))
+        except Exception as e:
+            self._messages.put(("done", generation, e))
+        finally:
+            if hasattr(pages, "close"):
+                pages.close()
+
+    def _poll(self):
+        """【私有】在主线程中把当前请求的结果交给回调，丢弃已被取代的请求的消息"""
+        try:
+            while True:
+                kind, generation, payload = self._messages.get_nowait()
+                handlers = self._handlers
+                if handlers is None or handlers[0] != generation:
+                    continue
+                if kind == "page":
+                    handlers[1](payload)
+                else:
+                    self._handlers = None
+                    if handlers[2]:
+                        handlers[2](payload)
+        except queue.Empty:
+            pass
+        if self._handlers is None:
+            self._polling = False
+            return
+        self.root.after(self.POLL_INTERVAL_MS, self._poll)
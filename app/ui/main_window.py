@@ -3,13 +3,48 @@ import customtkinter as ctk
 from tkinter import ttk # For Treeview
 import tkinter.messagebox as tkmb
 from tkinter import filedialog
-from .dialogs import TransactionDialog, SettingsDialog, AdvancedFilterDialog
+from .dialogs import TransactionDialog, SettingsDialog, AdvancedFilterDialog, ImportHistoryDialog
+from .jobs import JobRunner, ViewLoader
+from .virtual_tree import VirtualTreeview
 from app.core.inventory import InventoryManager
 from app.core import config_manager
+from app.core.importer import find_import_files, save_file_reports_errors
 from datetime import datetime
+import os
 import tkinter as tk
 import ctypes
 
+# 导入/导出对话框中可选的文件格式 (CSV 和 Parquet 比 Excel 快得多，适合备份和迁移)
+IMPORT_FILETYPES = (("支持的文件", "*.xlsx *.csv *.parquet"), ("Excel Files", "*.xlsx"), ("CSV Files", "*.csv"),
+                    ("Parquet Files", "*.parquet"), ("All files", "*.*"))
+EXPORT_FILETYPES = (("Excel Files", "*.xlsx"), ("CSV Files", "*.csv"), ("Parquet Files", "*.parquet"), ("All files", "*.*"))
+
+# 点击表头时的排序键 (列名 -> key(row))；行是查询结果 (sqlite3.Row)，空值按空字符串排序
+TRANSACTION_SORT_KEYS = {
+    "ID": lambda row: row['id'],
+    "日期": lambda row: row['insertion_date'] or '',
+    "项目名称": lambda row: row['product_name'] or '',
+    "规格型号": lambda row: row['model_number'] or '',
+    "购买方": lambda row: row['buyer'] or '',
+    "销售方": lambda row: row['seller'] or '',
+    "单位": lambda row: row['unit'] or '',
+    "类型": lambda row: row['quantity'] > 0,
+    "数量": lambda row: abs(row['quantity']),
+    "单价": lambda row: row['unit_price'],
+    "总金额": lambda row: row['total_amount'],
+}
+# 交易视图中行的默认顺序 (与 iter_record_pages 的 ORDER BY 一致)，增量刷新时按它放置新增的记录
+RECORDS_ORDER = (lambda row: (row['insertion_date'], row['transaction_time'], row['id']), True)
+TRANSACTION_SEARCH_FIELDS = ('product_name', 'model_number', 'buyer', 'seller')
+SUMMARY_SEARCH_FIELDS = ('product_name', 'model_number')
+SEARCH_DEBOUNCE_MS = 200 # 停止输入这么久之后才执行搜索
+SUMMARY_SORT_KEYS = {
+    "项目名称": lambda row: row['product_name'] or '',
+    "规格型号": lambda row: row['model_number'] or '',
+    "单位": lambda row: row['unit'] or '',
+    "当前库存": lambda row: row['current_stock'],
+}
+
 try:
     ctypes.windll.shcore.SetProcessDpiAwareness(1)
 except AttributeError:
@@ -59,6 +94,9 @@ class MainWindow(ctk.CTk):
         self.file_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.menu_bar.add_cascade(label="文件", menu=self.file_menu)
         self.file_menu.add_command(label="系统设置...", command=self.open_settings_dialog)
+        self.file_menu.add_command(label="批量导入文件夹...", command=self.import_folder_dialog)
+        self.file_menu.add_command(label="导入历史...", command=self.open_import_history_dialog)
+        self.file_menu.add_command(label="增量导出...", command=self.export_incremental_dialog)
         self.file_menu.add_separator()
         self.file_menu.add_command(label="退出", command=self.quit)
         
@@ -80,6 +118,11 @@ class MainWindow(ctk.CTk):
         self.btn_show_summary = ctk.CTkButton(self.action_button_frame, text="库存汇总", command=self.show_product_summary)
         self.btn_show_all_transactions = ctk.CTkButton(self.action_button_frame, text="全部记录", command=self.load_all_transactions_view)
         
+        # 搜索框：在已加载的行中即时筛选 (内存索引，不查询数据库)，输入停顿后才执行
+        # (不绑定 textvariable：CTkEntry 绑定变量后不显示占位文字)
+        self.entry_search = ctk.CTkEntry(self.advanced_filter_frame, placeholder_text="搜索名称/型号/购买方/销售方")
+        self._search_after_id = None
+        self.entry_search.bind("<KeyRelease>", self._schedule_search)
         self.btn_advanced_filter = ctk.CTkButton(self.advanced_filter_frame, text="高级筛选...", command=self.open_advanced_filter_dialog)
         self.btn_clear_filter = ctk.CTkButton(self.advanced_filter_frame, text="清除筛选", command=self.clear_all_filters, fg_color="gray")
         
@@ -87,17 +130,30 @@ class MainWindow(ctk.CTk):
         self.tree_style = ttk.Style()
         # <<< 关键修正：在创建 Treeview 时，必须添加 show="headings" 选项 >>>
         self.tree = ttk.Treeview(self.middle_frame, show="headings") 
-        self.scrollbar_y = ctk.CTkScrollbar(self.middle_frame, command=self.tree.yview)
+        self.scrollbar_y = ctk.CTkScrollbar(self.middle_frame)
         self.scrollbar_x = ctk.CTkScrollbar(self.middle_frame, command=self.tree.xview, orientation="horizontal")
-        self.tree.configure(yscrollcommand=self.scrollbar_y.set, xscrollcommand=self.scrollbar_x.set)
+        self.tree.configure(xscrollcommand=self.scrollbar_x.set)
+        # 虚拟列表：只把可见的行插入 Treeview，垂直滚动条和选择 (<<TreeviewSelect>>) 由它接管
+        self.virtual_tree = VirtualTreeview(self.tree, self.scrollbar_y, on_select=self.on_tree_select,
+                                           on_search_progress=self._on_search_progress)
+        self._sort_column = None
+        self._view_change_seq = 0 # 当前交易视图数据对应的变更日志序号，增量刷新从这里开始
         
         # 底部状态栏
         self.status_label = ctk.CTkLabel(self.bottom_frame, text="状态: 就绪", anchor="w")
         self.selected_total_label = ctk.CTkLabel(self.bottom_frame, text="选中总金额: 0.00", anchor="e")
+        # 后台任务的进度条和取消按钮，只在任务执行期间显示
+        self.job_runner = JobRunner(self)
+        # 视图数据在后台查询并逐页显示，新的加载请求取代未完成的请求
+        self.view_loader = ViewLoader(self)
+        self._reload_view = None # 正在加载的视图的加载函数，加载期间发生写入时用它重新加载
+        self.job_progress_bar = ctk.CTkProgressBar(self.bottom_frame, mode="indeterminate")
+        self.btn_cancel_job = ctk.CTkButton(self.bottom_frame, text="取消", fg_color="gray", command=self.cancel_current_job)
+        self._job_buttons = (self.btn_import_excel, self.btn_export_excel, self.btn_export_selected)
+        self._job_pad = 0
 
         # 绑定事件
         self.tree.bind("<Button-3>", self.show_context_menu)
-        self.tree.bind("<<TreeviewSelect>>", self.on_tree_select)
         
         self.context_menu = ctk.CTkFrame(self, border_width=1)
 
@@ -141,6 +197,9 @@ class MainWindow(ctk.CTk):
         # 应用菜单样式
         self.file_menu.configure(font=menu_font)
         
+        self.entry_search.configure(font=label_font, width=int(base_style_size * 16), height=action_button_height)
+        self.entry_search.pack(side="left", padx=pad_m)
+
         # 应用按钮样式
         btn_kwargs = {"font": button_font, "width": action_button_width, "height": action_button_height}
         all_buttons = [
@@ -167,6 +226,7 @@ class MainWindow(ctk.CTk):
         self.status_label.configure(font=label_font)
         self.selected_total_label.configure(font=label_font)
         self.status_label.pack(side="left", padx=pad_l, pady=pad_m)
+        self._job_pad = pad_m
         self.selected_total_label.pack(side="right", padx=pad_l, pady=pad_m)
 
     def setup_transactions_view(self):
@@ -196,7 +256,8 @@ class MainWindow(ctk.CTk):
         
 
         for col in self.tree['columns']:
-            self.tree.heading(col, text=col, anchor=ctk.W if col not in ['单位', '类型', '数量', '单价', '总金额'] else ctk.CENTER if col in ['单位', '类型'] else ctk.E)
+            self.tree.heading(col, text=col, anchor=ctk.W if col not in ['单位', '类型', '数量', '单价', '总金额'] else ctk.CENTER if col in ['单位', '类型'] else ctk.E,
+                              command=lambda c=col: self.sort_by_column(c))
 
     def setup_summary_view(self):
         self.current_view_mode = "summary"
@@ -216,53 +277,126 @@ class MainWindow(ctk.CTk):
         self.tree.heading("规格型号", text="规格型号", anchor=ctk.W)
         self.tree.heading("单位", text="单位", anchor=ctk.CENTER)
         self.tree.heading("当前库存", text="当前库存", anchor=ctk.E)
-        
-
-    def populate_treeview(self, data_rows):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
+        for col in self.tree['columns']:
+            self.tree.heading(col, command=lambda c=col: self.sort_by_column(c))
+
+    def populate_treeview(self, data_rows, default_order=None):
+        """
+        把查询结果交给虚拟列表：只保存结果的引用，滚动到某行时才生成它的显示值并插入 Treeview。
+        :param default_order: 交易记录的排列顺序 (key, reverse)，增量刷新时按它放置新增的记录
+        """
+        self.tree.tag_configure('undone', foreground='gray')
+        self._sort_column = None
+        self._update_sort_headings()
+        # 搜索框的内容对新数据继续生效，搜索索引随数据一起建立
         if self.current_view_mode == "transactions":
-            for row in data_rows:
-                row_dict = dict(row)
-                trans_type = "入库" if row_dict['quantity'] > 0 else "出库"
-                status = "已撤销" if row_dict['is_undone'] else "有效"
-                
-                values = (
-                    row_dict['id'], row_dict['insertion_date'], row_dict['product_name'], 
-                    row_dict['model_number'], row_dict.get('buyer', ''), row_dict.get('seller', ''),
-                    row_dict['unit'], trans_type, abs(row_dict['quantity']),
-                    f"{row_dict['unit_price']:.2f}", f"{row_dict['total_amount']:.2f}",
-                    
-                )
-                self.tree.insert(parent='', index='end', iid=row_dict['id'], text="", values=values)
-                if row_dict['is_undone']:
-                    self.tree.item(row_dict['id'], tags=('undone',))
-            self.tree.tag_configure('undone', foreground='gray')
-
-
+            self.virtual_tree.set_rows(data_rows, self._transaction_item, lambda row: row['id'], default_order,
+                                       measure=self._transaction_measure, search_fields=TRANSACTION_SEARCH_FIELDS)
         elif self.current_view_mode == "summary":
-            iid_counter = 0
-            for row in data_rows:
-                self.tree.insert(parent='', index='end', iid=iid_counter, text="",
-                                 values=(row['product_name'], row['model_number'],
-                                         row['unit'], row['current_stock']))
-                iid_counter += 1
+            self.virtual_tree.set_rows(data_rows, self._summary_item, # 汇总行没有 ID，用行号作 iid
+                                       search_fields=SUMMARY_SEARCH_FIELDS)
         self.on_tree_select(None) # Update totals display
 
-    def load_all_transactions_view(self):
-        if self.current_view_mode != "transactions":
-            self.setup_transactions_view()
-        transactions = self.inventory_manager.get_all_records(include_undone=True) # Show all including undone
-        self.populate_treeview(transactions)
-        self.status_label.configure(text="状态: 显示所有交易记录")
-        self.clear_filters()
+    def _transaction_item(self, row):
+        """【私有】交易记录行 -> (values, tags)"""
+        trans_type = "入库" if row['quantity'] > 0 else "出库"
+        values = (
+            row['id'], row['insertion_date'], row['product_name'],
+            row['model_number'], row['buyer'] or '', row['seller'] or '',
+            row['unit'], trans_type, abs(row['quantity']),
+            f"{row['unit_price']:.2f}", f"{row['total_amount']:.2f}",
+        )
+        return values, ('undone',) if row['is_undone'] else ()
+
+    @staticmethod
+    def _transaction_measure(row):
+        """
+        【私有】选中合计中一行的贡献：(有效记录数, 入库金额(分), 出库金额(分), 入库数量, 出库数量)。
+        金额按分取整后累加，选择反复增减也不会积累浮点误差；已撤销的记录不计入。
+        """
+        if row['is_undone']:
+            return (0, 0, 0, 0, 0)
+        cents = round(row['total_amount'] * 100)
+        quantity = row['quantity']
+        return (1, cents, 0, quantity, 0) if quantity > 0 else (1, 0, cents, 0, -quantity)
+
+    def _summary_item(self, row):
+        """【私有】汇总行 -> (values, tags)"""
+        return (row['product_name'], row['model_number'], row['unit'], row['current_stock']), ()
+
+    def sort_by_column(self, col):
+        """点击表头：按该列对全部结果排序 (包括还没显示的行)，再次点击同一列时反向"""
+        keys = TRANSACTION_SORT_KEYS if self.current_view_mode == "transactions" else SUMMARY_SORT_KEYS
+        if col not in keys:
+            return
+        reverse = self._sort_column == col and not self.virtual_tree.sort_reverse
+        self._sort_column = col
+        self.virtual_tree.sort_by(keys[col], reverse=reverse)
+        self._update_sort_headings()
+
+    def _update_sort_headings(self):
+        """【私有】在当前排序列的表头上显示 ▲/▼"""
+        for col in self.tree['columns']:
+            arrow = ""
+            if col == self._sort_column:
+                arrow = " ▼" if self.virtual_tree.sort_reverse else " ▲"
+            self.tree.heading(col, text=col + arrow)
 
     def show_product_summary(self):
-        self.setup_summary_view()
-        summary_data = self.inventory_manager.get_product_summary_view()
-        self.populate_treeview(summary_data)
-        self.status_label.configure(text="状态: 显示库存汇总")
+        """在后台查询库存汇总，结果到达前保留当前视图"""
+        self._load_view("summary", lambda: [self.inventory_manager.get_product_summary_view()],
+                        "状态: 显示库存汇总", self.show_product_summary)
+
+    def _load_transactions(self, filters, done_text, reload):
+        """【私有】在后台逐页加载交易记录 (filters 为空时加载全部)"""
+        state = {}
+        def job():
+            state['seq'] = self.inventory_manager.latest_change_seq() # 先记下序号，查询期间的写入会在下次刷新时补上
+            return self.inventory_manager.iter_record_pages(filters)
+        def on_loaded():
+            self._view_change_seq = state['seq']
+        self._load_view("transactions", job, done_text, reload, on_loaded)
+
+    def _load_view(self, mode, job, done_text, reload, on_loaded=None):
+        """
+        【私有】在工作线程中执行 job() 并把产出的每一页追加到表格中，状态栏显示加载进度。
+        第一页到达时才切换列并替换数据，所以加载期间仍然可以浏览当前视图。
+        """
+        state = {'started': False, 'count': 0}
+        def start(page):
+            if self.current_view_mode != mode:
+                self.setup_transactions_view() if mode == "transactions" else self.setup_summary_view()
+            self.populate_treeview(page, RECORDS_ORDER)
+            state['started'] = True
+        def on_page(page):
+            if state['started']:
+                self.virtual_tree.append_rows(page)
+            else:
+                start(page)
+            state['count'] += len(page)
+            self.status_label.configure(text=f"状态: 正在加载... 已加载 {state['count']} 条")
+        def on_done(error):
+            self._reload_view = None
+            if error is not None:
+                self.status_label.configure(text=f"状态: 加载失败: {error}")
+                return
+            if not state['started']:
+                start([])
+            if on_loaded:
+                on_loaded()
+            if self.virtual_tree.search_text:
+                self._show_search_status() # 搜索在加载期间只筛选了已到的页，这里显示匹配数
+            else:
+                self.status_label.configure(text=done_text)
+
+        self._reload_view = reload
+        self.status_label.configure(text="状态: 正在加载...")
+        self.view_loader.load(job, on_page, on_done)
+
+    def open_import_history_dialog(self):
+        """打开导入历史，可整批撤销/恢复某次导入"""
+        if ImportHistoryDialog(self, self.inventory_manager).show():
+            self.refresh_current_view()
 
     def open_settings_dialog(self):
         """打开统一的设置对话框"""
@@ -366,13 +500,21 @@ class MainWindow(ctk.CTk):
         if not selected_iid:
             return
 
-        self.tree.selection_set(selected_iid) # Select the item
+        # 在已多选的行上右键时保留整个选择 (包括滚出可见区域的行)，否则只选中鼠标下的行
+        if not self.virtual_tree.is_selected(selected_iid):
+            self.virtual_tree.selection_set([selected_iid]) # Select the item
         self.tree.focus(selected_iid)
 
         # 获取选中的交易记录信息
         if self.current_view_mode != "transactions":
             self.context_menu.place_forget() # Hide if not in transactions view
             return
+
+        selected_ids = self.virtual_tree.selection()
+        if len(selected_ids) > 1:
+            self._build_batch_context_menu(selected_ids)
+            self._place_context_menu(event)
+            return
             
         item_id = selected_iid # IID is the transaction ID
         transaction = self.inventory_manager.get_transaction_details(item_id) # Get full data
@@ -406,7 +548,22 @@ class MainWindow(ctk.CTk):
                                       fg_color="red", hover_color="#C00000", width=120, height=28)
         delete_button.pack(pady=(2,5), padx=5, fill="x")
 
-
+        self._place_context_menu(event)
+
+    def _build_batch_context_menu(self, selected_ids):
+        """多选时的右键菜单：对所有选中记录执行批量操作"""
+        count = len(selected_ids)
+        ctk.CTkButton(self.context_menu, text=f"撤销选中 ({count})",
+                      command=lambda ids=selected_ids: self.undo_selected_transactions(ids),
+                      width=120, height=28).pack(pady=2, padx=5, fill="x")
+        ctk.CTkButton(self.context_menu, text=f"恢复选中 ({count})",
+                      command=lambda ids=selected_ids: self.redo_selected_transactions(ids),
+                      width=120, height=28).pack(pady=2, padx=5, fill="x")
+        ctk.CTkButton(self.context_menu, text=f"永久删除选中 ({count})",
+                      command=lambda ids=selected_ids: self.delete_selected_transactions(ids),
+                      fg_color="red", hover_color="#C00000", width=120, height=28).pack(pady=(2,5), padx=5, fill="x")
+
+    def _place_context_menu(self, event):
         # 定位并显示菜单
         # self.context_menu.place(x=event.x_root - self.winfo_x() , y=event.y_root - self.winfo_y())
         self.context_menu.place(x=event.x_root - self.winfo_rootx() + 5, 
@@ -445,33 +602,34 @@ class MainWindow(ctk.CTk):
             if success:
                 self.refresh_current_view()
 
-    def refresh_current_view(self):
-        if self.current_view_mode == "transactions":
-            # Re-apply filters if they exist or load all
-            name_filter = self.entry_filter_name.get().strip()
-            model_filter = self.entry_filter_model.get().strip()
-            if name_filter or model_filter:
-                self.filter_records()
-            else:
-                self.load_all_transactions_view()
-        elif self.current_view_mode == "summary":
-            self.show_product_summary()
-        self.on_tree_select(None) # Recalculate totals
-
-    def filter_records(self):
-        if self.current_view_mode != "transactions":
-            self.setup_transactions_view() # Switch to transaction view if filtering
-            
-        name_filter = self.entry_filter_name.get().strip()
-        model_filter = self.entry_filter_model.get().strip()
+    def _show_batch_result(self, action, results):
+        """汇总批量操作的逐条结果并提示用户，有任何记录变化时刷新一次视图"""
+        succeeded = sum(1 for success, _ in results.values() if success)
+        skipped = {}
+        for success, message in results.values():
+            if not success:
+                skipped[message] = skipped.get(message, 0) + 1
+        summary = f"{action}成功: {succeeded} 条"
+        if skipped:
+            summary += "\n" + "\n".join(f"{message}: {n} 条" for message, n in skipped.items())
+        tkmb.showinfo("结果", summary, parent=self)
+        if succeeded:
+            self.refresh_current_view()
+
+    def undo_selected_transactions(self, transaction_ids):
+        self.context_menu.place_forget()
+        if tkmb.askyesno("确认操作", f"确定要撤销选中的 {len(transaction_ids)} 条记录吗？\n此操作会影响库存统计。", parent=self):
+            self._show_batch_result("撤销", self.inventory_manager.undo_transactions(transaction_ids))
 
-        if not name_filter and not model_filter:
-            self.load_all_transactions_view() # Show all if filters are empty
-            return
+    def redo_selected_transactions(self, transaction_ids):
+        self.context_menu.place_forget()
+        if tkmb.askyesno("确认操作", f"确定要恢复选中的 {len(transaction_ids)} 条记录吗？", parent=self):
+            self._show_batch_result("恢复", self.inventory_manager.redo_transactions(transaction_ids))
 
-        transactions = self.inventory_manager.get_records_by_filter(name_filter, model_filter)
-        self.populate_treeview(transactions)
-        self.status_label.configure(text=f"状态: 筛选结果 (名称: '{name_filter}', 型号: '{model_filter}')")
+    def delete_selected_transactions(self, transaction_ids):
+        self.context_menu.place_forget()
+        if tkmb.askyesno("警告：永久删除", f"确定要永久删除选中的 {len(transaction_ids)} 条记录吗？\n此操作不可恢复！", parent=self):
+            self._show_batch_result("删除", self.inventory_manager.delete_transactions(transaction_ids))
 
     def open_advanced_filter_dialog(self):
         dialog = AdvancedFilterDialog(self, current_filters=self.active_filters)
@@ -489,104 +647,251 @@ class MainWindow(ctk.CTk):
             self.load_all_transactions_view()
             return
             
-        transactions = self.inventory_manager.get_records_with_advanced_filter(self.active_filters)
-        self.populate_treeview(transactions)
-        self.status_label.configure(text=f"状态: 已应用 {len(self.active_filters)} 条高级筛选规则")
+        self._load_transactions(self.active_filters, f"状态: 已应用 {len(self.active_filters)} 条高级筛选规则",
+                                self.apply_advanced_filters)
 
     def clear_all_filters(self):
         self.active_filters = {}
+        self.entry_search.delete(0, "end")
+        self.virtual_tree.set_search("")
         self.load_all_transactions_view()
 
+    def _schedule_search(self, *args):
+        """【私有】搜索框内容变化：重新开始计时，停止输入 SEARCH_DEBOUNCE_MS 毫秒后才搜索"""
+        if self._search_after_id is not None:
+            self.after_cancel(self._search_after_id)
+        self._search_after_id = self.after(SEARCH_DEBOUNCE_MS, self.apply_search)
+
+    def apply_search(self):
+        """按搜索框的内容筛选当前视图已加载的行 (不查询数据库)"""
+        self._search_after_id = None
+        text = self.entry_search.get().strip()
+        if text == self.virtual_tree.search_text:
+            return
+        self.virtual_tree.set_search(text)
+        if self.view_loader.loading:
+            return # 加载进度仍显示在状态栏，新到的页按搜索内容筛选
+        self._show_search_status()
+        self.on_tree_select(None)
+
+    def _on_search_progress(self):
+        """【私有】搜索在空闲时又查找完一批行，更新状态栏中的匹配数 (加载中时状态栏显示加载进度)"""
+        if not self.view_loader.loading:
+            self._show_search_status()
+
+    def _show_search_status(self):
+        """【私有】在状态栏显示当前搜索的匹配数；还有没查找完的行时注明“搜索中”"""
+        text, count = self.virtual_tree.search_text, len(self.virtual_tree)
+        if not text:
+            self.status_label.configure(text=f"状态: 显示全部 {count} 条")
+            return
+        pending = " (搜索中...)" if self.virtual_tree.search_pending else ""
+        self.status_label.configure(text=f"状态: 搜索 '{text}': {count} / {self.virtual_tree.total_count} 条匹配{pending}")
+
     def load_all_transactions_view(self):
         # 如果有筛选规则，应该清除它们再加载全部
         if self.active_filters:
             self.clear_all_filters()
         else:
-            if self.current_view_mode != "transactions":
-                self.setup_transactions_view()
-            transactions = self.inventory_manager.get_all_records(include_undone=True)
-            self.populate_treeview(transactions)
-            self.status_label.configure(text="状态: 显示所有交易记录")
+            self._load_transactions({}, "状态: 显示所有交易记录", self.load_all_transactions_view)
 
     def refresh_current_view(self):
-        if self.current_view_mode == "transactions":
-            # 刷新时，重新应用当前激活的筛选规则
-            self.apply_advanced_filters()
+        """
+        写入后刷新。交易视图按变更日志只更新受影响的行 (保持滚动位置和选择)，
+        变更太多时才重新加载；汇总视图行数很少，直接重新查询。正在加载时重新开始这次加载。
+        """
+        if self.view_loader.loading:
+            self._reload_view()
+        elif self.current_view_mode == "transactions":
+            if not self.apply_view_changes():
+                # 重新应用当前激活的筛选规则
+                self.apply_advanced_filters()
         elif self.current_view_mode == "summary":
             self.show_product_summary()
 
+    def apply_view_changes(self):
+        """把上次加载/刷新以来的变更应用到交易视图；变更太多需要整体重新加载时返回 False"""
+        view_changes = self.inventory_manager.get_view_changes(self._view_change_seq, self.active_filters)
+        if view_changes is None:
+            return False
+        self._view_change_seq, changed_rows, removed_ids = view_changes
+        if changed_rows or removed_ids:
+            self.virtual_tree.update_rows(changed_rows, removed_ids)
+            self.on_tree_select(None) # 选中的记录可能被撤销或删除
+        return True
+
     def on_tree_select(self, event):
         """当Treeview中的选择变化时调用"""
         if self.current_view_mode != "transactions":
             self.selected_total_label.configure(text="选中总金额: N/A (非交易视图)")
             return
 
-        selected_iids = self.tree.selection() # Get IIDs of selected items
-        if not selected_iids:
+        # 合计由虚拟列表随选择增减维护 (包括没有显示的行)，这里不访问数据库
+        totals = self.virtual_tree.selection_totals
+        if not self.virtual_tree.selected_count or totals is None:
             self.selected_total_label.configure(text="选中总金额: 0.00")
             return
-
-        # Our IIDs are the database transaction IDs
-        transaction_ids_to_sum = [iid for iid in selected_iids] 
-        
-        totals = self.inventory_manager.calculate_selected_totals(transaction_ids_to_sum)
-        self.selected_total_label.configure(text=f"选中总金额: {totals['total_amount']:.2f} (共 {totals['count']} 条有效记录)")
+        count, inbound_cents, outbound_cents, inbound_quantity, outbound_quantity = totals
+        self.selected_total_label.configure(
+            text=f"选中总金额: {(inbound_cents + outbound_cents) / 100:.2f} (共 {count} 条有效记录)  "
+                 f"入库: {inbound_cents / 100:.2f} / {inbound_quantity}  "
+                 f"出库: {outbound_cents / 100:.2f} / {outbound_quantity}  "
+                 f"总数量: {inbound_quantity + outbound_quantity}")
 
     def import_from_excel_dialog(self):
-        """打开文件对话框以选择要导入的Excel文件。"""
+        """打开文件对话框以选择要导入的文件，在后台执行导入。"""
+        if self.job_runner.busy:
+            tkmb.showinfo("提示", "已有导入/导出任务在进行中，请等待其完成或取消。", parent=self)
+            return
         file_path = filedialog.askopenfilename(
-            title="选择要导入的Excel文件",
-            filetypes=(("Excel Files", "*.xlsx"), ("All files", "*.*")),
+            title="选择要导入的文件",
+            filetypes=IMPORT_FILETYPES,
             parent=self
         )
         if not file_path:
             return # 用户取消了选择
 
-        # 执行导入，并给出状态提示
-        self.status_label.configure(text="状态: 正在从Excel导入...")
-        self.update_idletasks() # 强制UI立即更新状态标签
-        
-        success, message = self.inventory_manager.import_from_excel(file_path)
-        
+        self._start_job(
+            "状态: 正在导入...",
+            lambda progress: self.inventory_manager.import_from_file(file_path, progress_callback=progress),
+            on_progress=lambda parsed, inserted, rejected: self.status_label.configure(
+                text=f"状态: 正在导入... 已解析 {parsed} 行, 已写入 {inserted} 行, 已拒绝 {rejected} 行"),
+            on_done=self._on_import_done,
+        )
+
+    def _on_import_done(self, result):
+        """导入任务结束 (主线程)"""
+        success, message = result
+        report = self.inventory_manager.last_import_report
+        if report and report.inserted:
+            self.refresh_current_view() # 有数据写入 (全部或部分成功) 时刷新一次视图
         if success:
+            self.status_label.configure(text="状态: 导入成功")
             tkmb.showinfo("成功", message, parent=self)
-            self.refresh_current_view() # 导入成功后刷新视图以显示新数据
         else:
-            tkmb.showerror("导入失败", message, parent=self)
             self.status_label.configure(text="状态: 导入失败或部分失败")
+            tkmb.showerror("导入失败", message, parent=self)
+            if report and report.rejected:
+                self._offer_import_error_report(report)
 
-    def export_to_excel_dialog(self):
-        """打开文件对话框以选择保存Excel文件的位置。"""
-        # 建议一个默认文件名，包含当前日期和时间
-        default_filename = f"库存记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        
+    def import_folder_dialog(self):
+        """选择一个文件夹，在后台并行导入其中所有的 .xlsx / .csv / .parquet 文件 (按文件名顺序写入)。"""
+        if self.job_runner.busy:
+            tkmb.showinfo("提示", "已有导入/导出任务在进行中，请等待其完成或取消。", parent=self)
+            return
+        folder = filedialog.askdirectory(title="选择要导入的文件夹", parent=self)
+        if not folder:
+            return
+        file_paths = find_import_files(folder)
+        if not file_paths:
+            tkmb.showinfo("提示", "该文件夹中没有可导入的文件 (支持 .xlsx、.csv、.parquet)。", parent=self)
+            return
+
+        self._start_job(
+            f"状态: 正在导入 {len(file_paths)} 个文件...",
+            lambda progress: self.inventory_manager.import_files(file_paths, progress_callback=progress),
+            on_progress=lambda done, total, inserted: self.status_label.configure(
+                text=f"状态: 正在导入... 已完成 {done}/{total} 个文件, 已写入 {inserted} 条记录"),
+            on_done=self._on_folder_import_done,
+        )
+
+    def _on_folder_import_done(self, result):
+        """多文件导入任务结束 (主线程)"""
+        success, message = result
+        reports = self.inventory_manager.last_import_reports
+        if any(r.inserted for r in reports):
+            self.refresh_current_view()
+        if success:
+            self.status_label.configure(text="状态: 导入成功")
+            tkmb.showinfo("成功", message, parent=self)
+            return
+        self.status_label.configure(text="状态: 导入失败或部分失败")
+        tkmb.showerror("导入失败", message, parent=self)
+        if not any(r.error or r.rejected for r in reports):
+            return
+        if not tkmb.askyesno("错误报告", "是否保存所有文件的完整错误报告？", parent=self):
+            return
         file_path = filedialog.asksaveasfilename(
-            title="选择保存位置",
-            defaultextension=".xlsx",
-            filetypes=(("Excel Files", "*.xlsx"), ("All files", "*.*")),
-            initialfile=default_filename,
+            title="保存错误报告",
+            defaultextension=".csv",
+            filetypes=(("CSV Files", "*.csv"), ("All files", "*.*")),
+            initialfile=f"批量导入错误_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv",
+            parent=self
+        )
+        if file_path:
+            try:
+                save_file_reports_errors(reports, file_path)
+            except OSError as e:
+                tkmb.showerror("保存失败", f"无法保存错误报告: {e}", parent=self)
+
+    # --- 后台任务 ---
+
+    def _start_job(self, status_text, job, on_progress, on_done):
+        """
+        在后台线程中执行 job(progress)，期间在底部显示进度条和取消按钮。
+        job 应返回 (success, message)；结束后在主线程调用 on_done(result)。
+        """
+        def finished(result, error):
+            self._hide_job_progress()
+            if error is not None:
+                result = (False, f"任务失败: {error}")
+            on_done(result)
+
+        if not self.job_runner.submit(job, on_progress=on_progress, on_done=finished):
+            tkmb.showinfo("提示", "已有导入/导出任务在进行中，请等待其完成或取消。", parent=self)
+            return
+        self.status_label.configure(text=status_text)
+        for button in self._job_buttons:
+            button.configure(state="disabled")
+        self.btn_cancel_job.configure(state="normal", text="取消")
+        self.btn_cancel_job.pack(side="right", padx=self._job_pad, pady=self._job_pad)
+        self.job_progress_bar.pack(side="right", padx=self._job_pad, pady=self._job_pad)
+        self.job_progress_bar.start()
+
+    def _hide_job_progress(self):
+        self.job_progress_bar.stop()
+        self.job_progress_bar.pack_forget()
+        self.btn_cancel_job.pack_forget()
+        for button in self._job_buttons:
+            button.configure(state="normal")
+
+    def cancel_current_job(self):
+        """取消按钮：请求后台任务在下一次报告进度时停止"""
+        self.job_runner.cancel()
+        self.btn_cancel_job.configure(state="disabled", text="正在取消...")
+
+    def _offer_import_error_report(self, report):
+        """询问是否把全部无效行保存为 CSV 错误报告"""
+        if not tkmb.askyesno("错误报告", f"共有 {report.rejected} 行未能导入，是否保存完整的错误报告？", parent=self):
+            return
+        file_path = filedialog.asksaveasfilename(
+            title="保存错误报告",
+            defaultextension=".csv",
+            filetypes=(("CSV Files", "*.csv"), ("All files", "*.*")),
+            initialfile=f"导入错误_{os.path.splitext(report.file_name)[0]}.csv",
             parent=self
         )
         if not file_path:
-            return # 用户取消了选择
+            return
+        try:
+            report.save_errors(file_path)
+            tkmb.showinfo("成功", f"错误报告已保存到 {file_path}", parent=self)
+        except OSError as e:
+            tkmb.showerror("保存失败", f"无法保存错误报告: {e}", parent=self)
 
-        # 执行导出，并给出状态提示
-        self.status_label.configure(text="状态: 正在导出到Excel...")
-        self.update_idletasks() # 强制UI立即更新状态标签
-        
-        success, message = self.inventory_manager.export_to_excel(file_path)
-        
-        if success:
-            tkmb.showinfo("成功", message, parent=self)
-            self.status_label.configure(text="状态: 导出成功")
-        else:
-            tkmb.showerror("导出失败", message, parent=self)
-            self.status_label.configure(text="状态: 导出失败")
+    def export_to_excel_dialog(self):
+        """打开文件对话框以选择保存位置，在后台导出全部记录。"""
+        # 建议一个默认文件名，包含当前日期和时间
+        default_filename = f"库存记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        file_path = self._ask_export_path(default_filename)
+        if not file_path:
+            return # 用户取消了选择
+        self._start_export_job(file_path, None, "状态: 正在导出...")
 
     def export_selected_dialog(self):
         """打开文件对话框以导出选中的交易记录。"""
-        # 1. 获取Treeview中所有被选中的行的IID
-        selected_ids = self.tree.selection()
+        # 1. 获取所有被选中的行的IID (包括滚出可见区域的行)
+        selected_ids = self.virtual_tree.selection()
 
         if not selected_ids:
             tkmb.showinfo("提示", "请先在表格中选择至少一条要导出的记录。", parent=self)
@@ -594,26 +899,52 @@ class MainWindow(ctk.CTk):
 
         # 2. 打开保存对话框
         default_filename = f"选中记录_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
-        file_path = filedialog.asksaveasfilename(
+        file_path = self._ask_export_path(default_filename)
+        if not file_path:
+            return
+
+        # 3. 在后台按所选文件的扩展名导出为 Excel / CSV / Parquet
+        self._start_export_job(file_path, list(selected_ids), f"状态: 正在导出 {len(selected_ids)} 条选中记录...")
+
+    def export_incremental_dialog(self):
+        """只导出自上次增量导出以来新增、撤销、恢复或删除的记录 (末尾附变更类型列)。"""
+        default_filename = f"增量变更_{datetime.now().strftime('%Y%m%d_%H%M%S')}.xlsx"
+        file_path = self._ask_export_path(default_filename)
+        if not file_path:
+            return
+        self._start_job(
+            "状态: 正在增量导出...",
+            lambda progress: self.inventory_manager.export_incremental(file_path, progress_callback=progress),
+            on_progress=lambda written: self.status_label.configure(text=f"状态: 正在导出... 已写入 {written} 条变更"),
+            on_done=self._on_export_done,
+        )
+
+    def _ask_export_path(self, default_filename):
+        if self.job_runner.busy:
+            tkmb.showinfo("提示", "已有导入/导出任务在进行中，请等待其完成或取消。", parent=self)
+            return None
+        return filedialog.asksaveasfilename(
             title="选择保存位置",
             defaultextension=".xlsx",
-            filetypes=(("Excel Files", "*.xlsx"), ("All files", "*.*")),
+            filetypes=EXPORT_FILETYPES,
             initialfile=default_filename,
             parent=self
         )
-        if not file_path:
-            return
 
-        # 3. 调用新的业务逻辑方法
-        self.status_label.configure(text=f"状态: 正在导出 {len(selected_ids)} 条选中记录...")
-        self.update_idletasks()
-        
-        # 注意：这里我们调用的是新的 export_selected_records 方法
-        success, message = self.inventory_manager.export_selected_records(list(selected_ids), file_path)
-        
+    def _start_export_job(self, file_path, transaction_ids, status_text):
+        self._start_job(
+            status_text,
+            lambda progress: self.inventory_manager.export_records(file_path, transaction_ids, progress_callback=progress),
+            on_progress=lambda written: self.status_label.configure(text=f"状态: 正在导出... 已写入 {written} 条记录"),
+            on_done=self._on_export_done,
+        )
+
+    def _on_export_done(self, result):
+        """导出任务结束 (主线程)"""
+        success, message = result
         if success:
-            tkmb.showinfo("成功", message, parent=self)
             self.status_label.configure(text="状态: 导出成功")
+            tkmb.showinfo("成功", message, parent=self)
         else:
-            tkmb.showerror("导出失败", message, parent=self)
             self.status_label.configure(text="状态: 导出失败")
+            tkmb.showerror("导出失败", message, parent=self)
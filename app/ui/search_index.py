@@ -0,0 +1,130 @@
+# app/ui/search_index.py
+"""
+搜索框使用的内存索引：在已加载的行中按子串 (不区分大小写) 查找，不查询数据库。
+
+名称、型号、购买方、销售方的取值大量重复，所以文本只按“不同的取值”索引：
+- 取值 (末尾补两个 \\0) 的每个三字符片段映射到含有它的取值。3 个字符以上的关键词取其各个片段对应的
+  取值集合求交集，再逐个确认确实包含该子串；1~2 个字符的关键词按前缀在有序的片段列表上二分查找
+  (补 \\0 后任何位置出现的短关键词都是某个片段的前缀，不需要再确认)。
+- 每个字段一列取值编号 (array，每行 4 字节)。找到匹配的取值后，用 numpy 按列查表得到匹配行的掩码，
+  100 万行也只需要几次向量运算，不必逐行执行 Python 代码。
+多个关键词 (空格分隔) 要求同时匹配，每个关键词可以匹配任意一个字段。
+"""
+from array import array
+from bisect import bisect_left
+from operator import itemgetter
+import numpy as np
+
+PAD = "\0\0"
+EMPTY_VALUE_ID = 0 # 空值 (None/"") 的取值编号，不匹配任何关键词
+
+def split_terms(text: str) -> list:
+    """把搜索框的内容拆成小写的关键词"""
+    return text.lower().split()
+
+class SearchIndex:
+    def __init__(self, fields):
+        """:param fields: 参与搜索的字段名，行需支持 row[field]"""
+        self.fields = tuple(fields)
+        self._raw_ids = {None: EMPTY_VALUE_ID, "": EMPTY_VALUE_ID} # 原始取值 -> 取值编号 (重复的取值不必再转小写)
+        self._value_ids = {"": EMPTY_VALUE_ID} # 小写取值 -> 取值编号
+        self._values = [""] # 取值编号 -> 小写取值
+        self._columns = [array('i') for _ in self.fields] # 每个字段：行下标 -> 取值编号
+        self._grams = {} # 三字符片段 -> 取值编号集合
+        self._sorted_grams = None # 片段的有序列表，短关键词按前缀查找时使用；有新片段时重建
+
+    def __len__(self):
+        """已索引的行数；行下标依次为 0, 1, ..."""
+        return len(self._columns[0]) if self._columns else 0
+
+    def add_rows(self, rows):
+        """在末尾索引一批行 (需支持多次遍历)"""
+        raw_ids = self._raw_ids
+        for field, column in zip(self.fields, self._columns): # 按字段逐列处理，只有新取值才执行 Python 代码
+            values = list(map(itemgetter(field), rows))
+            for value in set(values).difference(raw_ids):
+                self._value_id(value)
+            column.extend(map(raw_ids.__getitem__, values))
+
+    def update_row(self, index: int, row):
+        """已索引的第 index 行内容被替换"""
+        for field, column in zip(self.fields, self._columns):
+            column[index] = self._value_id(row[field])
+
+    def _value_id(self, value) -> int:
+        """【私有】原始取值对应的取值编号，新的取值先登记"""
+        value_id = self._raw_ids.get(value)
+        if value_id is None:
+            key = str(value).lower()
+            value_id = self._value_ids.get(key)
+            if value_id is None:
+                value_id = self._add_value(key)
+            self._raw_ids[value] = value_id
+        return value_id
+
+    def _add_value(self, key: str) -> int:
+        """【私有】登记一个新的取值及其片段"""
+        value_id = len(self._values)
+        self._value_ids[key] = value_id
+        self._values.append(key)
+        padded = key + PAD
+        for i in range(len(key)):
+            gram = padded[i:i + 3]
+            ids = self._grams.get(gram)
+            if ids is None:
+                self._grams[gram] = {value_id}
+                self._sorted_grams = None
+            else:
+                ids.add(value_id)
+        return value_id
+
+    def matches(self, row, terms) -> bool:
+        """逐个检查一行是否匹配 split_terms() 得到的全部关键词 (用于少量新行，不经过索引)"""
+        values = [str(row[field]).lower() for field in self.fields if row[field] not in (None, "")]
+        return all(any(term in value for value in values) for term in terms)
+
+    def search(self, text: str, start: int = 0, end: int = None):
+        """
+        返回已索引的第 start 到 end 行 (end 为 None 时到最后) 是否匹配 text 中全部关键词的布尔数组 (numpy)；
+        text 为空时返回 None (不筛选)。结果包括调用方已经移除的行，调用方应只在现有的行中使用它。
+        """
+        terms = split_terms(text)
+        if not terms:
+            return None
+        end = len(self) if end is None else min(end, len(self))
+        count = max(0, end - start)
+        mask = None
+        for term in sorted(set(terms), key=len, reverse=True): # 长关键词更有选择性，先算
+            value_ids = self._matching_values(term)
+            if not value_ids:
+                return np.zeros(count, dtype=bool)
+            table = np.zeros(len(self._values), dtype=bool)
+            table[np.fromiter(value_ids, dtype=np.intp, count=len(value_ids))] = True
+            term_mask = np.zeros(count, dtype=bool)
+            for column in self._columns:
+                term_mask |= table[np.frombuffer(column, dtype=np.intc)[start:end]]
+            mask = term_mask if mask is None else mask & term_mask
+        return mask
+
+    def _matching_values(self, term: str):
+        """【私有】包含 term 的取值编号"""
+        grams = self._grams
+        if len(term) >= 3:
+            sets = sorted((grams.get(term[i:i + 3], ()) for i in range(len(term) - 2)), key=len)
+            if not sets[0]:
+                return ()
+            candidates = set(sets[0]).intersection(*sets[1:])
+            if len(term) == 3:
+                return candidates
+            values = self._values
+            return [value_id for value_id in candidates if term in values[value_id]]
+        if self._sorted_grams is None:
+            self._sorted_grams = sorted(grams)
+        sorted_grams = self._sorted_grams
+        matched = set()
+        for position in range(bisect_left(sorted_grams, term), len(sorted_grams)):
+            gram = sorted_grams[position]
+            if not gram.startswith(term):
+                break
+            matched.update(grams[gram])
+        return matched
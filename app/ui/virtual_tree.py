@@ -0,0 +1,691 @@
+# app/ui/virtual_tree.py
+"""
+虚拟列表：Treeview 中只插入可见区域及其上下若干行 (overscan)，其余行只保存在 Python 列表里。
+20 万条记录时不再创建 20 万个 Tk 条目，切换视图和滚动都只处理一屏左右的行。
+
+    view = VirtualTreeview(tree, scrollbar, on_select=callback)
+    view.set_rows(rows, make_item, iid_of)   # rows 可以直接是查询结果，不做任何拷贝
+
+make_item(row) 只在某行需要显示时调用，返回 (values, tags)；iid_of(row) 返回该行的 iid
+(选择、排序需要所有行的 iid)。已显示的窗口内，Treeview 自己处理滚轮和方向键；视口接近窗口边缘时
+重新以视口为中心插入一批行。滚动条按逻辑行数显示位置，选择和排序都作用于全部行，而不只是已显示的行。
+
+set_rows 给出 search_fields 时在空闲时分批建立搜索索引 (见 search_index)，set_search(text) 只在内存中筛选要显示的行，
+追加、修改数据后按当前搜索内容继续筛选。搜索不等待索引建完：先立即查找一批已索引的行，其余的行在空闲时
+分批索引、查找，匹配的行陆续加入显示 (search_pending 为真期间)。
+"""
+import numpy as np
+from .search_index import SearchIndex, split_terms
+
+SHIFT_MASK = 0x0001
+CONTROL_MASK = 0x0004
+DEFAULT_VISIBLE_ROWS = 60 # 在第一次滚动回调给出实际可见行数之前的估计值
+OVERSCAN_ROWS = 50 # 视口上下各多插入的行数
+INSERT_RESORT_THRESHOLD = 100 # update_rows 一次新增的行超过该数时整体重排，而不是逐行二分插入
+INDEX_CHUNK_ROWS = 5000 # 空闲时每次索引的行数
+SEARCH_CHUNK_ROWS = 100_000 # 搜索时每次查找的已索引行数 (按列向量运算，每批约几毫秒)
+
+class VirtualTreeview:
+    def __init__(self, tree, scrollbar, on_select=None, overscan: int = OVERSCAN_ROWS, on_search_progress=None):
+        """
+        :param tree: 要托管的 ttk.Treeview；其 yscrollcommand 和 <<TreeviewSelect>> 由本类接管
+        :param scrollbar: 垂直滚动条，需支持 set(first, last) 和 command 回调
+        :param on_select: 选择变化时以 on_select(event) 调用 (event 可能为 None)
+        :param on_search_progress: 搜索在空闲时每查找完一批行后以 on_search_progress() 调用，
+                                   此时 len(self) 为目前找到的匹配行数，search_pending 表示是否还有没查找的行
+        """
+        self.tree = tree
+        self.scrollbar = scrollbar
+        self.on_select = on_select
+        self.on_search_progress = on_search_progress
+        self.overscan = overscan
+        self._rows = []
+        self._all_order = [] # 全部行的显示顺序：_rows 的下标
+        self._order = [] # 实际显示的行：没有搜索时就是 _all_order 本身，否则是其中匹配的行
+        self._order_array = None # _all_order 的 numpy 数组，搜索时按需建立
+        self._search_index = None
+        self._index_pending = False
+        self._search_text = ""
+        self._match = None # 当前搜索的匹配标记 (bytearray，按 _rows 下标)，没有搜索时为 None
+        self._match_pending = None # 还没查找的 _rows 下标区间 [start, end)，其中的标记暂为 0；查找完时为 None
+        self._make_item = None
+        self._iid_of = None
+        self._default_order = None # set_rows 时行的顺序 (key, reverse)，决定新增行插入的位置
+        self._rows_owned = False # _rows 是否是本类自己的拷贝 (传入的结果可能被缓存共享，修改前先拷贝)
+        self._index_by_iid = None # iid -> _rows 下标，需要时再建立
+        self._position_by_iid = None # iid -> 在 _order 中的位置，需要时再建立
+        self._selected = {} # 选中行的 iid -> _rows 下标 (包括没有插入 Treeview 的行)
+        self._measure = None # measure(row) -> 数值元组，选中行的合计按增量维护，见 selection_totals
+        self._totals = None
+        self._all_totals = None # 全部行的合计 (全选时直接使用)，数据变化时作废
+        self._anchor = None # Shift 多选的起点
+        self._focus = None
+        self._window = (0, 0) # 已插入 Treeview 的 _order 区间 [start, end)
+        self._window_iids = []
+        self._top = 0 # 视口第一行在 _order 中的位置
+        self._visible = DEFAULT_VISIBLE_ROWS
+        self._recenter_pending = False
+        self.sort_key = None # 当前排序使用的 key 函数 (未排序时为 None)
+        self.sort_reverse = False
+
+        tree.configure(yscrollcommand=self._on_tree_scroll)
+        scrollbar.configure(command=self.yview)
+        tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        tree.bind("<ButtonPress-1>", self._on_click)
+        tree.bind("<Control-a>", lambda event: (self.select_all(), "break")[1])
+
+    # --- 数据 ---
+
+    def set_rows(self, rows, make_item, iid_of=None, default_order=None, measure=None, search_fields=None):
+        """
+        替换全部数据，清空选择并回到顶部；当前的搜索内容对新数据继续生效。
+        :param rows: 支持下标访问的行序列，本类只保存引用
+        :param make_item: make_item(row) -> (values, tags)，只对需要显示的行调用
+        :param iid_of: iid_of(row) -> iid；为 None 时用行在 rows 中的下标作为 iid (此时不能使用 update_rows)
+        :param default_order: rows 本身的排列顺序 (key, reverse)，update_rows 按它放置新增的行；为 None 时新增行放在最前
+        :param measure: measure(row) -> 等长的数值元组；给出时 selection_totals 是选中行的逐项合计
+        :param search_fields: set_search 在哪些字段中查找；为 None 时不支持搜索 (总是显示全部行)
+        """
+        self._rows = rows
+        self._rows_owned = False
+        self._make_item = make_item
+        self._iid_of = iid_of
+        self._default_order = default_order
+        self._all_order = list(range(len(rows)))
+        self.sort_key = None
+        self.sort_reverse = False
+        self._reset_indexes()
+        self._measure = measure
+        self._all_totals = None
+        self._clear_selected()
+        self._anchor = self._focus = None
+        self._search_index = SearchIndex(search_fields) if search_fields else None
+        self._match = self._match_pending = None
+        if self._search_index is not None and self._search_text:
+            self._match = self._search(self._search_text)
+        self._schedule_indexing()
+        self._derive_order()
+        self._render(0, force=True)
+
+    def __len__(self):
+        """显示的行数 (有搜索时只计匹配的行)"""
+        return len(self._order)
+
+    @property
+    def total_count(self) -> int:
+        """全部行数，不受搜索影响"""
+        return len(self._all_order)
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def iid_at(self, position: int) -> str:
+        """显示顺序中第 position 行的 iid"""
+        return self._iid(self._order[position])
+
+    def row_by_iid(self, iid):
+        """按 iid 找到对应的行，不存在时返回 None"""
+        index = self._indexes().get(str(iid))
+        return None if index is None else self._rows[index]
+
+    def _iid(self, index: int) -> str:
+        """【私有】_rows[index] 的 iid (Treeview 的 iid 总是字符串)"""
+        return str(self._iid_of(self._rows[index])) if self._iid_of else str(index)
+
+    def _indexes(self) -> dict:
+        """
+        【私有】iid -> _rows 下标 (只包括仍在列表中的行，被 update_rows 移除的行留在 _rows 中但不再出现)；
+        包括被搜索隐藏的行
+        """
+        if self._index_by_iid is None:
+            self._index_by_iid = {self._iid(index): index for index in self._all_order}
+        return self._index_by_iid
+
+    def _positions(self) -> dict:
+        """【私有】iid -> 在显示顺序中的位置 (只包括显示的行)"""
+        if self._position_by_iid is None:
+            self._position_by_iid = {self._iid(index): position for position, index in enumerate(self._order)}
+        return self._position_by_iid
+
+    def _reset_indexes(self):
+        """【私有】数据或顺序变化后丢弃按需建立的索引"""
+        self._index_by_iid = None
+        self._position_by_iid = None
+        self._order_array = None
+
+    def append_rows(self, rows):
+        """
+        在末尾追加一批行 (分页加载时的后续页)，保持选择和滚动位置；已按列排序时按该排序插入。
+        只有可见窗口还没有填满或排序后窗口内容变化时才重新插入条目。
+        """
+        if not rows:
+            return
+        if not self._rows_owned:
+            self._rows = list(self._rows)
+            self._rows_owned = True
+        first = len(self._rows)
+        self._rows.extend(rows)
+        self._all_totals = None
+        added = range(first, len(self._rows))
+        if self._index_by_iid is not None:
+            self._index_by_iid.update((self._iid(index), index) for index in added)
+        self._position_by_iid = None
+        self._order_array = None
+        self._schedule_indexing()
+        if self.sort_key is not None:
+            self._add_to_order(list(added))
+            self._render(self._top, force=True)
+        else:
+            self._add_to_order(added, append=True)
+            self._render(self._top)
+
+    def update_rows(self, changed_rows, removed_iids=()):
+        """
+        增量修改数据：changed_rows 中 iid 已存在的行替换原行，其余作为新行按当前排序 (或 default_order) 插入；
+        removed_iids 中的行被移除。Treeview 中只增删、更新受影响的条目，滚动位置 (视口第一行) 和其余选择保持不变。
+        有搜索时只显示匹配的新行；修改使某行是否匹配发生变化时重新筛选并回到顶部。
+        """
+        indexes = self._indexes()
+        removed = {indexes[str(iid)] for iid in removed_iids if str(iid) in indexes}
+        if not changed_rows and not removed:
+            return
+        if not self._rows_owned:
+            self._rows = list(self._rows)
+            self._rows_owned = True
+        self._all_totals = None
+        rows = self._rows
+        start, _ = self._window
+        window_iids = self._window_iids
+        anchor = next((iid for iid in window_iids[self._top - start:] if indexes[iid] not in removed), None)
+
+        search_index, match = self._search_index, self._match
+        indexed = len(search_index) if search_index is not None else 0
+        updated, added, rematch = [], [], False
+        for row in changed_rows:
+            iid = str(self._iid_of(row))
+            index = indexes.get(iid)
+            if index is None:
+                rows.append(row)
+                index = len(rows) - 1
+                indexes[iid] = index
+                added.append(index)
+            else:
+                if index < indexed: # 还没索引的行以后按新内容索引
+                    search_index.update_row(index, row)
+                if match is not None and not self._is_match_pending(index) \
+                        and bool(match[index]) != search_index.matches(row, self._search_terms):
+                    rematch = True # 修改后的行是否匹配搜索发生了变化 (还没查找的行以后按新内容查找)
+                if iid in self._selected: # 选中的行被撤销/恢复：按新旧两行调整合计
+                    self._deselect(iid)
+                    rows[index] = row
+                    self._select(iid, index)
+                else:
+                    rows[index] = row
+                updated.append(iid)
+        if removed:
+            self._all_order = [index for index in self._all_order if index not in removed]
+            if match is None:
+                self._order = self._all_order
+            else:
+                self._order = [index for index in self._order if index not in removed]
+            for index in removed:
+                iid = self._iid(index)
+                del indexes[iid]
+                self._deselect(iid)
+        self._add_to_order(added)
+        self._position_by_iid = None
+        self._order_array = None
+        self._schedule_indexing()
+        if rematch:
+            self._apply_search()
+            return
+
+        tree = self.tree
+        window = set(window_iids)
+        for iid in updated:
+            if iid in window:
+                values, tags = self._make_item(rows[indexes[iid]])
+                tree.item(iid, values=values, tags=tags)
+        if not added and not removed:
+            return
+        surviving = [iid for iid in window_iids if indexes.get(iid) is not None]
+        gone = [iid for iid in window_iids if indexes.get(iid) is None]
+        if gone:
+            tree.delete(*gone)
+        if not surviving:
+            self._render(self._top, force=True)
+            return
+        # 窗口内剩下的条目在新顺序中仍然连续 (新增的行可能插在它们之间)，只插入这些新行
+        order = self._order
+        new_start = order.index(indexes[surviving[0]])
+        new_end = order.index(indexes[surviving[-1]]) + 1
+        window_set = set(surviving)
+        iids = []
+        for offset, index in enumerate(order[new_start:new_end]):
+            iid = self._iid(index)
+            if iid not in window_set:
+                values, tags = self._make_item(rows[index])
+                tree.insert("", offset, iid=iid, values=values, tags=tags)
+            iids.append(iid)
+        self._window = (new_start, new_end)
+        self._window_iids = iids
+        top = order.index(indexes[anchor]) if anchor is not None else new_start
+        self._top = top
+        tree.yview_moveto((top - new_start) / (new_end - new_start))
+        self._update_scrollbar()
+
+    def _add_to_order(self, indexes, append: bool = False):
+        """【私有】把新行 (_rows 下标) 加入 _all_order，有搜索时匹配的行同时加入 _order；append 为真时放在末尾"""
+        if not indexes:
+            return
+        filtered = self._order is not self._all_order
+        if append:
+            self._all_order.extend(indexes)
+        else:
+            self._insert_ordered(indexes, self._all_order)
+        if not filtered:
+            return
+        terms, search_index, rows = self._search_terms, self._search_index, self._rows
+        flags = [search_index.matches(rows[index], terms) for index in indexes]
+        self._match.extend(flags) # 新行总是追加在 _rows 末尾，标记与之对齐
+        matching = [index for index, flag in zip(indexes, flags) if flag]
+        if append:
+            self._order.extend(matching)
+        else:
+            self._insert_ordered(matching, self._order)
+
+    def _insert_ordered(self, indexes: list, order: list):
+        """【私有】把新行 (_rows 下标) 按当前排序插入 order；没有排序依据时放在最前"""
+        if not indexes:
+            return
+        if self.sort_key is not None:
+            key, reverse = self.sort_key, self.sort_reverse
+        elif self._default_order is not None:
+            key, reverse = self._default_order
+        else:
+            order[:0] = indexes
+            return
+        rows = self._rows
+        if len(indexes) > INSERT_RESORT_THRESHOLD: # 新行很多时整体重排 (对基本有序的列表接近线性)
+            order.extend(indexes)
+            order.sort(key=lambda index: key(rows[index]), reverse=reverse)
+            return
+        for index in indexes:
+            value = key(rows[index])
+            low, high = 0, len(order)
+            while low < high: # 找到第一个应排在新行之后的位置 (相等的行保持在前)
+                mid = (low + high) // 2
+                other = key(rows[order[mid]])
+                if (other < value) if reverse else (value < other):
+                    high = mid
+                else:
+                    low = mid + 1
+            order.insert(low, index)
+
+    # --- 排序 ---
+
+    def sort_by(self, key, reverse: bool = False):
+        """按 key(row) 对全部行排序 (稳定排序，包括被搜索隐藏的行)，保留选择，回到顶部"""
+        rows = self._rows
+        self._all_order.sort(key=lambda index: key(rows[index]), reverse=reverse)
+        if self._order is not self._all_order: # 两者原来的相对顺序一致，稳定排序后仍然一致
+            self._order.sort(key=lambda index: key(rows[index]), reverse=reverse)
+        self.sort_key = key
+        self.sort_reverse = reverse
+        self._position_by_iid = None
+        self._order_array = None
+        self._render(0, force=True)
+
+    # --- 搜索 ---
+
+    def set_search(self, text: str) -> int:
+        """
+        只显示匹配 text 的行 (空白分隔的关键词都要出现在某个搜索字段中，不区分大小写)，text 为空时显示全部行。
+        结果来自内存中的索引，不查询数据库；被隐藏的行从选择中去掉。回到顶部，返回匹配的行数。
+        """
+        self._search_text = text
+        if self._search_index is None:
+            return len(self._order)
+        self._apply_search()
+        return len(self._order)
+
+    @property
+    def search_text(self) -> str:
+        return self._search_text
+
+    @property
+    def search_pending(self) -> bool:
+        """当前搜索是否还有没查找的行 (匹配的行还会陆续加入显示)"""
+        return self._match_pending is not None
+
+    @property
+    def _search_terms(self) -> list:
+        return split_terms(self._search_text)
+
+    def _apply_search(self):
+        """【私有】按当前搜索内容重新筛选显示的行，并刷新表格"""
+        self._match = match = self._search(self._search_text)
+        self._derive_order()
+        self._position_by_iid = None
+        if match is not None and self._selected: # 还没查找的行先保留选择
+            self._replace_selected({iid: index for iid, index in self._selected.items()
+                                    if match[index] or self._is_match_pending(index)})
+            self._apply_selection()
+        self._render(0, force=True)
+
+    def _search(self, text: str):
+        """
+        【私有】开始一次搜索，返回按 _rows 下标的匹配标记 (text 为空时为 None)。
+        这里只查找第一批行 (没有已索引的行时先索引一批)，其余的行由 _index_step 在空闲时继续查找。
+        """
+        terms = split_terms(text)
+        if not terms:
+            self._match_pending = None
+            return None
+        self._match = bytearray(len(self._rows))
+        self._match_pending = (0, len(self._rows)) if self._rows else None
+        self._match_rows()
+        self._schedule_indexing()
+        return self._match
+
+    def _is_match_pending(self, index: int) -> bool:
+        """【私有】_rows[index] 是否还没按当前搜索查找"""
+        pending = self._match_pending
+        return pending is not None and pending[0] <= index < pending[1]
+
+    def _match_rows(self) -> bool:
+        """
+        【私有】查找下一批还没查找的行 (最多 SEARCH_CHUNK_ROWS 行，只用已索引的部分；没有时先索引 INDEX_CHUNK_ROWS 行)，
+        写入匹配标记；返回这一批中是否有匹配的行
+        """
+        start, end = self._match_pending
+        if len(self._search_index) <= start:
+            self._index_rows(start + INDEX_CHUNK_ROWS)
+        stop = min(end, len(self._search_index), start + SEARCH_CHUNK_ROWS)
+        mask = self._search_index.search(self._search_text, start, stop)
+        self._match[start:stop] = mask.tobytes()
+        self._match_pending = (stop, end) if stop < end else None
+        return bool(mask.any())
+
+    def _schedule_indexing(self):
+        """【私有】还有没索引或没查找的行时，安排在空闲时分批处理 (每批之间 Tk 可以处理输入和重绘)"""
+        if self._search_index is None or self._index_pending:
+            return
+        if len(self._search_index) >= len(self._rows) and self._match_pending is None:
+            return
+        self._index_pending = True
+        self.tree.after_idle(self._index_step, self._search_index)
+
+    def _index_step(self, search_index):
+        """【私有】查找 (搜索未完成时) 或索引下一批行；数据已被 set_rows 替换时放弃"""
+        self._index_pending = False
+        if search_index is not self._search_index:
+            self._schedule_indexing()
+            return
+        if self._match_pending is None:
+            self._index_rows(len(search_index) + INDEX_CHUNK_ROWS)
+        else:
+            if self._match_rows(): # 把新找到的行加入显示，视口位置不变
+                self._derive_order()
+                self._position_by_iid = None
+                self._render(self._top, force=True)
+            if self.on_search_progress:
+                self.on_search_progress()
+        self._schedule_indexing()
+
+    def _index_rows(self, end: int):
+        """【私有】把 _rows 中还没索引的行 (直到 end) 加入索引"""
+        search_index = self._search_index
+        if search_index is not None and len(search_index) < min(end, len(self._rows)):
+            search_index.add_rows(self._rows[len(search_index):end])
+
+    def _derive_order(self):
+        """【私有】由 _all_order 和 _match 得到 _order (用 numpy 按标记筛选，不逐行执行 Python 代码)"""
+        if self._match is None:
+            self._order = self._all_order
+            return
+        if self._order_array is None:
+            self._order_array = np.array(self._all_order, dtype=np.intp)
+        order = self._order_array
+        self._order = order[np.frombuffer(self._match, dtype=bool)[order]].tolist()
+
+    # --- 选择 ---
+
+    def selection(self) -> list:
+        """全部选中行的 iid，按显示顺序排列 (包括没有插入 Treeview 的行)"""
+        if not self._selected:
+            return []
+        if len(self._selected) * 8 > len(self._order): # 选中大部分行时顺序扫描比排序快
+            return [iid for iid in map(self._iid, self._order) if iid in self._selected]
+        positions = self._positions()
+        return sorted((iid for iid in self._selected if iid in positions), key=positions.__getitem__)
+
+    @property
+    def selected_count(self) -> int:
+        return len(self._selected)
+
+    def is_selected(self, iid) -> bool:
+        return str(iid) in self._selected
+
+    @property
+    def selection_totals(self):
+        """选中行 measure(row) 的逐项合计，随选择变化增量维护；没有给出 measure 或从未选中过行时为 None"""
+        return tuple(self._totals) if self._totals is not None else None
+
+    def selection_set(self, iids):
+        """把选择替换为 iids (不在列表中的 iid 被忽略)"""
+        indexes = self._indexes()
+        self._replace_selected({str(iid): indexes[str(iid)] for iid in iids if str(iid) in indexes})
+        self._apply_selection()
+
+    def select_all(self):
+        """选中全部显示的行 (Ctrl+A)；没有搜索时合计对同一份数据只计算一次"""
+        self._clear_selected()
+        if self._order is not self._all_order:
+            self._replace_selected({self._iid(index): index for index in self._order})
+            self._apply_selection()
+            return
+        self._selected = dict(self._indexes())
+        if self._measure and self._selected:
+            if self._all_totals is None:
+                self._add_to_totals(self._selected.values(), 1)
+                self._all_totals = list(self._totals)
+            self._totals = list(self._all_totals)
+        self._apply_selection()
+
+    def clear_selection(self):
+        self._clear_selected()
+        self._apply_selection()
+
+    def _select(self, iid, index):
+        """【私有】选中一行并把它计入合计"""
+        if iid in self._selected:
+            return
+        self._selected[iid] = index
+        if self._measure:
+            values = self._measure(self._rows[index])
+            if self._totals is None:
+                self._totals = list(values)
+                return
+            for i, value in enumerate(values):
+                self._totals[i] += value
+
+    def _deselect(self, iid):
+        """【私有】取消选中一行并从合计中减去"""
+        index = self._selected.pop(iid, None)
+        if index is not None and self._measure:
+            for i, value in enumerate(self._measure(self._rows[index])):
+                self._totals[i] -= value
+
+    def _clear_selected(self):
+        """【私有】清空选择和合计"""
+        self._selected = {}
+        self._totals = None
+
+    def _replace_selected(self, selected: dict):
+        """【私有】把选择替换为 selected (iid -> 下标)：只对增减的行调整合计，减去的行比新选择还多时从零重新累加"""
+        old = self._selected
+        if not old or len(selected) < len(old) - len(selected):
+            self._clear_selected()
+            added = selected
+        else:
+            removed = [iid for iid in old if iid not in selected]
+            self._add_to_totals([old[iid] for iid in removed], -1)
+            for iid in removed:
+                del old[iid]
+            added = {iid: index for iid, index in selected.items() if iid not in old}
+        self._selected.update(added)
+        self._add_to_totals(added.values(), 1)
+
+    def _add_to_totals(self, indexes, sign: int):
+        """【私有】把一批行的 measure 按列求和后加到 (sign=-1 时减去) 合计上"""
+        if not self._measure or not indexes:
+            return
+        rows, measure = self._rows, self._measure
+        sums = [sum(column) for column in zip(*(measure(rows[index]) for index in indexes))]
+        if self._totals is None:
+            self._totals = [0] * len(sums)
+        for i, value in enumerate(sums):
+            self._totals[i] += sign * value
+
+    def _apply_selection(self):
+        """【私有】把逻辑选择同步到已插入的条目，并通知 on_select"""
+        self.tree.selection_set([iid for iid in self._window_iids if iid in self._selected])
+        if self.on_select:
+            self.on_select(None)
+
+    def _on_tree_select(self, event):
+        """【私有】Treeview 中的选择变化 (点击、方向键等) 只涉及已插入的条目，据此更新逻辑选择"""
+        selected_now = set(self.tree.selection())
+        start, _ = self._window
+        for position, iid in enumerate(self._window_iids, start):
+            if iid in selected_now:
+                self._select(iid, self._order[position])
+            else:
+                self._deselect(iid)
+        focus = self.tree.focus()
+        if focus:
+            self._focus = focus
+        if self.on_select:
+            self.on_select(event)
+
+    def _on_click(self, event):
+        """
+        【私有】普通单击先清空逻辑选择 (未显示的行也要取消)；Shift+单击按显示顺序选中从起点到该行的全部行，
+        跨越未显示的行时由本类完成。Ctrl+单击交给 Treeview 处理。
+        """
+        if self.tree.identify_region(event.x, event.y) not in ("cell", "tree"):
+            return None
+        iid = self.tree.identify_row(event.y)
+        if not iid:
+            return None
+        if event.state & SHIFT_MASK and self._anchor is not None:
+            positions = self._positions()
+            start, end = sorted((positions.get(self._anchor, 0), positions[iid]))
+            self._replace_selected({self._iid(index): index for index in self._order[start:end + 1]})
+            self._focus = iid
+            self.tree.focus(iid)
+            self._apply_selection()
+            return "break"
+        if not event.state & CONTROL_MASK:
+            self._clear_selected()
+        self._anchor = iid
+        return None
+
+    # --- 滚动和显示 ---
+
+    def see(self, iid):
+        """滚动到 iid 所在的行 (必要时重新插入窗口)"""
+        position = self._positions().get(str(iid))
+        if position is None:
+            return
+        if not self._window[0] <= position < self._window[1]:
+            self._render(max(0, position - self._visible // 2))
+        self.tree.see(str(iid))
+
+    def yview(self, *args):
+        """滚动条的回调：('moveto', 比例) 或 ('scroll', 数量, 'units'|'pages')，按逻辑行数计算新的视口"""
+        total = len(self._order)
+        if not args or not total:
+            return
+        if args[0] == "moveto":
+            top = int(float(args[1]) * total)
+        elif args[0] == "scroll":
+            step = int(args[1]) * (self._visible if args[2] == "pages" else 1)
+            top = self._top + step
+        else:
+            return
+        self._render(top)
+
+    def refresh(self):
+        """重新生成已显示的条目 (行内容或标签变化后调用)，保持滚动位置和选择"""
+        self._render(self._top, force=True)
+
+    def _render(self, top: int, force: bool = False):
+        """【私有】把视口移到第 top 行；视口附近的行不在已插入的窗口中时，重新插入以视口为中心的一批行"""
+        total = len(self._order)
+        top = max(0, min(top, total - self._visible))
+        start = max(0, top - self.overscan)
+        end = min(total, top + self._visible + self.overscan)
+        if force or (start, end) != self._window:
+            self._fill_window(start, end)
+        self._top = top
+        if end > start:
+            self.tree.yview_moveto((top - start) / (end - start))
+        self._update_scrollbar()
+
+    def _fill_window(self, start: int, end: int):
+        """【私有】用 _order[start:end] 替换 Treeview 中的全部条目，并恢复其中的选择和焦点"""
+        tree = self.tree
+        children = tree.get_children()
+        if children:
+            tree.delete(*children)
+        iids = []
+        for index in self._order[start:end]:
+            iid = self._iid(index)
+            values, tags = self._make_item(self._rows[index])
+            tree.insert("", "end", iid=iid, values=values, tags=tags)
+            iids.append(iid)
+        self._window = (start, end)
+        self._window_iids = iids
+        selected = [iid for iid in iids if iid in self._selected]
+        if selected:
+            tree.selection_set(selected)
+        if self._focus in iids:
+            tree.focus(self._focus)
+
+    def _on_tree_scroll(self, first, last):
+        """
+        【私有】Treeview 在已插入的窗口内滚动后的回调 (滚轮、方向键、see 等)。
+        换算成逻辑位置显示在滚动条上；视口接近窗口边缘时安排重新插入。
+        """
+        first, last = float(first), float(last)
+        start, end = self._window
+        count = end - start
+        if count:
+            self._top = start + round(first * count)
+            if last - first < 1.0:
+                self._visible = max(1, round((last - first) * count))
+            elif end < len(self._order) or start > 0: # 窗口比视口还小，下次插入更多行
+                self._visible = count + self.overscan
+        self._update_scrollbar()
+        near_start = start > 0 and self._top - start < self.overscan // 2
+        near_end = end < len(self._order) and end - (self._top + self._visible) < self.overscan // 2
+        if (near_start or near_end or (count and last - first >= 1.0 and (start > 0 or end < len(self._order)))) \
+                and not self._recenter_pending:
+            self._recenter_pending = True
+            self.tree.after_idle(self._recenter)
+
+    def _recenter(self):
+        """【私有】在空闲时以当前视口为中心重新插入窗口"""
+        self._recenter_pending = False
+        self._render(self._top)
+
+    def _update_scrollbar(self):
+        """【私有】按逻辑行数设置滚动条"""
+        total = len(self._order)
+        if not total:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        self.scrollbar.set(self._top / total, min(1.0, (self._top + self._visible) / total))
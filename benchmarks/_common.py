@@ -0,0 +1,63 @@
+# benchmarks/_common.py
+"""基准测试的公共工具：在临时目录中创建数据库并批量生成交易记录。"""
+import atexit
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+PRODUCT_NAMES = ['发动机风扇', '氧传感器', '压差传感器', '催化剂模块', '机油滤清器', 'Bosch Pump', 'Valve ABC']
+PARTIES = ['上海汽配有限公司', '北京重工', '广州贸易', 'ACME Corp']
+
+def use_temp_database():
+    """
+    切换到一个临时目录，使 data_manager 在其中创建 database/inventory.db。
+    必须在导入 app.core 之前调用，避免改动项目自带的数据库。
+    """
+    workdir = tempfile.mkdtemp(prefix="inventory_bench_")
+    os.chdir(workdir)
+    atexit.register(shutil.rmtree, workdir, ignore_errors=True)
+    return workdir
+
+def populate(data_manager, row_count, seed=1):
+    """在临时数据库中建表后，通过 add_transactions_bulk 写入 row_count 条随机交易记录，并把约 10% 标记为已撤销"""
+    data_manager.initialize_database()
+    rng = random.Random(seed)
+    rows = (
+        {
+            "insertion_date": f"20{rng.randint(18, 25):02d}-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+            "product_name": rng.choice(PRODUCT_NAMES) + str(rng.randint(1, 500)),
+            "model_number": f"M{rng.randint(0, 99999):05d}",
+            "unit": '个',
+            "quantity": rng.choice([1, -1]) * rng.randint(1, 9),
+            "unit_price": 1.5,
+            "buyer": rng.choice(PARTIES),
+            "seller": rng.choice(PARTIES),
+        }
+        for _ in range(row_count)
+    )
+    data_manager.add_transactions_bulk(rows)
+    conn = data_manager.get_db_connection()
+    conn.execute("UPDATE transactions SET is_undone = 1 WHERE id % 10 = 0")
+    conn.commit()
+    conn.execute("ANALYZE")
+    conn.commit()
+
+@contextmanager
+def timed(label):
+    """打印代码块的耗时 (毫秒)"""
+    start = time.perf_counter()
+    yield
+    print(f"{label}: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def print_query_plan(conn, query, params=()):
+    """打印 EXPLAIN QUERY PLAN 的结果"""
+    for row in conn.execute("EXPLAIN QUERY PLAN " + query, params):
+        print("    " + row[3])
@@ -0,0 +1,43 @@
+# benchmarks/bench_date_queries.py
+"""
+比较按日期查询的两种写法：strftime() 逐行计算 vs. insertion_date 半开区间。
+
+    python benchmarks/bench_date_queries.py [行数]
+"""
+import sys
+from _common import use_temp_database, populate, timed, print_query_plan
+
+use_temp_database()
+from app.core import data_manager  # noqa: E402
+
+STRFTIME_QUERY = """
+SELECT * FROM transactions
+WHERE is_undone = 0 AND strftime('%Y', insertion_date) = ? AND strftime('%m', insertion_date) = ?
+ORDER BY insertion_date DESC, transaction_time DESC
+"""
+RANGE_QUERY = """
+SELECT * FROM transactions
+WHERE is_undone = 0 AND insertion_date >= ? AND insertion_date < ?
+ORDER BY insertion_date DESC, transaction_time DESC
+"""
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    populate(data_manager, row_count)
+    conn = data_manager.get_db_connection()
+    print(f"{row_count} 行, 查询 2024 年 6 月")
+
+    print("strftime 写法的查询计划:")
+    print_query_plan(conn, STRFTIME_QUERY, ("2024", "06"))
+    print("区间写法的查询计划:")
+    print_query_plan(conn, RANGE_QUERY, ("2024-06-01", "2024-07-01"))
+
+    with timed("strftime 写法"):
+        old_rows = conn.execute(STRFTIME_QUERY, ("2024", "06")).fetchall()
+    with timed("get_transactions_by_date(2024, 6)"):
+        new_rows = data_manager.get_transactions_by_date(2024, 6)
+    assert [r['id'] for r in old_rows] == [r['id'] for r in new_rows]
+    print(f"结果一致: {len(new_rows)} 行")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# benchmarks/bench_id_sets.py
+"""
+比较按 ID 集合取记录的写法：单条 id IN (?, ?, ...) 语句、按 500 个分块的 IN、以及
+get_transactions_by_ids / get_totals_by_ids (超过阈值时改走临时表连接)。
+
+    python benchmarks/bench_id_sets.py [行数]
+
+在 1k、10 万和 100 万 (不超过总行数) 个随机 ID 上各测一次。单条 IN 语句能否执行取决于
+编译时的变量个数上限 (3.32 之前默认 999，之后 32766，有的发行版为 250000)，超过时报
+too many SQL variables；在上限以内它与分块写法耗时相近，问题在于不可移植。
+"""
+import random
+import sqlite3
+import sys
+from _common import use_temp_database, populate, timed
+
+use_temp_database()
+from app.core import data_manager  # noqa: E402
+
+def single_statement(conn, ids):
+    placeholders = ', '.join(['?'] * len(ids))
+    return conn.execute(f"SELECT * FROM transactions WHERE id IN ({placeholders})", ids).fetchall()
+
+def chunked_in(conn, ids):
+    rows_by_id = {}
+    for start in range(0, len(ids), data_manager.ID_CHUNK_SIZE):
+        chunk = ids[start:start + data_manager.ID_CHUNK_SIZE]
+        placeholders = ', '.join(['?'] * len(chunk))
+        for row in conn.execute(f"SELECT * FROM transactions WHERE id IN ({placeholders})", chunk):
+            rows_by_id[row['id']] = row
+    return [rows_by_id[i] for i in ids if i in rows_by_id]
+
+def main():
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    populate(data_manager, row_count)
+    conn = data_manager.get_db_connection()
+    all_ids = [row[0] for row in conn.execute("SELECT id FROM transactions")]
+    rng = random.Random(7)
+
+    for size in (1_000, 100_000, 1_000_000):
+        if size > len(all_ids):
+            continue
+        ids = rng.sample(all_ids, size)
+        print(f"--- {size} 个 ID (共 {row_count} 行) ---")
+        try:
+            with timed("单条 IN 语句"):
+                single_statement(conn, ids)
+        except sqlite3.OperationalError as e:
+            print(f"单条 IN 语句: 失败 ({e})")
+        with timed("按 500 分块的 IN"):
+            chunked = chunked_in(conn, ids)
+        with timed("_fetch_rows_in_order (不含转换为字典)"):
+            ordered = data_manager._fetch_rows_in_order(conn, ids)
+        with timed("get_transactions_by_ids"):
+            rows = data_manager.get_transactions_by_ids(ids)
+        assert [r['id'] for r in rows] == ids == [r['id'] for r in chunked] == [r['id'] for r in ordered] # 保持调用方的顺序
+        with timed("get_totals_by_ids"):
+            totals = data_manager.get_totals_by_ids(ids)
+        print(f"有效记录 {totals['count']} 条, 总金额 {totals['total_amount']:.2f}")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,26 @@
 # main.py
-import customtkinter as ctk
-from app.ui.main_window import MainWindow
-from app.core.inventory import InventoryManager
-from app.core.data_manager import initialize_database # Ensure DB is ready
+# 多文件导入的解析子进程以 spawn 方式启动，会把本文件作为 __mp_main__ 重新导入一次。
+# 界面、InventoryManager 和 data_manager 因此只在 main() 中导入，子进程不会加载它们，也不会接触数据库。
+
+def main():
+    from app.ui.main_window import MainWindow
+    from app.core.inventory import InventoryManager
+    from app.core.data_manager import initialize_database, close_all_connections, close_thread_connection
 
-if __name__ == "__main__":
     initialize_database() # 确保数据库和表已创建
     
     inventory_manager = InventoryManager()
     
     app = MainWindow(inventory_manager)
-    app.mainloop()
\ No newline at end of file
+    try:
+        app.mainloop()
+    finally:
+        jobs_stopped = app.job_runner.shutdown() # 先停止后台导入/导出任务，再关闭它使用的连接
+        loader_stopped = app.view_loader.shutdown() # 同样先停止后台的视图查询
+        if jobs_stopped and loader_stopped:
+            close_all_connections() # 退出前关闭所有数据库长连接
+        else:
+            close_thread_connection() # 后台线程仍在执行，不能关闭它正在使用的连接；它结束后会自行关闭
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,22 @@
+# tests/conftest.py
+"""测试的公共夹具：每个测试使用临时目录中的新数据库，不改动项目自带的 database/inventory.db。"""
+import os
+import sys
+import pytest
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from app.core import data_manager  # noqa: E402
+
+@pytest.fixture
+def temp_database(tmp_path, monkeypatch):
+    """把 data_manager 指向临时目录中的数据库并建表，测试结束后关闭连接"""
+    database_dir = str(tmp_path / "database")
+    monkeypatch.setattr(data_manager, "DATABASE_DIR", database_dir)
+    monkeypatch.setattr(data_manager, "DATABASE_NAME", os.path.join(database_dir, "inventory.db"))
+    data_manager.close_all_connections() # 使之前打开的连接失效，下次使用时连接到临时数据库
+    data_manager.initialize_database()
+    yield data_manager
+    data_manager.close_all_connections()
@@ -0,0 +1,58 @@
+# tests/test_batch_redo.py
+"""批量恢复 (redo_transactions) 遇到内容哈希唯一索引冲突时，只跳过冲突的记录"""
+from app.core.inventory import InventoryManager, REDO_DUPLICATE_MESSAGE
+
+def _row(product_name, quantity=5):
+    return {
+        "insertion_date": "2024-03-01", "product_name": product_name, "model_number": "M-1", "unit": "个",
+        "quantity": quantity, "unit_price": 2.5, "buyer": "", "seller": "ACME Corp", "notes": "",
+    }
+
+def _import(data_manager, rows):
+    """作为一个导入批次写入 rows，返回按顺序的新记录 ID"""
+    batch_id = data_manager.create_import_batch("test.xlsx", "0" * 64)
+    first_id, last_id = data_manager.add_transactions_bulk(rows, import_batch_id=batch_id)
+    data_manager.finalize_import_batch(batch_id)
+    return list(range(first_id, last_id + 1))
+
+def _active_ids(data_manager, ids):
+    return {tid for tid in ids if not data_manager.get_transaction_by_id(tid)['is_undone']}
+
+def test_redo_batch_skips_row_reimported_while_undone(temp_database):
+    manager = InventoryManager()
+    ids = _import(temp_database, [_row("氧传感器"), _row("机油滤清器"), _row("压差传感器")])
+    manager.undo_transactions(ids)
+    _import(temp_database, [_row("氧传感器")]) # 撤销后重新导入了与第一条内容相同的记录
+
+    results = manager.redo_transactions(ids)
+
+    assert results[ids[0]] == (False, REDO_DUPLICATE_MESSAGE)
+    assert results[ids[1]] == (True, "交易恢复成功")
+    assert results[ids[2]] == (True, "交易恢复成功")
+    assert _active_ids(temp_database, ids) == {ids[1], ids[2]}
+
+def test_redo_batch_restores_only_first_of_identical_undone_rows(temp_database):
+    manager = InventoryManager()
+    first = _import(temp_database, [_row("发动机风扇")])
+    manager.undo_transactions(first)
+    second = _import(temp_database, [_row("发动机风扇"), _row("催化剂模块")]) # 第一条撤销后才导入，内容相同
+    manager.undo_transactions(second)
+    ids = first + second
+
+    results = manager.redo_transactions(ids)
+
+    assert results[first[0]] == (True, "交易恢复成功")
+    assert results[second[0]] == (False, REDO_DUPLICATE_MESSAGE)
+    assert results[second[1]] == (True, "交易恢复成功")
+    assert _active_ids(temp_database, ids) == {first[0], second[1]}
+
+def test_redo_large_batch_uses_temp_table(temp_database):
+    manager = InventoryManager()
+    ids = _import(temp_database, [_row(f"配件{n}") for n in range(temp_database.ID_TEMP_TABLE_THRESHOLD + 10)])
+    manager.undo_transactions(ids)
+    _import(temp_database, [_row("配件7")])
+
+    results = manager.redo_transactions(ids)
+
+    assert results[ids[7]] == (False, REDO_DUPLICATE_MESSAGE)
+    assert sum(success for success, _ in results.values()) == len(ids) - 1
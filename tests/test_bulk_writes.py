@@ -0,0 +1,47 @@
+# tests/test_bulk_writes.py
+"""批量写入和整批撤销/恢复不修改数据库结构：逐行触发器由 bulk_mode 守卫跳过，库存表一次性调整"""
+import pytest
+
+def _rows(count, product_name="氧传感器"):
+    return [{"insertion_date": "2024-03-01", "product_name": product_name, "model_number": f"M-{n % 3}",
+             "unit": "个", "quantity": n + 1, "unit_price": 1.0} for n in range(count)]
+
+def _schema_version(conn):
+    return conn.execute("PRAGMA schema_version").fetchone()[0]
+
+def test_bulk_insert_and_batch_undo_keep_schema_and_stock(temp_database):
+    conn = temp_database.get_db_connection()
+    schema_version = _schema_version(conn)
+    batch_id = temp_database.create_import_batch("a.xlsx", "0" * 64)
+
+    temp_database.add_transactions_bulk(_rows(50), import_batch_id=batch_id)
+    assert temp_database.verify_stock_levels() == []
+    temp_database.set_import_batch_undone_status(batch_id, True)
+    assert temp_database.verify_stock_levels() == []
+    temp_database.set_import_batch_undone_status(batch_id, False)
+
+    assert temp_database.verify_stock_levels() == []
+    assert _schema_version(conn) == schema_version # 没有 DROP/CREATE TRIGGER
+    assert conn.execute("SELECT COUNT(*) FROM bulk_mode").fetchone()[0] == 0
+    changes = [row[0] for row in conn.execute("SELECT change_type FROM transaction_changes ORDER BY seq")]
+    assert changes == ["insert"] * 50 + ["undo"] * 50 + ["redo"] * 50
+
+def test_failed_bulk_insert_leaves_triggers_active(temp_database):
+    rows = _rows(3) + [{"insertion_date": "bad", "product_name": "x", "model_number": "y", "quantity": 1, "unit_price": 1.0}]
+    with pytest.raises(ValueError):
+        temp_database.add_transactions_bulk(rows)
+
+    temp_database.add_transaction("机油滤清器", "M-9", "个", 4, 2.0, "2024-03-02") # 逐行触发器照常生效
+    conn = temp_database.get_db_connection()
+    assert conn.execute("SELECT COUNT(*) FROM bulk_mode").fetchone()[0] == 0
+    assert conn.execute("SELECT current_stock FROM stock_levels WHERE product_name = '机油滤清器'").fetchone()[0] == 4
+    assert temp_database.verify_stock_levels() == []
+
+def test_active_date_index_kept_for_date_range_queries(temp_database):
+    conn = temp_database.get_db_connection()
+    plan = " ".join(row[3] for row in conn.execute("""
+    EXPLAIN QUERY PLAN SELECT * FROM transactions
+    WHERE is_undone = 0 AND insertion_date >= '2024-03-01' AND insertion_date < '2024-04-01'
+    ORDER BY insertion_date DESC, transaction_time DESC
+    """))
+    assert "idx_transactions_active_date" in plan
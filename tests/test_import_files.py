@@ -0,0 +1,41 @@
+# tests/test_import_files.py
+"""多文件导入的解析子进程 (spawn) 不加载 data_manager，也不打开数据库"""
+import csv
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEADER = ['项目名称', '规格型号', '类型', '数量', '单价', '操作日期']
+
+def _write_csv(path, product_name, count):
+    with open(path, 'w', encoding='utf-8-sig', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows([product_name, f"M-{n}", "入库", n + 1, 2.5, "2024-03-01"] for n in range(count))
+
+def test_import_files_children_do_not_open_database(temp_database, tmp_path, monkeypatch):
+    from app.core import importer
+    files = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    _write_csv(files[0], "氧传感器", 3)
+    _write_csv(files[1], "机油滤清器", 4)
+    workdir = tmp_path / "cwd"
+    workdir.mkdir()
+    monkeypatch.chdir(workdir) # 子进程里的 data_manager 会在当前目录下按默认路径建库
+
+    reports = importer.import_files([str(path) for path in files], max_workers=2)
+
+    assert [report.inserted for report in reports] == [3, 4]
+    assert os.listdir(workdir) == []
+
+def test_spawn_child_imports_no_database_modules():
+    # spawn 的子进程先把 main.py 重新导入为 __mp_main__，再导入任务函数所在的模块
+    code = (
+        "import runpy, sys; runpy.run_path('main.py', run_name='__mp_main__'); "
+        "from app.core.import_parsing import parse_file; "
+        "print(' '.join(sorted(name for name in sys.modules if name.split('.')[0] == 'app')))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], cwd=PROJECT_ROOT, capture_output=True, text=True, check=True)
+
+    assert output.stdout.split() == ["app", "app.core", "app.core.import_parsing"]
@@ -0,0 +1,41 @@
+# tests/test_incremental_export.py
+"""增量导出的水位和各行来自同一个读快照，导出期间提交的写入完整地留给下一次"""
+import threading
+from app.core.inventory import InventoryManager, NO_NEW_CHANGES_MESSAGE
+
+def _write_in_other_thread(data_manager, undo_id):
+    def write():
+        data_manager.add_transaction("机油滤清器", "M-2", "个", 4, 2.0, "2024-03-02")
+        data_manager.set_transactions_undone_status([undo_id], True)
+        data_manager.close_thread_connection()
+    thread = threading.Thread(target=write)
+    thread.start()
+    thread.join()
+
+def _export(data_manager, name="test"):
+    since = data_manager.get_export_watermark(name)
+    with data_manager.incremental_export_snapshot(since) as (until, rows):
+        rows = list(rows)
+    data_manager.save_export_watermark(name, *until)
+    return [(row[0], row[11], row[-1]) for row in rows] # ID、状态、变更类型
+
+def test_write_committed_during_export_goes_to_next_run(temp_database):
+    first_id = temp_database.add_transaction("氧传感器", "M-1", "个", 3, 1.0, "2024-03-01")
+
+    with temp_database.incremental_export_snapshot((0, 0)) as (until, rows):
+        _write_in_other_thread(temp_database, first_id)
+        exported = [(row[0], row[11], row[-1]) for row in rows]
+    temp_database.save_export_watermark("test", *until)
+
+    assert exported == [(first_id, "有效", "新增")]
+    second_id = first_id + 1
+    assert _export(temp_database) == [(second_id, "有效", "新增"), (first_id, "已撤销", "撤销")]
+    assert _export(temp_database) == []
+
+def test_second_run_without_changes_reports_no_new_changes(temp_database, tmp_path):
+    manager = InventoryManager()
+    manager.record_inbound("氧传感器", "M-1", "个", 3, 1.0, "2024-03-01")
+
+    assert manager.export_incremental(str(tmp_path / "first.csv"))[0]
+    assert manager.export_incremental(str(tmp_path / "second.csv")) == (False, NO_NEW_CHANGES_MESSAGE)
+    assert not (tmp_path / "second.csv").exists()
@@ -0,0 +1,57 @@
+# tests/test_jobs.py
+"""后台工作线程：超时时报告未退出，线程退出前关闭自己的数据库连接；被取代的视图请求不再查询下一页"""
+import queue
+import threading
+from app.ui.jobs import JobRunner, ViewLoader
+
+class FakeRoot:
+    """只提供 after()，测试中不轮询消息队列"""
+    def after(self, delay_ms, callback, *args):
+        pass
+
+def test_job_runner_shutdown_reports_running_worker(temp_database):
+    runner = JobRunner(FakeRoot())
+    release = threading.Event()
+    started = threading.Event()
+
+    def job(progress):
+        temp_database.get_db_connection().execute("SELECT COUNT(*) FROM transactions").fetchone()
+        started.set()
+        release.wait(5)
+        progress(1) # 已取消，抛出 OperationCancelled
+    runner.submit(job)
+    started.wait(5)
+
+    assert runner.shutdown(timeout=0.1) is False
+    assert len(temp_database._connections) == 2 # 工作线程的连接仍然打开
+
+    release.set()
+    assert runner.shutdown(timeout=5) is True
+    assert len(temp_database._connections) == 1 # 工作线程退出前关闭了自己的连接
+
+def test_view_loader_stops_before_fetching_next_page(temp_database):
+    loader = ViewLoader(FakeRoot())
+    fetched = []
+
+    class CancellingQueue(queue.Queue):
+        """交出第一页的同时取消请求，模拟用户在两页之间切换视图"""
+        def put(self, item, *args, **kwargs):
+            super().put(item, *args, **kwargs)
+            if item[0] == "page":
+                loader.cancel()
+    loader._messages = CancellingQueue()
+
+    closed = threading.Event()
+
+    def pages():
+        try:
+            for number in range(3):
+                fetched.append(number) # 每取一页 (查询) 之前记录
+                yield [number]
+        finally:
+            closed.set() # 请求结束或被取代时，工作线程关闭迭代器
+    loader.load(pages, on_page=lambda page: None)
+
+    assert closed.wait(5)
+    assert loader.shutdown(timeout=5) is True
+    assert fetched == [0] # 被取消后不再查询下一页
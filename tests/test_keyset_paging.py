@@ -0,0 +1,56 @@
+# tests/test_keyset_paging.py
+"""键集分页 (iter_transaction_pages) 与 OFFSET 分页返回相同的行，包括页大小除不尽和含引号、中文的筛选条件"""
+import pytest
+
+NAMES = ["氧传感器", "O'Reilly 配件", '"特价" 机油滤清器', "压差传感器", "100% 纯铜线"]
+ROW_COUNT = 53
+
+@pytest.fixture
+def paged_database(temp_database):
+    # 同一天、同一记录时间的行很多，排序只能靠 id 区分
+    rows = [{"insertion_date": f"2024-03-0{1 + n % 3}", "product_name": NAMES[n % len(NAMES)], "model_number": f"M-{n}",
+             "unit": "个", "quantity": n + 1, "unit_price": 1.0, "buyer": "张三" if n % 2 else "李四's 店", "seller": ""}
+            for n in range(ROW_COUNT)]
+    temp_database.add_transactions_bulk(rows)
+    temp_database.set_transactions_undone_status(list(range(1, ROW_COUNT + 1, 4)), True)
+    return temp_database
+
+def _offset_pages(data_manager, filter_criteria, include_undone, page_size):
+    conn = data_manager.get_db_connection()
+    where_clause, params, _ = data_manager._build_advanced_filter_clause(conn, filter_criteria)
+    if not include_undone:
+        where_clause += " AND is_undone = 0"
+    query = ("SELECT id FROM transactions WHERE " + where_clause
+             + " ORDER BY insertion_date DESC, transaction_time DESC, id DESC LIMIT ? OFFSET ?")
+    ids, offset = [], 0
+    while True:
+        page = [row[0] for row in conn.execute(query, params + [page_size, offset])]
+        ids.extend(page)
+        if len(page) < page_size:
+            return ids
+        offset += page_size
+
+@pytest.mark.parametrize("page_size", [1, 7, 10, 52, 500])
+@pytest.mark.parametrize("filter_criteria", [
+    {},
+    {"product_name": "O'Reilly"},    # 单引号，走全文索引
+    {"product_name": '"特价"'},       # 双引号
+    {"product_name": "传感"},         # 中文，不足 3 个字符时走 LIKE
+    {"product_name": "氧传感器", "buyer": "李四's"},
+    {"product_name": "100%"},         # LIKE 通配符
+])
+@pytest.mark.parametrize("include_undone", [True, False])
+def test_keyset_pages_match_offset_pages(paged_database, filter_criteria, page_size, include_undone):
+    pages = list(paged_database.iter_transaction_pages(filter_criteria, include_undone=include_undone, page_size=page_size))
+
+    assert all(len(page) == page_size for page in pages[:-1])
+    keyset_ids = [row['id'] for page in pages for row in page]
+    assert keyset_ids == _offset_pages(paged_database, filter_criteria, include_undone, page_size)
+    assert len(keyset_ids) == len(set(keyset_ids))
+
+@pytest.mark.parametrize("term", ["O'Reilly", '"特价"', "传感", "100%"])
+def test_quoted_and_cjk_filters_match_substrings(paged_database, term):
+    rows = [row for page in paged_database.iter_transaction_pages({"product_name": term}, page_size=7) for row in page]
+
+    assert len(rows) == sum(term in NAMES[n % len(NAMES)] for n in range(ROW_COUNT))
+    assert all(term in row['product_name'] for row in rows)
@@ -0,0 +1,78 @@
+# tests/test_manual_duplicates.py
+"""内容哈希的唯一性检查只针对导入的记录：导入时重复的记录被跳过并报告；手工录入完全相同的记录照常写入，只给出提醒"""
+from app.core.inventory import InventoryManager, DUPLICATE_ENTRY_WARNING
+
+ENTRY = ("氧传感器", "M-1", "个", 5, 2.5, "2024-03-01", "", "", "ACME Corp")
+
+def test_identical_manual_entries_are_both_written(temp_database):
+    manager = InventoryManager()
+
+    assert manager.record_inbound(*ENTRY) == (True, "入库成功")
+    success, message = manager.record_inbound(*ENTRY)
+
+    assert success
+    assert DUPLICATE_ENTRY_WARNING in message
+    rows = temp_database.get_db_connection().execute(
+        "SELECT content_hash FROM transactions WHERE is_undone = 0").fetchall()
+    assert [row['content_hash'] for row in rows] == [None, None]
+
+def test_manual_batch_allows_identical_records(temp_database):
+    manager = InventoryManager()
+    record = {"transaction_type": "出库", "insertion_date": "2024-03-01", "product_name": "机油滤清器",
+              "model_number": "M-2", "unit": "个", "quantity": 2, "unit_price": 8.0}
+
+    success, _, id_range = manager.record_batch([record, record])
+
+    assert success
+    assert id_range[1] - id_range[0] == 1
+
+def test_import_batch_skips_and_reports_duplicate_records(temp_database):
+    manager = InventoryManager()
+    record = {"transaction_type": "入库", "insertion_date": "2024-03-01", "product_name": "压差传感器",
+              "model_number": "M-3", "unit": "个", "quantity": 1, "unit_price": 3.0}
+    other = dict(record, product_name="催化剂模块")
+    first_batch = temp_database.create_import_batch("a.xlsx", "0" * 64)
+    assert manager.record_batch([record], import_batch_id=first_batch)[0]
+
+    second_batch = temp_database.create_import_batch("b.xlsx", "1" * 64)
+    success, message, id_range = manager.record_batch([record, other, other], import_batch_id=second_batch)
+
+    assert success # 与文件导入相同：重复的记录被跳过，其余照常写入
+    assert id_range[0] == id_range[1]
+    assert temp_database.get_transaction_by_id(id_range[0])['product_name'] == "催化剂模块"
+    assert manager.last_import_report.duplicates == [1, 3]
+    assert manager.last_import_report.inserted == 1
+    assert "跳过 2 条重复记录" in message
+
+def test_import_batch_of_only_duplicates_writes_nothing(temp_database):
+    manager = InventoryManager()
+    record = {"transaction_type": "出库", "insertion_date": "2024-03-01", "product_name": "机油滤清器",
+              "model_number": "M-2", "unit": "个", "quantity": 2, "unit_price": 8.0}
+    batch_id = temp_database.create_import_batch("a.xlsx", "0" * 64)
+    manager.record_batch([record], import_batch_id=batch_id)
+
+    success, _, id_range = manager.record_batch([record], import_batch_id=batch_id)
+
+    assert success and id_range is None
+    assert manager.last_import_report.duplicates == [1]
+    assert temp_database.get_db_connection().execute("SELECT COUNT(*) FROM transactions").fetchone()[0] == 1
+
+def test_import_batch_errors_use_original_record_numbers(temp_database):
+    manager = InventoryManager()
+    record = {"transaction_type": "入库", "insertion_date": "2024-03-01", "product_name": "压差传感器",
+              "model_number": "M-3", "unit": "个", "quantity": 1, "unit_price": 3.0}
+    batch_id = temp_database.create_import_batch("a.xlsx", "0" * 64)
+
+    success, message, _ = manager.record_batch([record, record, dict(record, insertion_date="2024/03/02")],
+                                               import_batch_id=batch_id)
+
+    assert not success
+    assert "第 3 行" in message # 第 2 条因重复被跳过，行号仍按原来的顺序
+
+def test_manual_entry_does_not_block_identical_import(temp_database):
+    manager = InventoryManager()
+    manager.record_inbound(*ENTRY)
+    batch_id = temp_database.create_import_batch("a.xlsx", "0" * 64)
+    row = dict(zip(temp_database.CONTENT_HASH_FIELDS, ("2024-03-01", "氧传感器", "M-1", "个", 5, 2.5, "", "ACME Corp", "")))
+
+    assert temp_database.add_transactions_bulk([row], import_batch_id=batch_id) is not None
@@ -0,0 +1,47 @@
+# tests/test_query_cache.py
+"""查询缓存只在数据变化时失效：大批 ID 的临时表和其他线程的查询不影响写入版本"""
+import sqlite3
+import threading
+from app.core.query_cache import QueryCache
+
+def _load_counting(cache, key, calls):
+    def loader():
+        calls.append(key)
+        return [key]
+    return cache.get_or_load(key, loader)
+
+def test_large_selection_does_not_invalidate_cache(temp_database):
+    ids = range(1, temp_database.ID_TEMP_TABLE_THRESHOLD + 100) # 超过阈值，走 temp.id_set
+    cache, calls = QueryCache(1024 * 1024), []
+    _load_counting(cache, "all", calls)
+
+    temp_database.get_totals_by_ids(list(ids))
+    _load_counting(cache, "all", calls)
+
+    assert calls == ["all"]
+    assert cache.stats()["invalidations"] == 0
+
+def test_lookup_from_another_thread_hits_cache(temp_database):
+    cache, calls = QueryCache(1024 * 1024), []
+    _load_counting(cache, "all", calls)
+
+    thread = threading.Thread(target=_load_counting, args=(cache, "all", calls))
+    thread.start()
+    thread.join()
+
+    assert calls == ["all"]
+    assert cache.stats()["hits"] == 1
+
+def test_writes_invalidate_cache(temp_database):
+    cache, calls = QueryCache(1024 * 1024), []
+    _load_counting(cache, "all", calls)
+    temp_database.add_transaction("氧传感器", "M-1", "个", 3, 1.0, "2024-03-01")
+    _load_counting(cache, "all", calls)
+
+    other = sqlite3.connect(temp_database.DATABASE_NAME) # 相当于另一个进程的写入
+    other.execute("UPDATE transactions SET notes = 'x'")
+    other.commit()
+    other.close()
+    _load_counting(cache, "all", calls)
+
+    assert calls == ["all"] * 3
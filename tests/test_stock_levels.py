@@ -0,0 +1,30 @@
+# tests/test_stock_levels.py
+"""stock_levels 由触发器维护：录入、撤销、恢复和永久删除之后都与交易记录的实时汇总一致"""
+from app.core.inventory import InventoryManager
+
+def _stock(data_manager):
+    return {(row['product_name'], row['model_number'], row['unit']): row['current_stock']
+            for row in data_manager.get_product_summary()}
+
+def test_triggers_keep_stock_levels_through_insert_undo_and_delete(temp_database):
+    manager = InventoryManager()
+    assert manager.record_inbound("氧传感器", "M-1", "个", 10, 2.5, "2024-03-01")[0]
+    manager.record_inbound("氧传感器", "M-1", None, 4, 2.5, "2024-03-01") # 单位为空与 '' 归为一组
+    manager.record_outbound("氧传感器", "M-1", "个", 3, 2.5, "2024-03-02")
+    assert _stock(temp_database) == {("氧传感器", "M-1", "个"): 7, ("氧传感器", "M-1", ""): 4}
+    assert temp_database.verify_stock_levels() == []
+
+    ids = [row['id'] for row in temp_database.get_all_transactions(include_undone=True)]
+    inbound_id, outbound_id = min(ids), max(ids)
+    assert manager.undo_transaction(outbound_id)[0]
+    assert _stock(temp_database)[("氧传感器", "M-1", "个")] == 10
+    assert manager.undo_transaction(inbound_id)[0]
+    assert ("氧传感器", "M-1", "个") not in _stock(temp_database) # 全部交易都已撤销的商品不再显示
+    assert temp_database.verify_stock_levels() == []
+
+    assert manager.redo_transaction(outbound_id)[0]
+    assert _stock(temp_database)[("氧传感器", "M-1", "个")] == -3
+    assert manager.delete_transaction(outbound_id)[0]
+    assert manager.delete_transaction(inbound_id)[0] # 已撤销的记录删除时不影响库存
+    assert _stock(temp_database) == {("氧传感器", "M-1", ""): 4}
+    assert temp_database.verify_stock_levels() == []
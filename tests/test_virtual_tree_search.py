@@ -0,0 +1,81 @@
+# tests/test_virtual_tree_search.py
+"""搜索不等待索引建完：先显示已查找部分的匹配，其余的行在空闲回调中分批查找"""
+from app.ui import virtual_tree
+from app.ui.virtual_tree import VirtualTreeview
+
+class FakeTree:
+    """只实现 VirtualTreeview 用到的 Treeview 接口；after_idle 的回调由 run_idle 手动执行"""
+    def __init__(self):
+        self.items = []
+        self.idle = []
+
+    def configure(self, **options):
+        pass
+
+    def bind(self, sequence, callback):
+        pass
+
+    def after_idle(self, callback, *args):
+        self.idle.append((callback, args))
+
+    def run_idle(self, steps=None):
+        while self.idle and steps != 0:
+            callback, args = self.idle.pop(0)
+            callback(*args)
+            steps = None if steps is None else steps - 1
+
+    def get_children(self):
+        return list(self.items)
+
+    def delete(self, *iids):
+        self.items = [iid for iid in self.items if iid not in iids]
+
+    def insert(self, parent, index, iid, values, tags):
+        self.items.insert(len(self.items) if index == "end" else index, iid)
+
+    def yview_moveto(self, fraction):
+        pass
+
+    def selection_set(self, iids):
+        pass
+
+    def focus(self, iid=None):
+        return ""
+
+class FakeScrollbar:
+    def configure(self, **options):
+        pass
+
+    def set(self, first, last):
+        pass
+
+def _view(count):
+    tree = FakeTree()
+    progress = []
+    view = VirtualTreeview(tree, FakeScrollbar(), on_search_progress=lambda: progress.append(len(view)))
+    rows = [{"id": n, "name": "氧传感器" if n % 10 == 0 else "机油滤清器", "model": f"M-{n}"} for n in range(count)]
+    view.set_rows(rows, lambda row: ((row["name"],), ()), lambda row: row["id"], search_fields=("name", "model"))
+    return view, tree, progress
+
+def test_search_publishes_partial_matches_and_finishes_in_idle_steps(monkeypatch):
+    monkeypatch.setattr(virtual_tree, "SEARCH_CHUNK_ROWS", 1000)
+    view, tree, progress = _view(5000)
+    tree.run_idle() # 建完索引
+
+    assert view.set_search("氧传感") == 100 # 第一批 1000 行中的匹配
+    assert view.search_pending
+    tree.run_idle()
+
+    assert not view.search_pending
+    assert len(view) == 500
+    assert progress == [200, 300, 400, 500]
+    assert all(int(view.iid_at(position)) % 10 == 0 for position in range(len(view)))
+
+def test_search_before_indexing_does_not_index_everything():
+    view, tree, _ = _view(virtual_tree.INDEX_CHUNK_ROWS * 3)
+
+    view.set_search("m-1")
+
+    assert len(view._search_index) == virtual_tree.INDEX_CHUNK_ROWS
+    tree.run_idle()
+    assert len(view) == sum(1 for n in range(virtual_tree.INDEX_CHUNK_ROWS * 3) if f"m-{n}".startswith("m-1"))